@@ -0,0 +1,118 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional
+import numpy as np
+
+# Cantidades (número y unidad o palabra que le sigue: "3 kg", "0,5 ml", "6 meses")
+# y meses del año. Dos preguntas casi idénticas que difieren en una dosis, un
+# peso, una edad o un mes tienen embeddings muy parecidos y respuestas clínicas
+# distintas.
+_QUANTITY = re.compile(r"(\d+(?:[.,]\d+)?)\s*(%|[a-záéíóúñµμ]+(?:/[a-záéíóúñ]+)?)?")
+_MONTHS = re.compile(
+    r"\b(enero|febrero|marzo|abril|mayo|junio|julio|agosto|septiembre|setiembre|octubre|noviembre|diciembre)\b"
+)
+
+
+def question_key(question: str) -> tuple:
+    """
+    Cantidades y meses de una pregunta, normalizados y en orden. Una respuesta
+    en caché solo se reutiliza si esta clave coincide exactamente.
+    """
+    text = question.lower()
+    quantities = [
+        f"{number.replace(',', '.')} {unit or ''}".strip()
+        for number, unit in _QUANTITY.findall(text)
+    ]
+    return tuple(quantities) + tuple(_MONTHS.findall(text))
+
+
+class SemanticAnswerCache:
+    def __init__(self, threshold: float = 0.95, ttl_seconds: float = 3600, max_entries: int = 256):
+        """
+        Caché de respuestas indexada por el embedding de la pregunta.
+
+        Una pregunta reutiliza una respuesta si la similitud coseno con una
+        pregunta anterior supera `threshold` y ambas tienen las mismas
+        cantidades y meses (question_key). Las entradas caducan tras
+        `ttl_seconds` y se expulsan por LRU al superar `max_entries`.
+        """
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._next_key = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _expire(self, now: float):
+        expired = [key for key, entry in self._entries.items() if now - entry["created"] > self.ttl_seconds]
+        for key in expired:
+            del self._entries[key]
+
+    def lookup(self, embedding: List[float], question: str, n_results: int) -> Optional[Dict[str, Any]]:
+        """
+        Devuelve la entrada más parecida por encima del umbral (con las mismas
+        cantidades y meses que la pregunta), o None
+        """
+        vector = self._normalize(embedding)
+        question_tokens = question_key(question)
+        with self._lock:
+            self._expire(time.time())
+            candidates = [
+                (key, entry) for key, entry in self._entries.items()
+                if entry["n_results"] == n_results and entry["key"] == question_tokens
+            ]
+            if candidates:
+                matrix = np.stack([entry["vector"] for _, entry in candidates])
+                similarities = matrix @ vector
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    key, entry = candidates[best]
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return {**entry, "similarity": float(similarities[best])}
+            self.misses += 1
+            return None
+
+    def store(self, embedding: List[float], question: str, n_results: int, answer: str, sources: List[Dict[str, Any]]):
+        """
+        Guarda una respuesta generada
+        """
+        with self._lock:
+            self._entries[self._next_key] = {
+                "vector": self._normalize(embedding),
+                "question": question,
+                "key": question_key(question),
+                "n_results": n_results,
+                "answer": answer,
+                "sources": sources,
+                "created": time.time(),
+            }
+            self._next_key += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self):
+        """
+        Vacía la caché (la colección cambió)
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self._entries),
+        }
@@ -0,0 +1,74 @@
+"""
+Utilidades compartidas por los benchmarks.
+"""
+
+import contextlib
+import socket
+import threading
+import time
+from typing import List, Dict, Iterator
+
+SAMPLE_QUESTIONS = [
+    "¿Cuál es la dosis de nirsevimab para un lactante de menos de 5 kg?",
+    "¿Qué dosis recibe un lactante de 5 kg o más?",
+    "¿Cuándo no se recomienda nirsevimab si la madre fue vacunada?",
+    "¿Qué criterios de alto riesgo se consideran en mayores de 8 meses?",
+    "¿Cuál es la carga de enfermedad por VSR en menores de un año?",
+    "¿Qué resultados mostró el análisis de costo-efectividad?",
+    "¿Cuál es el impacto presupuestal de introducir la inmunización?",
+    "¿Qué población objetivo propone el policy brief de Bogotá?",
+    "¿Cómo se organiza el piloto en La Guajira y Chocó?",
+    "¿Qué lineamientos de intensificación de vacunación se proponen?",
+]
+
+
+def percentile(values: List[float], q: float) -> float:
+    """
+    Percentil por interpolación lineal (q entre 0 y 100)
+    """
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(latencies: List[float]) -> Dict[str, float]:
+    """
+    Resume una lista de latencias (segundos) en milisegundos
+    """
+    return {
+        "count": len(latencies),
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "max_ms": max(latencies) * 1000 if latencies else float("nan"),
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextlib.contextmanager
+def serve_app(app) -> Iterator[str]:
+    """
+    Sirve una app ASGI con uvicorn en un hilo y devuelve su URL base
+    """
+    import uvicorn
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        server.should_exit = True
+        thread.join()
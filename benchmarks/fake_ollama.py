@@ -0,0 +1,242 @@
+"""
+Servidor Ollama simulado para pruebas de carga y benchmarks.
+
+Implementa /api/embed, /api/embeddings, /api/chat, /api/generate, /api/tags
+y /api/version con respuestas deterministas y latencias configurables, de
+forma que los resultados sean comparables entre commits en una máquina sin
+GPU ni red.
+
+Uso:
+    python -m benchmarks.fake_ollama --port 11435
+    OLLAMA_HOST=http://127.0.0.1:11435 uvicorn server:app
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Dict, Any, Optional
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def fake_embedding(text: str, dimension: int = 768) -> List[float]:
+    """
+    Embedding determinista por feature hashing de las palabras del texto.
+    Textos que comparten palabras tienen vectores cercanos, lo que permite
+    medir recall de forma significativa.
+    """
+    vector = [0.0] * dimension
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+        index = int.from_bytes(digest[:4], "little") % dimension
+        sign = 1.0 if digest[4] & 1 else -1.0
+        vector[index] += sign
+
+    norm = math.sqrt(sum(value * value for value in vector))
+    if norm == 0:
+        vector[0] = 1.0
+        return vector
+    return [value / norm for value in vector]
+
+
+class FakeOllama:
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        dimension: int = 768,
+        reply_tokens: int = 64,
+        token_latency: float = 0.005,
+        prompt_token_latency: float = 0.0002,
+        embed_latency: float = 0.0,
+    ):
+        """
+        Servidor HTTP en un hilo propio.
+
+        La generación tarda `prompt_token_latency` por token de prompt
+        (estimado como caracteres / 4) más `token_latency` por token generado.
+        """
+        self.dimension = dimension
+        self.reply_tokens = reply_tokens
+        self.token_latency = token_latency
+        self.prompt_token_latency = prompt_token_latency
+        self.embed_latency = embed_latency
+        self.requests: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> str:
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self.url
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _count(self, path: str):
+        with self._lock:
+            self.requests[path] = self.requests.get(path, 0) + 1
+
+    def _reply_tokens(self, prompt: str) -> List[str]:
+        words = TOKEN_PATTERN.findall(prompt.lower()) or ["respuesta"]
+        tokens = ["Respuesta", " simulada:"]
+        while len(tokens) < self.reply_tokens:
+            tokens.append(" " + words[len(tokens) % len(words)])
+        return tokens[:self.reply_tokens]
+
+    def _make_handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, payload: Dict[str, Any], status: int = 200):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _send_chunk(self, payload: Dict[str, Any]):
+                body = (json.dumps(payload) + "\n").encode("utf-8")
+                self.wfile.write(f"{len(body):x}\r\n".encode("ascii") + body + b"\r\n")
+                self.wfile.flush()
+
+            def _read_json(self) -> Dict[str, Any]:
+                length = int(self.headers.get("Content-Length") or 0)
+                return json.loads(self.rfile.read(length) or b"{}")
+
+            def do_GET(self):
+                fake._count(self.path)
+                if self.path == "/api/version":
+                    self._send_json({"version": "0.0.0-fake"})
+                elif self.path == "/api/tags":
+                    self._send_json({"models": [{"name": "nomic-embed-text"}, {"name": "llama3.1:8b"}]})
+                else:
+                    self._send_json({"error": "not found"}, 404)
+
+            def do_HEAD(self):
+                self.send_response(200)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def do_POST(self):
+                fake._count(self.path)
+                request = self._read_json()
+
+                if self.path == "/api/embed":
+                    inputs = request.get("input", "")
+                    if isinstance(inputs, str):
+                        inputs = [inputs]
+                    time.sleep(fake.embed_latency * len(inputs))
+                    self._send_json({
+                        "model": request.get("model", ""),
+                        "embeddings": [fake_embedding(text, fake.dimension) for text in inputs],
+                    })
+                elif self.path == "/api/embeddings":
+                    time.sleep(fake.embed_latency)
+                    self._send_json({"embedding": fake_embedding(request.get("prompt", ""), fake.dimension)})
+                elif self.path in ("/api/chat", "/api/generate"):
+                    self._generate(request)
+                else:
+                    self._send_json({"error": "not found"}, 404)
+
+            def _generate(self, request: Dict[str, Any]):
+                if self.path == "/api/chat":
+                    prompt = "\n".join(message.get("content", "") for message in request.get("messages", []))
+                else:
+                    prompt = request.get("prompt", "")
+
+                prompt_tokens = max(1, len(prompt) // 4)
+                limit = (request.get("options") or {}).get("num_predict") or fake.reply_tokens
+                tokens = fake._reply_tokens(prompt)[:max(1, min(limit, fake.reply_tokens))]
+
+                prompt_seconds = prompt_tokens * fake.prompt_token_latency
+                time.sleep(prompt_seconds)
+
+                def message(content: str, done: bool) -> Dict[str, Any]:
+                    payload = {"model": request.get("model", ""), "created_at": "", "done": done}
+                    if self.path == "/api/chat":
+                        payload["message"] = {"role": "assistant", "content": content}
+                    else:
+                        payload["response"] = content
+                    if done:
+                        payload.update({
+                            "done_reason": "stop",
+                            "prompt_eval_count": prompt_tokens,
+                            "prompt_eval_duration": int(prompt_seconds * 1e9),
+                            "eval_count": len(tokens),
+                            "eval_duration": int(len(tokens) * fake.token_latency * 1e9),
+                        })
+                    return payload
+
+                if request.get("stream", True):
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/x-ndjson")
+                    self.send_header("Transfer-Encoding", "chunked")
+                    self.end_headers()
+                    for token in tokens:
+                        time.sleep(fake.token_latency)
+                        self._send_chunk(message(token, False))
+                    self._send_chunk(message("", True))
+                    self.wfile.write(b"0\r\n\r\n")
+                    self.wfile.flush()
+                else:
+                    time.sleep(fake.token_latency * len(tokens))
+                    self._send_json(message("".join(tokens), True))
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor Ollama simulado")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--reply-tokens", type=int, default=64)
+    parser.add_argument("--token-latency", type=float, default=0.005)
+    parser.add_argument("--prompt-token-latency", type=float, default=0.0002)
+    parser.add_argument("--embed-latency", type=float, default=0.0)
+    args = parser.parse_args()
+
+    fake = FakeOllama(
+        host=args.host,
+        port=args.port,
+        reply_tokens=args.reply_tokens,
+        token_latency=args.token_latency,
+        prompt_token_latency=args.prompt_token_latency,
+        embed_latency=args.embed_latency,
+    )
+    print(f"Ollama simulado escuchando en {fake.url}")
+    try:
+        fake._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
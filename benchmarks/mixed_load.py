@@ -0,0 +1,92 @@
+"""
+Latencia de /query, /decision y /strategy bajo carga mixta.
+
+Levanta un Ollama simulado y el servidor FastAPI (uvicorn) en un directorio
+temporal, lanza a la vez generaciones lentas y peticiones baratas, y muestra
+los percentiles de latencia por endpoint. Si /decision y /strategy se
+degradan mientras hay generaciones en curso, el servidor se está bloqueando.
+
+Uso:
+    python -m benchmarks.mixed_load --queries 20 --decisions 200
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Dict
+
+from benchmarks.common import serve_app, summarize
+from benchmarks.fake_ollama import FakeOllama
+
+SAMPLE_TEXT = (
+    "El nirsevimab se administra en dosis única intramuscular durante la temporada VSR. "
+    "Lactantes con peso menor a 5 kg reciben 50 mg (5 mL); con 5 kg o más reciben 100 mg (1 mL). "
+    "La vacunación materna entre las semanas 32 y 36 protege al recién nacido. "
+)
+
+
+async def run_load(base_url: str, queries: int, decisions: int) -> Dict[str, List[float]]:
+    import httpx
+
+    latencies: Dict[str, List[float]] = {"/query": [], "/decision": [], "/strategy": []}
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=300) as client:
+        async def call(path: str, payload: dict):
+            start = time.perf_counter()
+            response = await client.post(path, json=payload)
+            response.raise_for_status()
+            latencies[path].append(time.perf_counter() - start)
+
+        tasks = [call("/query", {"question": "¿Dosis de nirsevimab por peso?", "n_results": 5}) for _ in range(queries)]
+        # Las peticiones baratas se reparten mientras las generaciones están en curso
+        for i in range(decisions):
+            if i % 2:
+                tasks.append(call("/strategy", {"seasonVSR": True, "meanAge": 4}))
+            else:
+                tasks.append(call("/decision", {"current_node": "inicio", "respuesta": "si"}))
+        await asyncio.gather(*tasks)
+
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latencia bajo carga mixta contra un Ollama simulado")
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--decisions", type=int, default=200)
+    parser.add_argument("--token-latency", type=float, default=0.01)
+    parser.add_argument("--output", help="Archivo JSON donde guardar los resultados")
+    args = parser.parse_args()
+
+    with FakeOllama(token_latency=args.token_latency) as fake, tempfile.TemporaryDirectory() as workdir:
+        # Configurar antes de importar el servidor: el cliente de Ollama lee OLLAMA_HOST al importarse
+        os.environ["OLLAMA_HOST"] = fake.url
+        os.environ["CHROMA_PERSIST_DIRECTORY"] = str(Path(workdir) / "chroma_db")
+        # Sin caché de respuestas: cada /query debe generar de verdad
+        os.environ["ANSWER_CACHE"] = "0"
+
+        import server
+
+        sample = Path(workdir) / "muestra.txt"
+        sample.write_text(SAMPLE_TEXT * 40, encoding="utf-8")
+        server.get_vector_store().add_document(str(sample))
+
+        with serve_app(server.app) as base_url:
+            latencies = asyncio.run(run_load(base_url, args.queries, args.decisions))
+
+    results = {path: summarize(values) for path, values in latencies.items()}
+    for path, stats in results.items():
+        print(
+            f"{path:<10} n={stats['count']:<5} p50={stats['p50_ms']:.1f}ms "
+            f"p95={stats['p95_ms']:.1f}ms p99={stats['p99_ms']:.1f}ms max={stats['max_ms']:.1f}ms"
+        )
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
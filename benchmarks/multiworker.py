@@ -0,0 +1,188 @@
+"""
+Rendimiento de lectura con varios workers de uvicorn.
+
+Compara dos despliegues sobre el mismo corpus:
+
+- local: cada worker abre su propio índice (ChromaDB) en el mismo directorio
+- shared: un proceso (vector_service) posee el índice y los workers lo
+  consultan con VECTOR_STORE_URL
+
+Para cada número de workers lanza peticiones concurrentes a /search/batch y
+mide peticiones/s y la memoria residente (RSS) total de los procesos.
+
+Uso:
+    python -m benchmarks.multiworker --workers 1 2 4 --limit 3
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Dict, Any
+
+from benchmarks.common import SAMPLE_QUESTIONS, free_port, summarize
+from benchmarks.fake_ollama import FakeOllama
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def rss_bytes(pid: int) -> int:
+    """
+    Memoria residente de un proceso y sus descendientes (Linux, /proc)
+    """
+    total = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f"/proc/{current}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+            with open(f"/proc/{current}/task/{current}/children") as f:
+                pending.extend(int(child) for child in f.read().split())
+        except FileNotFoundError:
+            continue
+    return total
+
+
+def wait_for(url: str, timeout: float = 120.0):
+    import httpx
+
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        try:
+            if httpx.get(url, timeout=5).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.1)
+    raise TimeoutError(f"{url} no respondió en {timeout}s")
+
+
+async def run_reads(base_url: str, requests: int, concurrency: int, batch: int) -> List[float]:
+    import httpx
+
+    latencies: List[float] = []
+    semaphore = asyncio.Semaphore(concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=300) as client:
+        async def call(i: int):
+            queries = [f"{SAMPLE_QUESTIONS[(i + j) % len(SAMPLE_QUESTIONS)]} {i}" for j in range(batch)]
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post("/search/batch", json={"queries": queries, "n_results": 8})
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - start)
+
+        await asyncio.gather(*(call(i) for i in range(requests)))
+    return latencies
+
+
+def bench_deployment(mode: str, workers: int, env: Dict[str, str], args) -> Dict[str, Any]:
+    port = free_port()
+    env = dict(env)
+    if mode == "shared":
+        env["VECTOR_STORE_URL"] = env["SHARED_VECTOR_STORE_URL"]
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=REPO_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        wait_for(f"{base_url}/health/ready")
+        # Cada worker se calienta al arrancar; dar tiempo a todos
+        time.sleep(1.0)
+        start = time.perf_counter()
+        latencies = asyncio.run(run_reads(base_url, args.requests, args.concurrency, args.batch))
+        elapsed = time.perf_counter() - start
+        return {
+            "requests_per_s": len(latencies) / elapsed,
+            "latency": summarize(latencies),
+            "rss_bytes": rss_bytes(process.pid),
+        }
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lecturas con varios workers: índice por worker frente a servicio compartido")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--documents", default=str(REPO_ROOT / "documents"))
+    parser.add_argument("--limit", type=int, default=3, help="Documentos a ingerir")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--batch", type=int, default=8, help="Preguntas por petición a /search/batch")
+    parser.add_argument("--output", help="Archivo JSON donde guardar los resultados")
+    args = parser.parse_args()
+
+    from document_loader import VALID_EXTENSIONS
+
+    files = sorted(
+        str(path) for path in Path(args.documents).iterdir()
+        if path.is_file() and path.suffix.lower() in VALID_EXTENSIONS
+    )[:args.limit]
+
+    report: Dict[str, Any] = {"cpu_count": os.cpu_count(), "parameters": vars(args), "results": {}}
+    with FakeOllama(token_latency=0.0) as fake, tempfile.TemporaryDirectory() as workdir:
+        persist_directory = str(Path(workdir) / "chroma_db")
+        service_port = free_port()
+        env = {
+            **os.environ,
+            "OLLAMA_HOST": fake.url,
+            "CHROMA_PERSIST_DIRECTORY": persist_directory,
+            "ANSWER_CACHE": "0",
+            "SHARED_VECTOR_STORE_URL": f"http://127.0.0.1:{service_port}",
+        }
+        os.environ["OLLAMA_HOST"] = fake.url
+
+        service = subprocess.Popen(
+            [sys.executable, "-m", "vector_service", "--port", str(service_port),
+             "--persist-directory", persist_directory],
+            cwd=REPO_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            wait_for(f"{env['SHARED_VECTOR_STORE_URL']}/health")
+
+            # Ingesta a través del servicio (único escritor del índice)
+            from local_vector_store import LocalVectorStore
+
+            store = LocalVectorStore(
+                persist_directory=persist_directory,
+                vector_backend="remote",
+                vector_store_url=env["SHARED_VECTOR_STORE_URL"],
+            )
+            store.add_documents(files)
+            print(f"{store.collection.count()} chunks indexados")
+
+            for mode in ("shared", "local"):
+                if mode == "local":
+                    # El modo local abre el directorio directamente: liberar el del servicio
+                    service.terminate()
+                    service.wait()
+                for workers in args.workers:
+                    result = bench_deployment(mode, workers, env, args)
+                    if mode == "shared":
+                        result["rss_bytes"] += rss_bytes(service.pid)
+                    report["results"][f"{mode}_{workers}"] = result
+                    print(
+                        f"{mode:<6} workers={workers:<2} {result['requests_per_s']:.1f} req/s "
+                        f"p50={result['latency']['p50_ms']:.1f}ms p95={result['latency']['p95_ms']:.1f}ms "
+                        f"RSS={result['rss_bytes'] / 1e6:.0f} MB"
+                    )
+        finally:
+            service.terminate()
+            service.wait()
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""
+Suite de benchmarks de extremo a extremo del RAG.
+
+Mide, contra un Ollama simulado y determinista (sin GPU ni red):
+
+- ingest: ingesta del corpus de `documents/` (tiempos por etapa y chunks/s)
+- search: latencia p50/p95/p99 de LocalVectorStore.search para varios n_results
+- api: carga concurrente sobre la app FastAPI (/query, /decision, /strategy)
+- rerank: tokens de contexto y latencia de answer_question sin y con reordenación MMR
+
+Los resultados se escriben en JSON (por defecto en benchmarks/results/) junto
+con el commit y la plataforma, para comparar entre versiones.
+
+Uso:
+    python -m benchmarks.run_benchmarks
+    python -m benchmarks.run_benchmarks --suites ingest search --limit 5
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Dict, Any, Optional
+
+from benchmarks.common import SAMPLE_QUESTIONS, serve_app, summarize
+from benchmarks.fake_ollama import FakeOllama
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+SUITES = ["ingest", "search", "api", "rerank"]
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except Exception:
+        return None
+
+
+def corpus_files(documents_dir: Path, limit: Optional[int]) -> List[str]:
+    from document_loader import VALID_EXTENSIONS
+
+    files = sorted(
+        str(path) for path in documents_dir.iterdir()
+        if path.is_file() and path.suffix.lower() in VALID_EXTENSIONS
+    )
+    return files[:limit] if limit else files
+
+
+def bench_ingest(store, files: List[str], workers: Optional[int]) -> Dict[str, Any]:
+    summary = store.add_documents(files, workers=workers, incremental=False)
+    chunks = store.collection.count()
+    total = summary["timings"]["total"]
+    return {
+        "files": len(files),
+        "failed": sorted(path for path, ok in summary["results"].items() if not ok),
+        "chunks": chunks,
+        "timings_s": summary["timings"],
+        "bottleneck": summary["bottleneck"],
+        "chunks_per_s": chunks / total if total else 0.0,
+    }
+
+
+def bench_search(store, n_results_values: List[int], repeats: int) -> Dict[str, Any]:
+    # Una búsqueda de calentamiento construye el índice léxico fuera de la medición
+    store.search(SAMPLE_QUESTIONS[0], n_results=1)
+
+    results = {}
+    for n_results in n_results_values:
+        latencies = []
+        for i in range(repeats):
+            question = SAMPLE_QUESTIONS[i % len(SAMPLE_QUESTIONS)]
+            start = time.perf_counter()
+            store.search(question, n_results=n_results)
+            latencies.append(time.perf_counter() - start)
+        results[str(n_results)] = summarize(latencies)
+    return results
+
+
+def bench_rerank(store, n_results: int) -> Dict[str, Any]:
+    from reranker import MMRReranker
+
+    results = {}
+    for name, reranker in (("off", None), ("mmr", MMRReranker())):
+        store.reranker = reranker
+        latencies, tokens, passages = [], [], []
+        for question in SAMPLE_QUESTIONS:
+            start = time.perf_counter()
+            answer = store.answer_question(question, n_results)
+            latencies.append(time.perf_counter() - start)
+            context = answer.get("context") or {}
+            tokens.append(context.get("tokens_after", 0))
+            passages.append(context.get("passages", 0))
+        results[name] = {
+            "context_tokens_mean": sum(tokens) / len(tokens),
+            "passages_mean": sum(passages) / len(passages),
+            **summarize(latencies),
+        }
+    store.reranker = None
+    return results
+
+
+def bench_api(queries: int, decisions: int) -> Dict[str, Any]:
+    import server
+    from benchmarks.mixed_load import run_load
+
+    with serve_app(server.app) as base_url:
+        start = time.perf_counter()
+        latencies = asyncio.run(run_load(base_url, queries, decisions))
+        elapsed = time.perf_counter() - start
+
+    total_requests = sum(len(values) for values in latencies.values())
+    return {
+        "endpoints": {path: summarize(values) for path, values in latencies.items()},
+        "wall_s": elapsed,
+        "requests_per_s": total_requests / elapsed if elapsed else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks del RAG contra un Ollama simulado")
+    parser.add_argument("--suites", nargs="+", choices=SUITES, default=SUITES)
+    parser.add_argument("--documents", default=str(REPO_ROOT / "documents"))
+    parser.add_argument("--limit", type=int, help="Máximo de documentos a ingerir")
+    parser.add_argument("--workers", type=int, help="Procesos de parseo en la ingesta")
+    parser.add_argument("--n-results", type=int, nargs="+", default=[1, 5, 10, 20])
+    parser.add_argument("--repeats", type=int, default=50, help="Búsquedas por valor de n_results")
+    parser.add_argument("--rerank-n-results", type=int, default=8)
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--decisions", type=int, default=200)
+    parser.add_argument("--token-latency", type=float, default=0.005)
+    parser.add_argument("--output", help="Archivo JSON de salida (por defecto benchmarks/results/<fecha>_<commit>.json)")
+    args = parser.parse_args()
+
+    report: Dict[str, Any] = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "parameters": vars(args),
+        "results": {},
+    }
+
+    with FakeOllama(token_latency=args.token_latency) as fake, tempfile.TemporaryDirectory() as workdir:
+        # Configurar antes de importar: el cliente de Ollama lee OLLAMA_HOST al importarse
+        os.environ["OLLAMA_HOST"] = fake.url
+        os.environ["CHROMA_PERSIST_DIRECTORY"] = str(Path(workdir) / "chroma_db")
+        os.environ["ANSWER_CACHE"] = "0"
+
+        from local_vector_store import LocalVectorStore
+
+        # Sin caché de embeddings: cada ejecución mide el trabajo completo
+        store = LocalVectorStore(
+            persist_directory=os.environ["CHROMA_PERSIST_DIRECTORY"],
+            embedding_cache=False,
+            answer_cache=False,
+        )
+        files = corpus_files(Path(args.documents), args.limit)
+
+        if "ingest" in args.suites or store.collection.count() == 0:
+            ingest = bench_ingest(store, files, args.workers)
+            if "ingest" in args.suites:
+                report["results"]["ingest"] = ingest
+                print(
+                    f"ingest  {ingest['files']} archivos, {ingest['chunks']} chunks en "
+                    f"{ingest['timings_s']['total']:.2f}s ({ingest['chunks_per_s']:.1f} chunks/s, "
+                    f"cuello de botella: {ingest['bottleneck']})"
+                )
+
+        if "search" in args.suites:
+            search = bench_search(store, args.n_results, args.repeats)
+            report["results"]["search"] = search
+            for n_results, stats in search.items():
+                print(
+                    f"search  n_results={n_results:<3} p50={stats['p50_ms']:.1f}ms "
+                    f"p95={stats['p95_ms']:.1f}ms p99={stats['p99_ms']:.1f}ms"
+                )
+
+        if "rerank" in args.suites:
+            rerank = bench_rerank(store, args.rerank_n_results)
+            report["results"]["rerank"] = rerank
+            for name, stats in rerank.items():
+                print(
+                    f"rerank  {name:<4} {stats['context_tokens_mean']:.0f} tokens de contexto, "
+                    f"{stats['passages_mean']:.1f} pasajes, p50={stats['p50_ms']:.1f}ms p95={stats['p95_ms']:.1f}ms"
+                )
+
+        if "api" in args.suites:
+            api = bench_api(args.queries, args.decisions)
+            report["results"]["api"] = api
+            for path, stats in api["endpoints"].items():
+                print(
+                    f"api     {path:<10} n={stats['count']:<5} p50={stats['p50_ms']:.1f}ms "
+                    f"p95={stats['p95_ms']:.1f}ms p99={stats['p99_ms']:.1f}ms"
+                )
+
+        report["fake_ollama_requests"] = dict(fake.requests)
+
+    if args.output:
+        output = Path(args.output)
+    else:
+        output = REPO_ROOT / "benchmarks" / "results" / f"{time.strftime('%Y%m%d-%H%M%S')}_{report['commit'] or 'local'}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(f"Resultados guardados en {output}")
+
+
+if __name__ == "__main__":
+    main()
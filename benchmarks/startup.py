@@ -0,0 +1,102 @@
+"""
+Tiempo de arranque del servidor.
+
+Mide en procesos nuevos el tiempo de `import server`, y con uvicorn el
+tiempo hasta la primera respuesta de /health/live y /decision y hasta que
+/health/ready devuelve 200 (índice cargado y modelos precalentados contra
+el Ollama simulado).
+
+Uso:
+    python -m benchmarks.startup --runs 5
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Any
+
+from benchmarks.common import free_port
+from benchmarks.fake_ollama import FakeOllama
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def time_import(env: Dict[str, str]) -> float:
+    code = "import time; start = time.perf_counter(); import server; print(time.perf_counter() - start)"
+    output = subprocess.check_output([sys.executable, "-c", code], cwd=REPO_ROOT, env=env, text=True)
+    return float(output.strip().splitlines()[-1])
+
+
+def time_server(env: Dict[str, str], timeout: float = 120.0) -> Dict[str, Any]:
+    import httpx
+
+    port = free_port()
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--port", str(port), "--log-level", "warning"],
+        cwd=REPO_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    marks: Dict[str, Any] = {}
+    try:
+        with httpx.Client(base_url=base_url, timeout=5) as client:
+            while time.perf_counter() - start < timeout:
+                try:
+                    if "live_s" not in marks and client.get("/health/live").status_code == 200:
+                        marks["live_s"] = time.perf_counter() - start
+                    if "live_s" in marks and "decision_s" not in marks:
+                        if client.post("/decision", json={"current_node": "inicio"}).status_code == 200:
+                            marks["decision_s"] = time.perf_counter() - start
+                    if "live_s" in marks:
+                        ready = client.get("/health/ready")
+                        if ready.status_code == 200:
+                            marks["ready_s"] = time.perf_counter() - start
+                            marks["warmup"] = ready.json()
+                            break
+                except httpx.TransportError:
+                    pass
+                time.sleep(0.02)
+    finally:
+        process.terminate()
+        process.wait()
+    return marks
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tiempo de arranque e importación del servidor")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--output", help="Archivo JSON donde guardar los resultados")
+    args = parser.parse_args()
+
+    with FakeOllama() as fake, tempfile.TemporaryDirectory() as workdir:
+        env = {
+            **os.environ,
+            "OLLAMA_HOST": fake.url,
+            "CHROMA_PERSIST_DIRECTORY": str(Path(workdir) / "chroma_db"),
+        }
+        imports = [time_import(env) for _ in range(args.runs)]
+        servers = [time_server(env) for _ in range(args.runs)]
+
+    report = {
+        "import_s": imports,
+        "import_median_s": statistics.median(imports),
+        "runs": servers,
+    }
+    print(f"import server: mediana {report['import_median_s'] * 1000:.0f}ms")
+    for key in ("live_s", "decision_s", "ready_s"):
+        values = [run[key] for run in servers if key in run]
+        if values:
+            print(f"{key:<11} mediana {statistics.median(values) * 1000:.0f}ms")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
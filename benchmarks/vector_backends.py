@@ -0,0 +1,152 @@
+"""
+Comparación de backends vectoriales: ChromaDB (HNSW, float32) frente al
+índice cuantizado int8 en memoria mapeada (QuantizedIndex).
+
+Indexa los chunks del corpus de `documents/` con embeddings deterministas
+(los mismos del Ollama simulado) y mide para cada backend el tiempo de
+construcción y de apertura, el tamaño en disco, la latencia de consulta
+p50/p95/p99 y el recall@k frente a la búsqueda exacta en float32.
+
+Uso:
+    python -m benchmarks.vector_backends --limit 5 --k 5 10
+    python -m benchmarks.vector_backends --synthetic 50000
+"""
+
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Dict, Any
+
+import numpy as np
+
+from benchmarks.common import SAMPLE_QUESTIONS, summarize
+from benchmarks.fake_ollama import fake_embedding
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def corpus_texts(documents_dir: Path, limit: int) -> List[str]:
+    from document_loader import VALID_EXTENSIONS, load_chunks_task
+
+    files = sorted(
+        path for path in documents_dir.iterdir()
+        if path.is_file() and path.suffix.lower() in VALID_EXTENSIONS
+    )
+    if limit:
+        files = files[:limit]
+    texts = []
+    for path in files:
+        loaded = load_chunks_task(str(path), 1000, 200)
+        texts.extend(loaded["texts"])
+    return texts
+
+
+def directory_size(path: Path) -> int:
+    return sum(item.stat().st_size for item in path.rglob("*") if item.is_file())
+
+
+def open_backend(kind: str, directory: str):
+    from vector_backends import open_vector_backend
+
+    return open_vector_backend(kind, directory, "benchmark")
+
+
+def bench_backend(
+    kind: str,
+    directory: Path,
+    ids: List[str],
+    embeddings: np.ndarray,
+    queries: np.ndarray,
+    truth: np.ndarray,
+    ks: List[int],
+    batch_size: int,
+) -> Dict[str, Any]:
+    start = time.perf_counter()
+    backend = open_backend(kind, str(directory))
+    for offset in range(0, len(ids), batch_size):
+        backend.add(
+            ids=ids[offset:offset + batch_size],
+            embeddings=embeddings[offset:offset + batch_size].tolist(),
+            documents=[""] * len(ids[offset:offset + batch_size]),
+            metadatas=[{"row": offset + i} for i in range(len(ids[offset:offset + batch_size]))],
+        )
+    build_seconds = time.perf_counter() - start
+
+    results: Dict[str, Any] = {
+        "build_s": build_seconds,
+        "disk_bytes": directory_size(directory),
+        "k": {},
+    }
+
+    for k in ks:
+        latencies = []
+        recalls = []
+        for i, query in enumerate(queries):
+            query_start = time.perf_counter()
+            found = backend.query(query_embeddings=[query.tolist()], n_results=k, include=["distances"])
+            latencies.append(time.perf_counter() - query_start)
+            found_rows = {int(item_id) for item_id in found["ids"][0]}
+            recalls.append(len(found_rows & set(truth[i, :k].tolist())) / k)
+        results["k"][str(k)] = {"recall": float(np.mean(recalls)), **summarize(latencies)}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall@k y latencia: ChromaDB frente al índice int8")
+    parser.add_argument("--documents", default=str(REPO_ROOT / "documents"))
+    parser.add_argument("--limit", type=int, help="Máximo de documentos del corpus")
+    parser.add_argument("--synthetic", type=int, help="Usar N vectores aleatorios en lugar del corpus")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, nargs="+", default=[5, 10, 20])
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--output", help="Archivo JSON donde guardar los resultados")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    if args.synthetic:
+        embeddings = rng.normal(size=(args.synthetic, 768)).astype(np.float32)
+        queries = rng.normal(size=(args.queries, 768)).astype(np.float32)
+    else:
+        texts = corpus_texts(Path(args.documents), args.limit)
+        embeddings = np.asarray([fake_embedding(text) for text in texts], dtype=np.float32)
+        # Preguntas de ejemplo y fragmentos de chunks como consultas
+        samples = rng.choice(len(texts), size=max(0, args.queries - len(SAMPLE_QUESTIONS)), replace=True)
+        query_texts = SAMPLE_QUESTIONS + [texts[i][:200] for i in samples]
+        queries = np.asarray([fake_embedding(text) for text in query_texts], dtype=np.float32)
+
+    ids = [str(i) for i in range(len(embeddings))]
+    normalized = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+    normalized_queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    truth = np.argsort(-(normalized_queries @ normalized.T), axis=1)[:, :max(args.k)]
+    print(f"{len(ids)} vectores, {len(queries)} consultas")
+
+    report: Dict[str, Any] = {"vectors": len(ids), "queries": len(queries), "backends": {}}
+    with tempfile.TemporaryDirectory() as workdir:
+        for kind in ("chroma", "quantized"):
+            directory = Path(workdir) / kind
+            results = bench_backend(kind, directory, ids, embeddings, queries, truth, args.k, args.batch_size)
+
+            # Apertura en frío del índice ya construido
+            start = time.perf_counter()
+            open_backend(kind, str(directory)).count()
+            results["open_s"] = time.perf_counter() - start
+            report["backends"][kind] = results
+
+            print(
+                f"{kind:<10} construcción {results['build_s']:.2f}s, apertura {results['open_s'] * 1000:.1f}ms, "
+                f"disco {results['disk_bytes'] / 1e6:.1f} MB"
+            )
+            for k, stats in results["k"].items():
+                print(
+                    f"{'':<10} k={k:<3} recall={stats['recall']:.3f} p50={stats['p50_ms']:.2f}ms "
+                    f"p95={stats['p95_ms']:.2f}ms p99={stats['p99_ms']:.2f}ms"
+                )
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+import re
+from typing import List, Dict, Any, Tuple
+import numpy as np
+
+# Aproximación para llama3.1 con texto en español: ~4 caracteres por token
+CHARS_PER_TOKEN = 4
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_WHITESPACE = re.compile(r"\s+")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estima el número de tokens de un texto sin cargar el tokenizador
+    """
+    return max(1, (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN)
+
+
+def merge_overlapping(first: str, second: str, max_overlap: int = 400, min_overlap: int = 20) -> str:
+    """
+    Une dos chunks consecutivos eliminando el solapamiento del splitter
+    (sufijo del primero igual al prefijo del segundo)
+    """
+    limit = min(len(first), len(second), max_overlap)
+    for size in range(limit, min_overlap - 1, -1):
+        if first.endswith(second[:size]):
+            return first + second[size:]
+    return first + "\n" + second
+
+
+class MinHasher:
+    def __init__(self, num_perm: int = 64, shingle_size: int = 5, seed: int = 1):
+        """
+        Firmas MinHash sobre shingles de caracteres para estimar similitud de Jaccard
+        """
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(seed)
+        # Coeficientes < 2^32: con hashes de 32 bits el producto no desborda uint64
+        self._a = rng.integers(1, 1 << 32, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, 1 << 32, size=num_perm, dtype=np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        text = _WHITESPACE.sub(" ", text.lower()).strip()
+        size = self.shingle_size
+        shingles = {text[i:i + size] for i in range(max(1, len(text) - size + 1))}
+        hashes = np.fromiter((hash(shingle) & 0xFFFFFFFF for shingle in shingles), dtype=np.uint64, count=len(shingles))
+        # Permutaciones universales (a*x + b) mod p, vectorizadas por shingle
+        permuted = (hashes[:, None] * self._a[None, :] + self._b[None, :]) % _MERSENNE_PRIME
+        return permuted.min(axis=0)
+
+    @staticmethod
+    def similarity(first: np.ndarray, second: np.ndarray) -> float:
+        return float(np.mean(first == second))
+
+
+def _score(result: Dict[str, Any]) -> float:
+    return result.get("score", result.get("similarity", 0.0))
+
+
+def merge_adjacent(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Agrupa por fuente y une en un solo pasaje los chunks con chunk_index
+    consecutivo. Cada pasaje conserva los ids de sus chunks y los metadatos
+    del primero.
+    """
+    by_source: Dict[str, List[Tuple[int, Dict[str, Any]]]] = {}
+    passages = []
+    for rank, result in enumerate(results):
+        metadata = result.get("metadata") or {}
+        if "chunk_index" not in metadata:
+            passages.append({"text": result["document"], "score": _score(result),
+                             "similarity": result.get("similarity", 0.0), "rank": rank, "chunks": 1,
+                             "ids": [result["id"]] if "id" in result else [], "metadata": metadata})
+            continue
+        by_source.setdefault(metadata.get("source", ""), []).append((rank, result))
+
+    for items in by_source.values():
+        items.sort(key=lambda item: item[1]["metadata"]["chunk_index"])
+        current = None
+        for rank, result in items:
+            index = result["metadata"]["chunk_index"]
+            if current is not None and index == current["last_index"] + 1:
+                current["text"] = merge_overlapping(current["text"], result["document"])
+                current["score"] = max(current["score"], _score(result))
+                current["similarity"] = max(current["similarity"], result.get("similarity", 0.0))
+                current["rank"] = min(current["rank"], rank)
+                current["chunks"] += 1
+                if "id" in result:
+                    current["ids"].append(result["id"])
+                current["last_index"] = index
+                continue
+            if current is not None:
+                passages.append(current)
+            current = {"text": result["document"], "score": _score(result),
+                       "similarity": result.get("similarity", 0.0), "rank": rank,
+                       "chunks": 1, "ids": [result["id"]] if "id" in result else [],
+                       "metadata": result["metadata"], "last_index": index}
+        if current is not None:
+            passages.append(current)
+
+    for passage in passages:
+        passage.pop("last_index", None)
+    return passages
+
+
+def assemble_context(
+    results: List[Dict[str, Any]],
+    token_budget: int = 2000,
+    dedup_threshold: float = 0.8,
+    hasher: MinHasher = None,
+) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+    """
+    Prepara los pasajes del prompt: une chunks adyacentes de la misma fuente,
+    descarta casi duplicados (MinHash) y empaqueta los mejores pasajes dentro
+    de `token_budget`. Devuelve los pasajes y las estadísticas de ahorro.
+    """
+    hasher = hasher or MinHasher()
+    tokens_before = sum(estimate_tokens(result["document"]) for result in results)
+
+    passages = merge_adjacent(results)
+    passages.sort(key=lambda passage: (-passage["score"], passage["rank"]))
+
+    kept, signatures = [], []
+    duplicates = 0
+    for passage in passages:
+        signature = hasher.signature(passage["text"])
+        if any(MinHasher.similarity(signature, other) >= dedup_threshold for other in signatures):
+            duplicates += 1
+            continue
+        kept.append(passage)
+        signatures.append(signature)
+
+    packed = []
+    used = 0
+    over_budget = 0
+    for passage in kept:
+        tokens = estimate_tokens(passage["text"])
+        if used + tokens > token_budget:
+            if not packed:
+                # El mejor pasaje no cabe entero: se recorta al presupuesto
+                passage = {**passage, "text": passage["text"][:token_budget * CHARS_PER_TOKEN]}
+                tokens = estimate_tokens(passage["text"])
+            else:
+                over_budget += 1
+                continue
+        packed.append(passage)
+        used += tokens
+
+    stats = {
+        "chunks": len(results),
+        "passages": len(packed),
+        "merged_chunks": len(results) - len(passages),
+        "duplicates_dropped": duplicates,
+        "over_budget_dropped": over_budget,
+        "tokens_before": tokens_before,
+        "tokens_after": used,
+        "tokens_saved": tokens_before - used,
+    }
+    return packed, stats
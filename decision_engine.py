@@ -0,0 +1,434 @@
+from bisect import bisect_right
+from typing import List, Dict, Any, Optional, Iterable
+import numpy as np
+
+# Unidad del nodo numérico -> campo de entrada que se evalúa
+UNIT_VARIABLES = {
+    "meses": "edad_meses",
+    "kg": "peso_kg",
+}
+
+
+ANSWER_CODES = {True: 1, False: 0, "si": 1, "sí": 1, "no": 0}
+
+
+def answer_code(value: Any) -> int:
+    """
+    Codifica una respuesta Sí/No: 1 (sí), 0 (no), -1 (sin respuesta o no válida)
+    """
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, str):
+        value = value.lower().strip()
+        if value in ("si", "sí"):
+            return 1
+        if value == "no":
+            return 0
+    return -1
+
+
+class DecisionTreeError(ValueError):
+    """Error de validación al compilar un árbol de decisión"""
+
+    def __init__(self, problems: List[str]):
+        self.problems = problems
+        super().__init__("Árbol de decisión inválido:\n- " + "\n- ".join(problems))
+
+
+class CompiledDecisionTree:
+    def __init__(self, tree: Dict[str, Any]):
+        """
+        Compila el árbol una sola vez: índice plano id -> nodo, transiciones
+        Sí/No resueltas a su respuesta final y tablas de rangos ordenadas para
+        buscar con bisect. Lanza DecisionTreeError si el árbol no es válido.
+        """
+        self.root_id = tree.get("id")
+        self.nodes: Dict[str, Dict[str, Any]] = {}
+        self._problems: List[str] = []
+
+        raw_nodes: Dict[str, Dict[str, Any]] = {}
+        self._collect(tree, raw_nodes)
+
+        for node_id, node in raw_nodes.items():
+            self.nodes[node_id] = self._compile_node(node, raw_nodes)
+
+        if not self._problems:
+            self._check_cycles()
+        if self._problems:
+            raise DecisionTreeError(self._problems)
+
+        self._build_state_tables()
+
+    def _collect(self, node: Any, raw_nodes: Dict[str, Dict[str, Any]]):
+        """
+        Recorre el árbol y registra todos los nodos con id
+        """
+        if isinstance(node, list):
+            for item in node:
+                self._collect(item, raw_nodes)
+            return
+        if not isinstance(node, dict):
+            return
+
+        node_id = node.get("id")
+        if node_id is not None:
+            if node_id in raw_nodes and raw_nodes[node_id] is not node:
+                self._problems.append(f"id duplicado: '{node_id}'")
+            raw_nodes[node_id] = node
+
+        for value in node.values():
+            self._collect(value, raw_nodes)
+
+    @staticmethod
+    def _response(node: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Respuesta de la API al llegar a un nodo (resultado o siguiente pregunta)
+        """
+        if "resultado" in node:
+            return {"type": "resultado", "resultado": node["resultado"], "detalle": node.get("detalle")}
+        return {"type": "pregunta", "next_id": node.get("id", ""), "pregunta": node.get("pregunta")}
+
+    def _target(self, owner: str, branch: Dict[str, Any], raw_nodes: Dict[str, Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """
+        Resuelve el destino de una transición (nodo anidado, resultado o next_id)
+        """
+        if "resultado" in branch:
+            if "detalle" not in branch:
+                self._problems.append(f"resultado sin detalle en '{owner}'")
+            return {"response": self._response(branch), "node_id": None}
+
+        target_id = branch.get("next_id", branch.get("id"))
+        if target_id is None:
+            self._problems.append(f"transición sin destino en '{owner}'")
+            return None
+        if target_id not in raw_nodes:
+            self._problems.append(f"next_id colgante en '{owner}': '{target_id}'")
+            return None
+        return {"response": self._response(raw_nodes[target_id]), "node_id": target_id}
+
+    def _compile_node(self, node: Dict[str, Any], raw_nodes: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+        node_id = node["id"]
+        compiled: Dict[str, Any] = {
+            "id": node_id,
+            "pregunta": node.get("pregunta"),
+            "response": self._response(node),
+        }
+
+        if "resultado" in node:
+            compiled["kind"] = "resultado"
+            return compiled
+
+        if node.get("inputType") == "number":
+            compiled["kind"] = "number"
+            compiled["variable"] = UNIT_VARIABLES.get(node.get("unidad"))
+            if compiled["variable"] is None:
+                # Sin unidad reconocida: mismo criterio que antes (por el texto de la pregunta)
+                pregunta = (node.get("pregunta") or "").lower()
+                compiled["variable"] = "edad_meses" if "edad" in pregunta else "peso_kg"
+
+            rangos = node.get("rangos") or []
+            if not rangos:
+                self._problems.append(f"nodo numérico sin rangos: '{node_id}'")
+
+            table = []
+            for rango in rangos:
+                min_v = rango.get("min", 0)
+                max_v = rango.get("max", float("inf"))
+                min_v = float("-inf") if min_v is None else min_v
+                max_v = float("inf") if max_v is None else max_v
+                if min_v >= max_v:
+                    self._problems.append(f"rango vacío en '{node_id}': [{min_v}, {max_v})")
+                table.append((min_v, max_v, self._target(node_id, rango, raw_nodes)))
+
+            table.sort(key=lambda row: row[0])
+            for (_, prev_max, _), (next_min, _, _) in zip(table, table[1:]):
+                if prev_max > next_min:
+                    self._problems.append(f"rangos solapados en '{node_id}' alrededor de {next_min}")
+
+            compiled["mins"] = [row[0] for row in table]
+            compiled["maxs"] = [row[1] for row in table]
+            compiled["targets"] = [row[2] for row in table]
+            return compiled
+
+        compiled["kind"] = "pregunta"
+        compiled["transitions"] = {}
+        for answer in ("si", "no"):
+            branch = node.get(answer)
+            if branch is None:
+                continue
+            if not isinstance(branch, dict):
+                self._problems.append(f"rama '{answer}' inválida en '{node_id}'")
+                continue
+            compiled["transitions"][answer] = self._target(node_id, branch, raw_nodes)
+
+        if "opciones" in node:
+            compiled["opciones"] = [opt["texto"] for opt in node["opciones"]]
+        elif not compiled["transitions"]:
+            self._problems.append(f"nodo sin transiciones: '{node_id}'")
+
+        return compiled
+
+    def _successors(self, node: Dict[str, Any]) -> List[str]:
+        if node["kind"] == "number":
+            targets = node["targets"]
+        else:
+            targets = node.get("transitions", {}).values()
+        return [target["node_id"] for target in targets if target and target["node_id"]]
+
+    def _check_cycles(self):
+        """
+        Detecta ciclos entre nodos (harían infinita la evaluación por lotes)
+        """
+        visiting, done = set(), set()
+
+        def visit(node_id: str, trail: List[str]):
+            if node_id in done:
+                return
+            if node_id in visiting:
+                self._problems.append("ciclo en el árbol: " + " -> ".join(trail + [node_id]))
+                return
+            visiting.add(node_id)
+            for successor in self._successors(self.nodes[node_id]):
+                visit(successor, trail + [node_id])
+            visiting.discard(node_id)
+            done.add(node_id)
+
+        for node_id in self.nodes:
+            visit(node_id, [])
+
+    def _build_state_tables(self):
+        """
+        Numera nodos y resultados para la evaluación vectorizada.
+        Estados: [0, Q) nodos pregunta, [Q, Q+R) resultados y después los errores.
+        """
+        self.question_ids = [node_id for node_id, node in self.nodes.items() if node["kind"] != "resultado"]
+        question_state = {node_id: i for i, node_id in enumerate(self.question_ids)}
+
+        # Resultados distintos alcanzables (hojas y nodos resultado con id)
+        self.outcomes: List[Dict[str, Any]] = []
+        outcome_state: Dict[tuple, int] = {}
+        for node in self.nodes.values():
+            targets = node.get("targets") or list(node.get("transitions", {}).values())
+            if node["kind"] == "resultado":
+                targets = [{"node_id": None, "response": node["response"]}]
+            for target in targets:
+                if target is None or target["node_id"] in question_state:
+                    continue
+                response = target["response"]
+                key = (response["resultado"], response["detalle"])
+                if key not in outcome_state:
+                    outcome_state[key] = len(self.question_ids) + len(self.outcomes)
+                    self.outcomes.append(response)
+
+        first_error = len(self.question_ids) + len(self.outcomes)
+        self.ERROR_MISSING_ANSWER = first_error
+        self.ERROR_MISSING_VALUE = first_error + 1
+        self.ERROR_OUT_OF_RANGE = first_error + 2
+        self.ERROR_INVALID = first_error + 3
+
+        def state_of(target: Optional[Dict[str, Any]]) -> int:
+            if target is None:
+                return self.ERROR_INVALID
+            if target["node_id"] in question_state:
+                return question_state[target["node_id"]]
+            response = target["response"]
+            return outcome_state[(response["resultado"], response["detalle"])]
+
+        self._state_tables = []
+        for node_id in self.question_ids:
+            node = self.nodes[node_id]
+            if node["kind"] == "number":
+                self._state_tables.append({
+                    "mins": np.array(node["mins"], dtype=np.float64),
+                    "maxs": np.array(node["maxs"], dtype=np.float64),
+                    "targets": np.array([state_of(target) for target in node["targets"]], dtype=np.int64),
+                })
+            else:
+                transitions = node["transitions"]
+                self._state_tables.append({answer: state_of(transitions.get(answer)) for answer in ("si", "no")})
+
+        self.root_state = question_state.get(self.root_id, self.ERROR_INVALID)
+
+    def evaluate_columns(
+        self,
+        edad_meses: Iterable[Optional[float]],
+        peso_kg: Iterable[Optional[float]],
+        respuestas: Dict[str, Iterable[int]],
+    ) -> Dict[str, List[Any]]:
+        """
+        Evalúa el árbol completo para muchos pacientes a la vez.
+
+        `respuestas` asigna a cada id de nodo Sí/No un arreglo con 1 (sí),
+        0 (no) o -1 (sin respuesta). Todos los pacientes avanzan un nivel por
+        iteración con máscaras NumPy y los umbrales se buscan con
+        searchsorted. Devuelve columnas resultado, detalle, path y error.
+        """
+        values = {
+            "edad_meses": np.asarray(edad_meses, dtype=np.float64),
+            "peso_kg": np.asarray(peso_kg, dtype=np.float64),
+        }
+        n = len(values["edad_meses"])
+        answers = {node_id: np.asarray(column, dtype=np.int8) for node_id, column in respuestas.items()}
+        no_answer = np.full(n, -1, dtype=np.int8)
+
+        n_questions = len(self.question_ids)
+        state = np.full(n, self.root_state, dtype=np.int64)
+        stop_node = np.full(n, -1, dtype=np.int64)
+
+        # Caminos: cada código identifica una secuencia de nodos recorridos
+        path_code = np.zeros(n, dtype=np.int64)
+        paths: List[tuple] = [(self.root_id,) if self.root_state < n_questions else ()]
+
+        for _ in range(n_questions + 1):
+            active = state < n_questions
+            if not active.any():
+                break
+
+            next_state = state.copy()
+            for q in np.unique(state[active]):
+                table = self._state_tables[q]
+                node = self.nodes[self.question_ids[q]]
+                rows = np.flatnonzero(state == q)
+
+                if node["kind"] == "number":
+                    column = values[node["variable"]][rows]
+                    index = np.searchsorted(table["mins"], column, side="right") - 1
+                    safe = np.clip(index, 0, len(table["mins"]) - 1)
+                    in_range = (index >= 0) & (column < table["maxs"][safe])
+                    moved = np.where(in_range, table["targets"][safe], self.ERROR_OUT_OF_RANGE)
+                    moved = np.where(np.isnan(column), self.ERROR_MISSING_VALUE, moved)
+                else:
+                    column = answers.get(node["id"], no_answer)[rows]
+                    moved = np.where(
+                        column == 1, table["si"],
+                        np.where(column == 0, table["no"], self.ERROR_MISSING_ANSWER)
+                    )
+
+                next_state[rows] = moved
+                stop_node[rows] = q
+
+            # Extender los códigos de camino solo con los nodos pregunta alcanzados
+            step = np.where(active & (next_state < n_questions), next_state, n_questions)
+            combined = path_code * (n_questions + 1) + step
+            unique, path_code = np.unique(combined, return_inverse=True)
+            new_paths = []
+            for value in unique:
+                old_code, reached = divmod(int(value), n_questions + 1)
+                path = paths[old_code]
+                if reached < n_questions:
+                    path = path + (self.question_ids[reached],)
+                new_paths.append(path)
+            paths = new_paths
+            state = next_state
+
+        messages = {
+            self.ERROR_MISSING_ANSWER: "Falta la respuesta Sí/No del nodo '{}'",
+            self.ERROR_MISSING_VALUE: "Falta el valor numérico del nodo '{}'",
+            self.ERROR_OUT_OF_RANGE: "Valor fuera de rango en el nodo '{}'",
+            self.ERROR_INVALID: "Respuesta no válida para el nodo '{}'",
+        }
+
+        resultado: List[Optional[str]] = [None] * n
+        detalle: List[Optional[str]] = [None] * n
+        error: List[Optional[str]] = [None] * n
+
+        for final in np.unique(state):
+            rows = np.flatnonzero(state == final).tolist()
+            if final < n_questions:
+                continue
+            if final < self.ERROR_MISSING_ANSWER:
+                outcome = self.outcomes[final - n_questions]
+                for row in rows:
+                    resultado[row] = outcome["resultado"]
+                    detalle[row] = outcome["detalle"]
+            else:
+                for row in rows:
+                    node_index = stop_node[row]
+                    node_id = self.question_ids[node_index] if node_index >= 0 else self.root_id
+                    error[row] = messages[final].format(node_id)
+
+        path_list = [list(paths[code]) for code in path_code.tolist()]
+        return {"resultado": resultado, "detalle": detalle, "path": path_list, "error": error}
+
+    def evaluate_records(self, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Evalúa registros completos de pacientes ({"edad_meses", "peso_kg",
+        "respuestas": {id_nodo: sí/no}}) y devuelve un resultado por registro
+        """
+        n = len(records)
+        edad = [np.nan if record.get("edad_meses") is None else record["edad_meses"] for record in records]
+        peso = [np.nan if record.get("peso_kg") is None else record["peso_kg"] for record in records]
+
+        respuestas: Dict[str, np.ndarray] = {}
+        for i, record in enumerate(records):
+            for node_id, value in (record.get("respuestas") or {}).items():
+                column = respuestas.get(node_id)
+                if column is None:
+                    column = respuestas[node_id] = [-1] * n
+                # Búsqueda directa para los valores habituales
+                code = ANSWER_CODES.get(value) if isinstance(value, (bool, str)) else None
+                column[i] = answer_code(value) if code is None else code
+        respuestas = {node_id: np.array(column, dtype=np.int8) for node_id, column in respuestas.items()}
+
+        columns = self.evaluate_columns(edad, peso, respuestas)
+        return [
+            {
+                "resultado": columns["resultado"][i],
+                "detalle": columns["detalle"][i],
+                "path": columns["path"][i],
+                "error": columns["error"][i],
+            }
+            for i in range(n)
+        ]
+
+    def range_target(self, node: Dict[str, Any], value: float) -> Optional[Dict[str, Any]]:
+        """
+        Busca con bisect el rango [min, max) que contiene el valor
+        """
+        index = bisect_right(node["mins"], value) - 1
+        if index < 0 or value >= node["maxs"][index]:
+            return None
+        return node["targets"][index]
+
+    def step(
+        self,
+        node_id: str,
+        respuesta: Optional[str] = None,
+        edad_meses: Optional[float] = None,
+        peso_kg: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """
+        Evalúa un paso del árbol según la respuesta o los valores numéricos
+        """
+        node = self.nodes.get(node_id)
+        if node is None:
+            return {"error": "Nodo no encontrado", "next": self.root_id}
+
+        # Caso: resultado final
+        if node["kind"] == "resultado":
+            return dict(node["response"])
+
+        # === Caso numérico (edad o peso) ===
+        if node["kind"] == "number":
+            valor = edad_meses if node["variable"] == "edad_meses" else peso_kg
+            if valor is None:
+                return {"error": "Se esperaba un valor numérico."}
+            target = self.range_target(node, valor)
+            if target is None:
+                return {"error": "Valor fuera de rango o no reconocido"}
+            return dict(target["response"])
+
+        # === Caso respuesta Sí/No ===
+        if respuesta:
+            answer = respuesta.lower().strip()
+            answer = "si" if answer == "sí" else answer
+            target = node["transitions"].get(answer)
+            if target is None:
+                return {"error": "Respuesta no válida para este nodo"}
+            return dict(target["response"])
+
+        # === Caso opciones de texto ===
+        if "opciones" in node:
+            return {**node["response"], "opciones": node["opciones"]}
+
+        return dict(node["response"])
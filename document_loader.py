@@ -0,0 +1,122 @@
+import time
+from pathlib import Path
+from typing import List, Dict, Any, Iterable, Iterator, TYPE_CHECKING
+
+# LangChain se importa al usarse: tarda en cargar y el servidor no lo necesita para arrancar
+if TYPE_CHECKING:
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+VALID_EXTENSIONS = [".pdf", ".docx", ".doc", ".txt"]
+
+# Splitter por proceso, reutilizado entre tareas del pool
+_worker_splitters: Dict[tuple, "RecursiveCharacterTextSplitter"] = {}
+
+
+def make_text_splitter(chunk_size: int = 1000, chunk_overlap: int = 200) -> "RecursiveCharacterTextSplitter":
+    """
+    Crea el text splitter usado para dividir los documentos en chunks
+    """
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        length_function=len,
+        separators=["\n\n", "\n", ". ", "! ", "? ", " ", ""]
+    )
+
+
+def iter_pages(file_path: str, block_chars: int = 65536) -> Iterator[str]:
+    """
+    Extrae el texto de un documento página a página, sin cargarlo entero.
+    Los PDF se leen con pypdf de forma perezosa; los .txt en bloques de
+    líneas de unos `block_chars` caracteres; los .docx como un único bloque.
+    """
+    file_path = Path(file_path)
+    suffix = file_path.suffix.lower()
+
+    if suffix == '.pdf':
+        from pypdf import PdfReader
+
+        with open(file_path, 'rb') as f:
+            reader = PdfReader(f)
+            for page in reader.pages:
+                yield page.extract_text()
+                # pypdf guarda cada objeto que resuelve: sin vaciarlo, la
+                # memoria crece con el número de páginas leídas. Es un
+                # atributo interno (comprobado con pypdf 6.20.1): si una
+                # versión lo quita, solo se pierde la liberación.
+                resolved_objects = getattr(reader, "resolved_objects", None)
+                if isinstance(resolved_objects, dict):
+                    resolved_objects.clear()
+    elif suffix in ['.docx', '.doc']:
+        import docx2txt
+
+        yield docx2txt.process(str(file_path))
+    elif suffix == '.txt':
+        with open(file_path, encoding='utf-8') as f:
+            lines, size = [], 0
+            for line in f:
+                lines.append(line)
+                size += len(line)
+                if size >= block_chars:
+                    # Sin el salto final: iter_chunks vuelve a unir los bloques con "\n"
+                    yield "".join(lines)[:-1] if line.endswith("\n") else "".join(lines)
+                    lines, size = [], 0
+            if lines:
+                yield "".join(lines)
+    else:
+        raise ValueError(f"Tipo de archivo no soportado: {file_path.suffix}")
+
+
+def iter_chunks(pages: Iterable[str], text_splitter: "RecursiveCharacterTextSplitter") -> Iterator[str]:
+    """
+    Divide en chunks un flujo de páginas de forma incremental.
+
+    El último chunk de cada página no se emite todavía: se antepone a la
+    página siguiente, de modo que los chunks (y su solapamiento) cruzan los
+    límites de página. En memoria solo quedan la página actual y ese resto.
+    """
+    carry = ""
+    for page in pages:
+        text = f"{carry}\n{page}" if carry else page
+        chunks = text_splitter.split_text(text)
+        if not chunks:
+            carry = ""
+            continue
+        yield from chunks[:-1]
+        carry = chunks[-1]
+    if carry:
+        yield carry
+
+
+def load_chunks(file_path: str, text_splitter: "RecursiveCharacterTextSplitter") -> List[str]:
+    """
+    Carga un documento según su extensión y lo divide en chunks
+    """
+    return list(iter_chunks(iter_pages(file_path), text_splitter))
+
+
+def load_chunks_task(file_path: str, chunk_size: int, chunk_overlap: int) -> Dict[str, Any]:
+    """
+    Tarea para el pool de procesos: carga y divide un documento midiendo el tiempo.
+    Los errores se devuelven en el resultado para no abortar el resto del lote.
+    """
+    key = (chunk_size, chunk_overlap)
+    if key not in _worker_splitters:
+        _worker_splitters[key] = make_text_splitter(chunk_size, chunk_overlap)
+
+    start = time.perf_counter()
+    try:
+        texts = load_chunks(file_path, _worker_splitters[key])
+        error = None
+    except Exception as e:
+        texts = []
+        error = str(e)
+
+    return {
+        "file_path": file_path,
+        "texts": texts,
+        "error": error,
+        "seconds": time.perf_counter() - start,
+    }
@@ -0,0 +1,157 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Tuple
+
+
+def file_sha256(file_path: str, block_size: int = 1 << 20) -> str:
+    """
+    Calcula el hash SHA-256 del contenido de un archivo
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def text_sha256(text: str) -> str:
+    """
+    Calcula el hash SHA-256 de un chunk de texto
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class DocumentManifest:
+    FILE_COLUMNS = ["filename", "source", "size", "mtime", "sha256", "chunk_count", "ingested_at"]
+
+    def __init__(self, path: str):
+        """
+        Manifiesto de ingesta y registro de documentos en SQLite.
+
+        Guarda por archivo su tamaño, mtime, hash de contenido, número de
+        chunks y fecha de ingesta, y por chunk su id en la colección, su
+        posición y el hash de su texto.
+        """
+        self.path = path
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS files (
+                filename TEXT PRIMARY KEY,
+                source TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime REAL NOT NULL,
+                sha256 TEXT NOT NULL,
+                chunk_count INTEGER NOT NULL,
+                ingested_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS chunks (
+                chunk_id TEXT PRIMARY KEY,
+                filename TEXT NOT NULL,
+                chunk_index INTEGER NOT NULL,
+                text_hash TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_chunks_filename ON chunks (filename);
+            """
+        )
+        self._conn.commit()
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM files LIMIT 1").fetchone() is None
+
+    def list_files(self) -> List[Dict[str, Any]]:
+        """
+        Devuelve el registro de todos los archivos
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(self.FILE_COLUMNS)} FROM files ORDER BY filename"
+            ).fetchall()
+        return [dict(zip(self.FILE_COLUMNS, row)) for row in rows]
+
+    def get_file(self, filename: str) -> Optional[Dict[str, Any]]:
+        """
+        Devuelve el registro de un archivo o None si no está en el manifiesto
+        """
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(self.FILE_COLUMNS)} FROM files WHERE filename = ?",
+                (filename,)
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(self.FILE_COLUMNS, row))
+
+    def get_chunks(self, filename: str) -> Dict[str, Tuple[int, str]]:
+        """
+        Devuelve {chunk_id: (chunk_index, text_hash)} de un archivo
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT chunk_id, chunk_index, text_hash FROM chunks WHERE filename = ?",
+                (filename,)
+            ).fetchall()
+        return {chunk_id: (chunk_index, text_hash) for chunk_id, chunk_index, text_hash in rows}
+
+    def get_chunk_ids(self, filename: str) -> List[str]:
+        """
+        Devuelve los ids de los chunks de un archivo en orden
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT chunk_id FROM chunks WHERE filename = ? ORDER BY chunk_index",
+                (filename,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def record_file(
+        self,
+        filename: str,
+        source: str,
+        size: int,
+        mtime: float,
+        sha256: str,
+        chunks: List[Tuple[str, int, str]],
+    ):
+        """
+        Registra un archivo y reemplaza sus chunks en una sola transacción
+        """
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM chunks WHERE filename = ?", (filename,))
+            self._conn.executemany(
+                "INSERT INTO chunks (chunk_id, filename, chunk_index, text_hash) VALUES (?, ?, ?, ?)",
+                [(chunk_id, filename, index, text_hash) for chunk_id, index, text_hash in chunks]
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO files (filename, source, size, mtime, sha256, chunk_count, ingested_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (filename, source, size, mtime, sha256, len(chunks), time.time())
+            )
+
+    def touch_file(self, filename: str, size: int, mtime: float):
+        """
+        Actualiza tamaño y mtime de un archivo cuyo contenido no cambió
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE files SET size = ?, mtime = ? WHERE filename = ?",
+                (size, mtime, filename)
+            )
+
+    def remove_file(self, filename: str):
+        """
+        Elimina un archivo y sus chunks del manifiesto
+        """
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM chunks WHERE filename = ?", (filename,))
+            self._conn.execute("DELETE FROM files WHERE filename = ?", (filename,))
+
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,125 @@
+import hashlib
+import sqlite3
+import threading
+import logging
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Optional, Dict
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingCache:
+    def __init__(self, path: Optional[str] = None, max_memory_items: int = 10000):
+        """
+        Caché de embeddings direccionada por contenido.
+
+        La clave es el hash SHA-256 del modelo y el texto. Hay un nivel en
+        memoria (LRU) y, si se indica `path`, un nivel persistente en SQLite
+        donde los vectores se guardan como float32.
+        """
+        self.max_memory_items = max_memory_items
+        self.path = path
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._conn = None
+        if path:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+            )
+            self._conn.commit()
+
+    @staticmethod
+    def make_key(model: str, text: str) -> str:
+        """
+        Calcula la clave de caché para un modelo y un texto
+        """
+        return hashlib.sha256(f"{model}\x00{text}".encode("utf-8")).hexdigest()
+
+    def _remember(self, key: str, vector: List[float]):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    def get_many(self, keys: List[str]) -> List[Optional[List[float]]]:
+        """
+        Busca varias claves; devuelve None en las posiciones sin entrada
+        """
+        results: List[Optional[List[float]]] = [None] * len(keys)
+        pending: Dict[str, List[int]] = {}
+
+        with self._lock:
+            for i, key in enumerate(keys):
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    results[i] = vector
+                    self.hits += 1
+                else:
+                    pending.setdefault(key, []).append(i)
+
+            if pending and self._conn is not None:
+                found = {}
+                pending_keys = list(pending)
+                # SQLite limita el número de parámetros por consulta
+                for start in range(0, len(pending_keys), 500):
+                    block = pending_keys[start:start + 500]
+                    placeholders = ",".join("?" * len(block))
+                    rows = self._conn.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", block
+                    ).fetchall()
+                    for key, blob in rows:
+                        found[key] = array("f", blob).tolist()
+
+                for key, vector in found.items():
+                    self._remember(key, vector)
+                    for i in pending.pop(key):
+                        results[i] = vector
+                        self.hits += 1
+                        self.disk_hits += 1
+
+            self.misses += sum(len(positions) for positions in pending.values())
+
+        return results
+
+    def put_many(self, keys: List[str], vectors: List[List[float]]):
+        """
+        Guarda varios embeddings en ambos niveles
+        """
+        with self._lock:
+            for key, vector in zip(keys, vectors):
+                self._remember(key, vector)
+
+            if self._conn is not None:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                    [(key, array("f", vector).tobytes()) for key, vector in zip(keys, vectors)]
+                )
+                self._conn.commit()
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Devuelve los contadores de aciertos y fallos
+        """
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "memory_items": len(self._memory),
+        }
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
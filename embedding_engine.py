@@ -0,0 +1,171 @@
+import time
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Dict, Any
+import ollama
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingEngine:
+    def __init__(
+        self,
+        model: str = "nomic-embed-text",
+        batch_size: int = 32,
+        max_in_flight: int = 4,
+        host: Optional[str] = None,
+    ):
+        """
+        Motor de embeddings por lotes contra Ollama.
+
+        Agrupa los textos en lotes de `batch_size` y mantiene como máximo
+        `max_in_flight` peticiones simultáneas. Usa `/api/embed` (una sola
+        llamada por lote) y, si el servidor no lo soporta, recurre a
+        `/api/embeddings` texto a texto sobre el mismo pool de conexiones.
+        """
+        if batch_size < 1:
+            raise ValueError("batch_size debe ser >= 1")
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight debe ser >= 1")
+
+        self.model = model
+        self.batch_size = batch_size
+        self.max_in_flight = max_in_flight
+
+        # Un único cliente: httpx reutiliza las conexiones entre hilos
+        self.client = ollama.Client(host=host)
+        self.async_client = ollama.AsyncClient(host=host)
+        self.batch_supported = True
+        self.last_stats: Dict[str, Any] = {}
+
+    def _embed_batch(self, batch: List[str]) -> List[Optional[List[float]]]:
+        """
+        Genera los embeddings de un lote; los fallos individuales quedan en None
+        """
+        if self.batch_supported:
+            try:
+                response = self.client.embed(model=self.model, input=batch)
+                embeddings = list(response["embeddings"])
+                if len(embeddings) == len(batch):
+                    return embeddings
+                logger.warning(
+                    f"Respuesta de embed incompleta ({len(embeddings)}/{len(batch)}), reintentando por elemento"
+                )
+            except ollama.ResponseError as e:
+                if e.status_code == 404:
+                    # Servidor Ollama antiguo sin /api/embed
+                    logger.info("El servidor no soporta embeddings por lotes, usando llamadas individuales")
+                    self.batch_supported = False
+                else:
+                    logger.warning(f"Error en lote de embeddings, reintentando por elemento: {e}")
+            except Exception as e:
+                logger.warning(f"Error en lote de embeddings, reintentando por elemento: {e}")
+
+        return [self._embed_one(text) for text in batch]
+
+    def _embed_one(self, text: str) -> Optional[List[float]]:
+        """
+        Genera el embedding de un único texto
+        """
+        try:
+            if self.batch_supported:
+                return list(self.client.embed(model=self.model, input=text)["embeddings"][0])
+            return list(self.client.embeddings(model=self.model, prompt=text)["embedding"])
+        except Exception as e:
+            logger.error(f"Error generando embedding: {e}")
+            return None
+
+    async def _aembed_batch(self, batch: List[str]) -> List[Optional[List[float]]]:
+        """
+        Versión asíncrona de _embed_batch
+        """
+        if self.batch_supported:
+            try:
+                response = await self.async_client.embed(model=self.model, input=batch)
+                embeddings = list(response["embeddings"])
+                if len(embeddings) == len(batch):
+                    return embeddings
+                logger.warning(
+                    f"Respuesta de embed incompleta ({len(embeddings)}/{len(batch)}), reintentando por elemento"
+                )
+            except ollama.ResponseError as e:
+                if e.status_code == 404:
+                    logger.info("El servidor no soporta embeddings por lotes, usando llamadas individuales")
+                    self.batch_supported = False
+                else:
+                    logger.warning(f"Error en lote de embeddings, reintentando por elemento: {e}")
+            except Exception as e:
+                logger.warning(f"Error en lote de embeddings, reintentando por elemento: {e}")
+
+        return [await self._aembed_one(text) for text in batch]
+
+    async def _aembed_one(self, text: str) -> Optional[List[float]]:
+        """
+        Versión asíncrona de _embed_one
+        """
+        try:
+            if self.batch_supported:
+                response = await self.async_client.embed(model=self.model, input=text)
+                return list(response["embeddings"][0])
+            response = await self.async_client.embeddings(model=self.model, prompt=text)
+            return list(response["embedding"])
+        except Exception as e:
+            logger.error(f"Error generando embedding: {e}")
+            return None
+
+    async def aembed(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """
+        Versión asíncrona de embed: como máximo `max_in_flight` lotes en vuelo
+        """
+        if not texts:
+            return []
+
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        semaphore = asyncio.Semaphore(self.max_in_flight)
+
+        async def run(batch: List[str]) -> List[Optional[List[float]]]:
+            async with semaphore:
+                return await self._aembed_batch(batch)
+
+        # gather conserva el orden de los lotes
+        results = await asyncio.gather(*(run(batch) for batch in batches))
+        return [embedding for batch in results for embedding in batch]
+
+    def embed(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """
+        Genera embeddings conservando el orden de entrada.
+        Los textos que fallan incluso tras el reintento individual devuelven None.
+        """
+        if not texts:
+            return []
+
+        start = time.perf_counter()
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+
+        if len(batches) == 1:
+            results = [self._embed_batch(batches[0])]
+        else:
+            workers = min(self.max_in_flight, len(batches))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                # map conserva el orden de los lotes
+                results = list(executor.map(self._embed_batch, batches))
+
+        embeddings = [embedding for batch in results for embedding in batch]
+
+        elapsed = time.perf_counter() - start
+        failed = sum(1 for embedding in embeddings if embedding is None)
+        self.last_stats = {
+            "chunks": len(texts),
+            "batches": len(batches),
+            "failed": failed,
+            "seconds": elapsed,
+            "chunks_per_sec": len(texts) / elapsed if elapsed > 0 else float("inf"),
+        }
+        if len(texts) > 1:
+            logger.info(
+                f"Embeddings: {len(texts)} chunks en {elapsed:.2f}s "
+                f"({self.last_stats['chunks_per_sec']:.1f} chunks/s, {failed} fallidos)"
+            )
+
+        return embeddings
@@ -0,0 +1,110 @@
+import heapq
+import math
+import re
+import threading
+import unicodedata
+from collections import Counter
+from typing import List, Dict, Tuple, Iterable
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[.,][0-9]+)*")
+
+# Palabras vacías frecuentes en los documentos (sin tildes, ya normalizadas)
+STOPWORDS = {
+    "a", "al", "con", "de", "del", "el", "en", "es", "la", "las", "lo", "los",
+    "o", "para", "por", "que", "se", "su", "sus", "un", "una", "y",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Normaliza (minúsculas, sin tildes) y divide en términos.
+    Conserva números con decimales ("0.1", "5,5") y códigos alfanuméricos.
+    """
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return [token for token in TOKEN_PATTERN.findall(text) if token not in STOPWORDS]
+
+
+def reciprocal_rank_fusion(rankings: Iterable[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """
+    Fusiona varias listas ordenadas de ids: score = sum(1 / (k + rango))
+    """
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class BM25Index:
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        """
+        Índice invertido en memoria con ranking BM25.
+        Se actualiza de forma incremental con add/remove.
+        """
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.doc_terms: Dict[str, Counter] = {}
+        self.doc_lengths: Dict[str, int] = {}
+        self.total_length = 0
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    def add(self, ids: List[str], texts: List[str]):
+        """
+        Indexa (o reindexa) documentos
+        """
+        with self._lock:
+            for doc_id, text in zip(ids, texts):
+                if doc_id in self.doc_terms:
+                    self._remove_one(doc_id)
+                terms = Counter(tokenize(text))
+                self.doc_terms[doc_id] = terms
+                length = sum(terms.values())
+                self.doc_lengths[doc_id] = length
+                self.total_length += length
+                for term, frequency in terms.items():
+                    self.postings.setdefault(term, {})[doc_id] = frequency
+
+    def remove(self, ids: List[str]):
+        """
+        Elimina documentos del índice
+        """
+        with self._lock:
+            for doc_id in ids:
+                if doc_id in self.doc_terms:
+                    self._remove_one(doc_id)
+
+    def _remove_one(self, doc_id: str):
+        for term in self.doc_terms.pop(doc_id):
+            posting = self.postings.get(term)
+            if posting is not None:
+                posting.pop(doc_id, None)
+                if not posting:
+                    del self.postings[term]
+        self.total_length -= self.doc_lengths.pop(doc_id)
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[str, float]]:
+        """
+        Devuelve los k documentos con mayor puntuación BM25 como (id, score)
+        """
+        with self._lock:
+            n_docs = len(self.doc_lengths)
+            if n_docs == 0:
+                return []
+            average_length = self.total_length / n_docs
+
+            scores: Dict[str, float] = {}
+            for term in set(tokenize(query)):
+                posting = self.postings.get(term)
+                if not posting:
+                    continue
+                idf = math.log(1 + (n_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+                for doc_id, frequency in posting.items():
+                    norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / average_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
@@ -1,282 +1,1481 @@
 import os
 import json
+import time
+import asyncio
+import contextvars
+import queue
+import threading
+import multiprocessing
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
-from typing import List, Dict, Any
-import chromadb
-from chromadb.config import Settings
+from typing import List, Dict, Any, Optional, Iterable, Iterator, AsyncIterator
 import ollama
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import (
-    PyPDFLoader, 
-    TextLoader, 
-    Docx2txtLoader
-)
 import logging
+from document_loader import VALID_EXTENSIONS, make_text_splitter, load_chunks, load_chunks_task, iter_pages, iter_chunks
+from embedding_engine import EmbeddingEngine
+from embedding_cache import EmbeddingCache
+from document_manifest import DocumentManifest, file_sha256, text_sha256
+from lexical_index import BM25Index, reciprocal_rank_fusion
+from context_builder import MinHasher, assemble_context
+from answer_cache import SemanticAnswerCache
+from reranker import MMRReranker
+from session_manager import SessionManager
+from vector_backends import open_vector_backend
+from metrics import span, observe_stage, record_generation, TIME_TO_FIRST_TOKEN
+import numpy as np
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# System prompt
+SYSTEM_PROMPT = """Eres un asistente experto especializado en análisis de documentos. 
+    Tu tarea es responder preguntas basándote ÚNICAMENTE en el contexto proporcionado.
+
+    REGLAS:
+    - Responde solo con información del contexto
+    - Si la información no está disponible, dilo claramente
+    - Cita las fuentes cuando sea relevante (Documento 1, Documento 2, etc.)
+    - Proporciona respuestas detalladas y bien estructuradas
+    - Sugiere estrategias y perspectivas adicionales cuando sea apropiado
+    - Responde en español"""
+
+CHAT_MODEL = 'llama3.1:8b'
+EMBEDDING_MODEL = 'nomic-embed-text'
+
+# Tiempo que Ollama mantiene el modelo cargado (y su caché KV con el prefijo
+# del prompt) entre peticiones
+KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+
+GENERATION_OPTIONS = {
+    'temperature': 0.7,  # Un poco más alto para respuestas más creativas
+    'top_p': 0.9,
+    'num_predict': 4096  # Usar num_predict en lugar de max_tokens
+}
+
 class LocalVectorStore:
-    def __init__(self, collection_name: str = "documentos", persist_directory: str = "./chroma_db"):
+    def __init__(
+        self,
+        collection_name: str = "documentos",
+        persist_directory: str = "./chroma_db",
+        embedding_batch_size: int = 32,
+        embedding_concurrency: int = 4,
+        embedding_cache: bool = True,
+        retrieval_concurrency: int = 8,
+        generation_concurrency: int = 2,
+        hybrid_search: bool = True,
+        context_token_budget: int = 2000,
+        answer_cache: bool = True,
+        vector_backend: str = "chroma",
+        vector_store_url: Optional[str] = None,
+        rerank: bool = False,
+        session_token_budget: int = 1500,
+        summarize_sessions: bool = False,
+    ):
         """
         Inicializa el almacén vectorial local
         """
         self.collection_name = collection_name
         self.persist_directory = persist_directory
+        self.embedding_dimension = 768
         
-        # Configurar ChromaDB
-        self.chroma_client = chromadb.PersistentClient(
-            path=persist_directory,
-            settings=Settings(
-                anonymized_telemetry=False,
-                allow_reset=True
-            )
-        )
+        # Colección vectorial: ChromaDB (HNSW), índice int8 en memoria mapeada o
+        # el servicio vectorial compartido ("remote"), todos con la misma API
+        self.vector_backend = vector_backend
+        self.collection = open_vector_backend(vector_backend, persist_directory, collection_name, url=vector_store_url)
+        # Versión del índice remoto ya vista (otros procesos pueden escribir)
+        self._index_version = None
         
-        # Crear o obtener colección
-        self.collection = self.chroma_client.get_or_create_collection(
-            name=collection_name,
-            metadata={"hnsw:space": "cosine"}
+        # Configurar text splitter (se crea al cargar el primer documento)
+        self.chunk_size = 1000
+        self.chunk_overlap = 200
+        self._text_splitter = None
+
+        # Motor de embeddings por lotes
+        self.embedder = EmbeddingEngine(
+            model=EMBEDDING_MODEL,
+            batch_size=embedding_batch_size,
+            max_in_flight=embedding_concurrency
         )
-        
-        # Configurar text splitter
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200,
-            length_function=len,
-            separators=["\n\n", "\n", ". ", "! ", "? ", " ", ""]
+
+        # Caché de embeddings (memoria + SQLite junto a chroma_db/)
+        self.embedding_cache = None
+        if embedding_cache:
+            cache_path = Path(persist_directory).with_name("embedding_cache.sqlite3")
+            self.embedding_cache = EmbeddingCache(str(cache_path))
+
+        # Manifiesto de ingesta (huellas de archivos y chunks), uno por backend;
+        # con el servicio remoto, el del backend que este usa
+        index_backend = getattr(self.collection, "backend", vector_backend)
+        manifest_name = "ingest_manifest.sqlite3" if index_backend == "chroma" else f"ingest_manifest_{index_backend}.sqlite3"
+        self.manifest = DocumentManifest(
+            str(Path(persist_directory).with_name(manifest_name))
+        )
+
+        self._backfill_registry()
+
+        # Ruta asíncrona: cliente de Ollama no bloqueante, pool acotado para
+        # las llamadas (bloqueantes) a ChromaDB y límites separados para
+        # recuperación y generación
+        self.ollama_async = ollama.AsyncClient()
+        self.chroma_executor = ThreadPoolExecutor(
+            max_workers=retrieval_concurrency, thread_name_prefix="chroma"
+        )
+        self.retrieval_limit = asyncio.Semaphore(retrieval_concurrency)
+        self.generation_limit = asyncio.Semaphore(generation_concurrency)
+
+        # Índice léxico BM25 sobre los mismos chunks (se construye en la primera búsqueda)
+        self.hybrid_search = hybrid_search
+        self._lexical_index: Optional[BM25Index] = None
+        self._lexical_lock = threading.Lock()
+
+        # Presupuesto de tokens para el contexto del prompt
+        self.context_token_budget = context_token_budget
+        self.min_hasher = MinHasher()
+
+        # Caché semántica de respuestas (se invalida al cambiar la colección)
+        self.answer_cache = SemanticAnswerCache() if answer_cache else None
+
+        # Reordenación MMR opcional antes de generar (menos pasajes en el prompt)
+        self.reranker = MMRReranker() if rerank else None
+
+        # Conversaciones por session_id, compactadas a un presupuesto de tokens
+        # (resumen con el modelo o extractivo)
+        self.sessions = SessionManager(
+            token_budget=session_token_budget,
+            summarizer=self.summarize_conversation if summarize_sessions else None,
         )
+        # El resumen con el modelo se hace en segundo plano, tras responder:
+        # un hilo propio (no ocupa el pool de ChromaDB) y, en la ruta
+        # asíncrona, un hueco de generation_limit
+        self.summarize_sessions = summarize_sessions
+        self.summary_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="summary")
+
+    async def _run_blocking(self, func, *args):
+        """
+        Ejecuta una llamada bloqueante (SQLite, HTTP, CPU) en el pool acotado,
+        conservando el contexto (id de traza)
+        """
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(self.chroma_executor, context.run, func, *args)
+
+    def _lookup_embeddings(self, texts: List[str]):
+        """
+        Consulta la caché. Devuelve los embeddings encontrados (None si faltan),
+        las claves de caché y los textos pendientes con sus posiciones.
+        """
+        if self.embedding_cache is not None:
+            keys = [EmbeddingCache.make_key(self.embedder.model, text) for text in texts]
+            embeddings = self.embedding_cache.get_many(keys)
+        else:
+            keys = None
+            embeddings = [None] * len(texts)
+
+        # Textos pendientes, sin repetir los que aparecen varias veces
+        missing: Dict[str, List[int]] = {}
+        for i, embedding in enumerate(embeddings):
+            if embedding is None:
+                missing.setdefault(texts[i], []).append(i)
+
+        return embeddings, keys, missing
+
+    def _fill_embeddings(self, embeddings, keys, missing: Dict[str, List[int]], generated):
+        """
+        Completa los embeddings pendientes y guarda los nuevos en la caché
+        """
+        new_keys, new_vectors = [], []
+        for text, embedding in zip(missing, generated):
+            if embedding is None:
+                # Embedding vacío como fallback (no se guarda en caché)
+                embedding = [0.0] * self.embedding_dimension
+            elif keys is not None:
+                new_keys.append(keys[missing[text][0]])
+                new_vectors.append(embedding)
+            for i in missing[text]:
+                embeddings[i] = embedding
+
+        if new_keys:
+            self.embedding_cache.put_many(new_keys, new_vectors)
 
     def get_embeddings(self, texts: List[str]) -> List[List[float]]:
         """
-        Genera embeddings usando Ollama
+        Genera embeddings usando Ollama (por lotes, conservando el orden).
+        Los textos ya vistos se sirven desde la caché sin llamar a Ollama.
         """
-        embeddings = []
-        for text in texts:
-            try:
-                response = ollama.embeddings(
-                    model='nomic-embed-text',
-                    prompt=text
-                )
-                embeddings.append(response['embedding'])
-            except Exception as e:
-                logger.error(f"Error generando embedding: {e}")
-                # Embedding vacío como fallback
-                embeddings.append([0.0] * 768)
-        
+        with span("embedding", items=len(texts)) as attributes:
+            embeddings, keys, missing = self._lookup_embeddings(texts)
+            attributes["generated"] = len(missing)
+            if missing:
+                generated = self.embedder.embed(list(missing))
+                self._fill_embeddings(embeddings, keys, missing, generated)
         return embeddings
 
+    async def aget_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """
+        Versión asíncrona de get_embeddings
+        """
+        with span("embedding", items=len(texts)) as attributes:
+            # La caché de embeddings lee y escribe en SQLite: fuera del event loop
+            if self.embedding_cache is not None:
+                embeddings, keys, missing = await self._run_blocking(self._lookup_embeddings, texts)
+            else:
+                embeddings, keys, missing = self._lookup_embeddings(texts)
+            attributes["generated"] = len(missing)
+            if missing:
+                generated = await self.embedder.aembed(list(missing))
+                if keys is not None:
+                    await self._run_blocking(self._fill_embeddings, embeddings, keys, missing, generated)
+                else:
+                    self._fill_embeddings(embeddings, keys, missing, generated)
+        return embeddings
+
+    @property
+    def text_splitter(self):
+        if self._text_splitter is None:
+            self._text_splitter = make_text_splitter(self.chunk_size, self.chunk_overlap)
+        return self._text_splitter
+
     def load_document(self, file_path: str) -> List[str]:
         """
         Carga y procesa diferentes tipos de documentos
         """
-        file_path = Path(file_path)
-        
         try:
-            if file_path.suffix.lower() == '.pdf':
-                loader = PyPDFLoader(str(file_path))
-            elif file_path.suffix.lower() in ['.docx', '.doc']:
-                loader = Docx2txtLoader(str(file_path))
-            elif file_path.suffix.lower() == '.txt':
-                loader = TextLoader(str(file_path), encoding='utf-8')
-            else:
-                raise ValueError(f"Tipo de archivo no soportado: {file_path.suffix}")
-            
-            documents = loader.load()
-            
-            # Dividir en chunks
-            texts = []
-            for doc in documents:
-                chunks = self.text_splitter.split_text(doc.page_content)
-                texts.extend(chunks)
-            
-            return texts
-            
+            return load_chunks(file_path, self.text_splitter)
         except Exception as e:
             logger.error(f"Error cargando documento {file_path}: {e}")
             return []
 
-    def add_document(self, file_path: str, metadata: Dict[str, Any] = None) -> bool:
+    @contextmanager
+    def _collection_write(self):
         """
-        Añade un documento al almacén vectorial
+        Escritura en la colección excluyente con la construcción perezosa del
+        índice léxico, que toma su instantánea y se asigna bajo el mismo lock:
+        cada escritura o entra en la instantánea o encuentra el índice ya
+        asignado y lo actualiza. Devuelve el índice léxico (o None).
         """
-        try:
-            # Cargar y procesar documento
-            texts = self.load_document(file_path)
-            if not texts:
-                return False
-            
-            # Generar embeddings
-            embeddings = self.get_embeddings(texts)
-            
-            # Preparar metadatos
-            base_metadata = {
-                "source": str(file_path),
-                "filename": Path(file_path).name
-            }
-            if metadata:
-                base_metadata.update(metadata)
-            
-            # Generar IDs únicos
-            ids = [f"{Path(file_path).stem}_{i}" for i in range(len(texts))]
-            
-            # Preparar metadatos para cada chunk
-            metadatas = []
-            for i, text in enumerate(texts):
-                chunk_metadata = base_metadata.copy()
-                chunk_metadata.update({
-                    "chunk_index": i,
-                    "chunk_size": len(text)
-                })
-                metadatas.append(chunk_metadata)
-            
-            # Añadir a ChromaDB
-            self.collection.add(
-                documents=texts,
-                embeddings=embeddings,
-                metadatas=metadatas,
-                ids=ids
-            )
-            
-            logger.info(f"Documento {file_path} añadido exitosamente ({len(texts)} chunks)")
+        with self._lexical_lock:
+            yield self._lexical_index
+
+    def _file_unchanged(self, file_path: Path) -> bool:
+        """
+        Indica si un archivo coincide con su huella en el manifiesto
+        """
+        record = self.manifest.get_file(file_path.name)
+        if record is None:
+            return False
+
+        stat = file_path.stat()
+        if record["size"] != stat.st_size:
+            return False
+        if record["mtime"] == stat.st_mtime:
+            return True
+
+        # mtime distinto: comprobar el contenido antes de reprocesar
+        if file_sha256(str(file_path)) == record["sha256"]:
+            self.manifest.touch_file(file_path.name, stat.st_size, stat.st_mtime)
             return True
+        return False
+
+    def _base_metadata(self, file_path: Path, metadata: Dict[str, Any] = None) -> Dict[str, Any]:
+        base_metadata = {
+            "source": str(file_path),
+            "filename": file_path.name
+        }
+        if metadata:
+            base_metadata.update(metadata)
+        return base_metadata
+
+    def _iter_chunk_records(self, filename: str, texts: Iterable[str], base_metadata: Dict[str, Any]):
+        """
+        Asigna a cada chunk su ID, hash y metadatos
+        """
+        occurrences: Dict[str, int] = {}
+        for i, text in enumerate(texts):
+            text_hash = text_sha256(text)
+
+            # IDs derivados del contenido: estables entre ejecuciones
+            n = occurrences.get(text_hash, 0)
+            occurrences[text_hash] = n + 1
+            chunk_id = f"{filename}_{text_hash[:16]}" + (f"_{n}" if n else "")
+
+            chunk_metadata = base_metadata.copy()
+            chunk_metadata.update({
+                "chunk_index": i,
+                "chunk_size": len(text)
+            })
+            yield chunk_id, i, text_hash, text, chunk_metadata
+
+    def _plan_update(self, file_path: Path, texts: List[str], metadata: Dict[str, Any] = None) -> Dict[str, Any]:
+        """
+        Compara los chunks de un archivo con los registrados en el manifiesto
+        y calcula qué hay que añadir, reindexar y eliminar
+        """
+        filename = file_path.name
+        record = self.manifest.get_file(filename)
+        previous = self.manifest.get_chunks(filename)
+
+        # Preparar metadatos
+        base_metadata = self._base_metadata(file_path, metadata)
+
+        chunks = []
+        new_ids, new_texts, new_metadatas = [], [], []
+        moved_ids, moved_metadatas = [], []
+
+        for chunk_id, i, text_hash, text, chunk_metadata in self._iter_chunk_records(filename, texts, base_metadata):
+            chunks.append((chunk_id, i, text_hash))
+
+            if chunk_id not in previous:
+                new_ids.append(chunk_id)
+                new_texts.append(text)
+                new_metadatas.append(chunk_metadata)
+            elif previous[chunk_id][0] != i:
+                moved_ids.append(chunk_id)
+                moved_metadatas.append(chunk_metadata)
+
+        current_ids = {chunk_id for chunk_id, _, _ in chunks}
+        stat = file_path.stat()
+
+        return {
+            "filename": filename,
+            "source": str(file_path),
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "sha256": file_sha256(str(file_path)),
+            "legacy": record is None,
+            "chunks": chunks,
+            "new_ids": new_ids,
+            "new_texts": new_texts,
+            "new_metadatas": new_metadatas,
+            "moved_ids": moved_ids,
+            "moved_metadatas": moved_metadatas,
+            "stale_ids": [chunk_id for chunk_id in previous if chunk_id not in current_ids],
+        }
+
+    def _apply_update(self, plan: Dict[str, Any], embeddings: List[List[float]]):
+        """
+        Aplica un plan de actualización en ChromaDB y en el manifiesto
+        """
+        stale_ids = list(plan["stale_ids"])
+
+        # Archivo sin registro: limpiar chunks de ingestas anteriores al manifiesto
+        if plan["legacy"]:
+            current_ids = {chunk_id for chunk_id, _, _ in plan["chunks"]}
+            existing = self.collection.get(where={"filename": plan["filename"]}, include=[])
+            stale_ids.extend(chunk_id for chunk_id in existing["ids"] if chunk_id not in current_ids)
+
+        with self._collection_write() as lexical:
+            # Añadir primero lo nuevo para no dejar el documento vacío si algo falla
+            if plan["new_ids"]:
+                self.collection.add(
+                    documents=plan["new_texts"],
+                    embeddings=embeddings,
+                    metadatas=plan["new_metadatas"],
+                    ids=plan["new_ids"]
+                )
+
+            if plan["moved_ids"]:
+                self.collection.update(ids=plan["moved_ids"], metadatas=plan["moved_metadatas"])
+
+            if stale_ids:
+                self.collection.delete(ids=stale_ids)
+
+            if lexical is not None:
+                lexical.add(plan["new_ids"], plan["new_texts"])
+                lexical.remove(stale_ids)
+
+        if self.answer_cache is not None and (plan["new_ids"] or plan["moved_ids"] or stale_ids):
+            self.answer_cache.invalidate()
+
+        if plan["chunks"]:
+            self.manifest.record_file(
+                plan["filename"], plan["source"], plan["size"], plan["mtime"], plan["sha256"], plan["chunks"]
+            )
+        else:
+            self.manifest.remove_file(plan["filename"])
+
+        logger.info(
+            f"Documento {plan['source']} sincronizado: {len(plan['new_ids'])} chunks nuevos, "
+            f"{len(plan['moved_ids'])} reindexados, {len(stale_ids)} eliminados"
+        )
+
+    # Chunks por lote en la ingesta en streaming
+    INGEST_BATCH_SIZE = 64
+    # A partir de este tamaño add_documents ingiere el archivo en streaming en
+    # lugar de cargarlo entero en el pool de procesos
+    STREAMING_THRESHOLD_BYTES = 4 * 1024 * 1024
+
+    def _stream_update(
+        self,
+        file_path: Path,
+        texts: Iterable[str],
+        metadata: Dict[str, Any] = None,
+        timings: Optional[Dict[str, float]] = None,
+    ) -> int:
+        """
+        Sincroniza un archivo a partir de un flujo de chunks, en lotes de
+        INGEST_BATCH_SIZE: cada lote se embebe y se escribe antes de leer el
+        siguiente, así que la memoria no crece con el tamaño del documento.
+        Del documento completo solo se conservan (id, índice, hash) de cada
+        chunk para el manifiesto. Devuelve el número de chunks.
+        """
+        timings = timings if timings is not None else {"parse": 0.0, "embed": 0.0, "write": 0.0}
+        filename = file_path.name
+        record = self.manifest.get_file(filename)
+        previous = self.manifest.get_chunks(filename)
+        base_metadata = self._base_metadata(file_path, metadata)
+
+        chunks = []
+        new_batch: List[tuple] = []
+        moved_batch: List[tuple] = []
+        counts = {"new": 0, "moved": 0}
+
+        def flush_new():
+            if not new_batch:
+                return
+            ids, batch_texts, metadatas = (list(column) for column in zip(*new_batch))
+            stage_start = time.perf_counter()
+            embeddings = self.get_embeddings(batch_texts)
+            timings["embed"] += time.perf_counter() - stage_start
+
+            stage_start = time.perf_counter()
+            # upsert: un reintento tras un fallo a medias no choca con los IDs ya escritos
+            with self._collection_write() as lexical:
+                self.collection.upsert(ids=ids, embeddings=embeddings, documents=batch_texts, metadatas=metadatas)
+                if lexical is not None:
+                    lexical.add(ids, batch_texts)
+            timings["write"] += time.perf_counter() - stage_start
+            counts["new"] += len(ids)
+            new_batch.clear()
+
+        def flush_moved():
+            if not moved_batch:
+                return
+            ids, metadatas = (list(column) for column in zip(*moved_batch))
+            stage_start = time.perf_counter()
+            self.collection.update(ids=ids, metadatas=metadatas)
+            timings["write"] += time.perf_counter() - stage_start
+            counts["moved"] += len(ids)
+            moved_batch.clear()
+
+        records = self._iter_chunk_records(filename, texts, base_metadata)
+        while True:
+            stage_start = time.perf_counter()
+            item = next(records, None)
+            timings["parse"] += time.perf_counter() - stage_start
+            if item is None:
+                break
+
+            chunk_id, i, text_hash, text, chunk_metadata = item
+            chunks.append((chunk_id, i, text_hash))
+            if chunk_id not in previous:
+                new_batch.append((chunk_id, text, chunk_metadata))
+                if len(new_batch) >= self.INGEST_BATCH_SIZE:
+                    flush_new()
+            elif previous[chunk_id][0] != i:
+                moved_batch.append((chunk_id, chunk_metadata))
+                if len(moved_batch) >= self.INGEST_BATCH_SIZE:
+                    flush_moved()
+        flush_new()
+        flush_moved()
+
+        # Sin chunks (archivo vaciado o solo imágenes) se sigue adelante: los
+        # chunks anteriores del archivo quedan obsoletos y se eliminan
+        stage_start = time.perf_counter()
+        current_ids = {chunk_id for chunk_id, _, _ in chunks}
+        stale_ids = [chunk_id for chunk_id in previous if chunk_id not in current_ids]
+
+        # Archivo sin registro: limpiar chunks de ingestas anteriores al manifiesto
+        if record is None:
+            existing = self.collection.get(where={"filename": filename}, include=[])
+            stale_ids.extend(chunk_id for chunk_id in existing["ids"] if chunk_id not in current_ids)
+
+        if stale_ids:
+            with self._collection_write() as lexical:
+                self.collection.delete(ids=stale_ids)
+                if lexical is not None:
+                    lexical.remove(stale_ids)
+
+        if self.answer_cache is not None and (counts["new"] or counts["moved"] or stale_ids):
+            self.answer_cache.invalidate()
+
+        if chunks:
+            stat = file_path.stat()
+            self.manifest.record_file(
+                filename, str(file_path), stat.st_size, stat.st_mtime, file_sha256(str(file_path)), chunks
+            )
+        else:
+            self.manifest.remove_file(filename)
+        timings["write"] += time.perf_counter() - stage_start
+
+        logger.info(
+            f"Documento {file_path} sincronizado: {counts['new']} chunks nuevos, "
+            f"{counts['moved']} reindexados, {len(stale_ids)} eliminados"
+        )
+        return len(chunks)
+
+    def add_document(self, file_path: str, metadata: Dict[str, Any] = None, incremental: bool = False) -> bool:
+        """
+        Añade un documento al almacén vectorial.
+
+        Es idempotente: solo se generan embeddings para los chunks cuyo texto
+        cambió. Con `incremental=True` los archivos cuya huella (tamaño, mtime
+        y hash) coincide con el manifiesto se omiten sin volver a procesarlos.
+        """
+        try:
+            path = Path(file_path)
+            if incremental and self._file_unchanged(path):
+                logger.info(f"Documento {file_path} sin cambios, se omite")
+                return True
+
+            # Cargar, dividir, embeber y escribir el documento en lotes
+            texts = iter_chunks(iter_pages(file_path), self.text_splitter)
+            return self._stream_update(path, texts, metadata) > 0
             
         except Exception as e:
             logger.error(f"Error añadiendo documento {file_path}: {e}")
             return False
 
-    def search(self, query: str, n_results: int = 5) -> List[Dict[str, Any]]:
+    def add_documents(
+        self,
+        file_paths: List[str],
+        metadata: Dict[str, Any] = None,
+        workers: Optional[int] = None,
+        incremental: bool = True,
+    ) -> Dict[str, Any]:
         """
-        Busca documentos similares a la consulta
+        Ingesta masiva en pipeline.
+
+        Los documentos se cargan y dividen en un pool de `workers` procesos; a
+        medida que terminan, un hilo genera los embeddings y otro escribe en
+        ChromaDB, de modo que las tres etapas se solapan. Los archivos de más de
+        STREAMING_THRESHOLD_BYTES se ingieren después en streaming. Devuelve el
+        resultado por archivo y los tiempos de cada etapa.
         """
+        start = time.perf_counter()
+        results: Dict[str, bool] = {}
+        timings = {"parse": 0.0, "embed": 0.0, "write": 0.0}
+
+        pending, large = [], []
+        for file_path in file_paths:
+            if incremental and self._file_unchanged(Path(file_path)):
+                logger.info(f"Documento {file_path} sin cambios, se omite")
+                results[str(file_path)] = True
+            elif Path(file_path).is_file() and Path(file_path).stat().st_size >= self.STREAMING_THRESHOLD_BYTES:
+                large.append(str(file_path))
+            else:
+                pending.append(str(file_path))
+
+        # Colas acotadas entre etapas: el parseo no se adelanta sin límite
+        embed_queue: "queue.Queue" = queue.Queue(maxsize=4)
+        write_queue: "queue.Queue" = queue.Queue(maxsize=4)
+
+        def embed_stage():
+            while True:
+                item = embed_queue.get()
+                if item is None:
+                    write_queue.put(None)
+                    return
+                file_path, texts = item
+                try:
+                    stage_start = time.perf_counter()
+                    plan = self._plan_update(Path(file_path), texts, metadata)
+                    embeddings = self.get_embeddings(plan["new_texts"]) if plan["new_texts"] else []
+                    timings["embed"] += time.perf_counter() - stage_start
+                    write_queue.put((file_path, plan, embeddings))
+                except Exception as e:
+                    logger.error(f"Error generando embeddings de {file_path}: {e}")
+                    results[file_path] = False
+
+        def write_stage():
+            while True:
+                item = write_queue.get()
+                if item is None:
+                    return
+                file_path, plan, embeddings = item
+                try:
+                    stage_start = time.perf_counter()
+                    self._apply_update(plan, embeddings)
+                    timings["write"] += time.perf_counter() - stage_start
+                    results[file_path] = bool(plan["chunks"])
+                except Exception as e:
+                    logger.error(f"Error añadiendo documento {file_path}: {e}")
+                    results[file_path] = False
+
+        embed_thread = threading.Thread(target=embed_stage, daemon=True)
+        write_thread = threading.Thread(target=write_stage, daemon=True)
+        embed_thread.start()
+        write_thread.start()
+
+        def enqueue(loaded: Dict[str, Any]):
+            timings["parse"] += loaded["seconds"]
+            if loaded["error"]:
+                logger.error(f"Error cargando documento {loaded['file_path']}: {loaded['error']}")
+                results[loaded["file_path"]] = False
+                return
+            if not loaded["texts"]:
+                # Sin texto: el plan solo elimina los chunks de ingestas anteriores
+                logger.warning(f"Documento {loaded['file_path']} sin texto")
+            embed_queue.put((loaded["file_path"], loaded["texts"]))
+
         try:
-            # Generar embedding de la consulta
-            query_embedding = self.get_embeddings([query])[0]
-            
-            # Buscar en ChromaDB
+            serial: List[str] = []
+            if pending:
+                workers = min(workers or os.cpu_count() or 1, len(pending))
+                # spawn: el servidor puede tener hilos activos al hacer la ingesta
+                context = multiprocessing.get_context("spawn")
+                with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+                    futures = {
+                        executor.submit(load_chunks_task, file_path, self.chunk_size, self.chunk_overlap): file_path
+                        for file_path in pending
+                    }
+                    for future in as_completed(futures):
+                        file_path = futures[future]
+                        try:
+                            loaded = future.result()
+                        except BrokenProcessPool:
+                            # Un worker murió: no se sabe con qué archivo, se reintentan en serie
+                            serial.append(file_path)
+                            continue
+                        except Exception as e:
+                            logger.error(f"Error cargando documento {file_path}: {e!r}")
+                            results[file_path] = False
+                            continue
+                        enqueue(loaded)
+
+            # Pool caído: de uno en uno, cada archivo en su propio proceso para
+            # que el que provocó la caída falle solo
+            if serial:
+                logger.warning(f"Pool de procesos caído: {len(serial)} documentos se parsean en serie")
+            for file_path in serial:
+                try:
+                    with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                        loaded = executor.submit(
+                            load_chunks_task, file_path, self.chunk_size, self.chunk_overlap
+                        ).result()
+                except Exception as e:
+                    logger.error(f"Error cargando documento {file_path}: {e!r}")
+                    results[file_path] = False
+                    continue
+                enqueue(loaded)
+        finally:
+            embed_queue.put(None)
+            embed_thread.join()
+            write_thread.join()
+
+        # Archivos grandes: de uno en uno y por lotes, con memoria acotada
+        for file_path in large:
+            try:
+                texts = iter_chunks(iter_pages(file_path), self.text_splitter)
+                results[file_path] = self._stream_update(Path(file_path), texts, metadata, timings) > 0
+            except Exception as e:
+                logger.error(f"Error añadiendo documento {file_path}: {e}")
+                results[file_path] = False
+
+        timings["total"] = time.perf_counter() - start
+        bottleneck = max(("parse", "embed", "write"), key=lambda stage: timings[stage])
+        logger.info(
+            f"Ingesta de {len(file_paths)} documentos en {timings['total']:.2f}s "
+            f"(parseo {timings['parse']:.2f}s acumulado, embeddings {timings['embed']:.2f}s, "
+            f"escritura {timings['write']:.2f}s; cuello de botella: {bottleneck})"
+        )
+
+        return {"results": results, "timings": timings, "bottleneck": bottleneck}
+
+    def _refresh_if_index_changed(self):
+        """
+        Con un índice compartido, descarta el índice léxico y la caché de
+        respuestas si otro proceso modificó la colección. Las escrituras de
+        este proceso no cuentan: ya actualizan las cachés al hacerse.
+        Bloqueante (consulta /version): en la ruta asíncrona corre en el pool.
+        """
+        external_version = getattr(self.collection, "external_version", None)
+        if external_version is None:
+            return
+        version = external_version()
+        if version != self._index_version:
+            if self._index_version is not None:
+                with self._lexical_lock:
+                    self._lexical_index = None
+                if self.answer_cache is not None:
+                    self.answer_cache.invalidate()
+            self._index_version = version
+
+    def lexical_search(self, queries: List[str], n_results: int) -> List[List[str]]:
+        """
+        Ids BM25 por consulta. Con el servicio vectorial, el índice léxico es
+        el suyo (uno para todos los workers); si no, el índice local.
+        """
+        lexical_search = getattr(self.collection, "lexical_search", None)
+        if lexical_search is not None:
+            results = lexical_search(queries, n_results)
+        else:
+            index = self.lexical_index()
+            results = [index.search(query, n_results) for query in queries]
+        return [[doc_id for doc_id, _ in hits] for hits in results]
+
+    def lexical_index(self) -> BM25Index:
+        """
+        Devuelve el índice BM25, construyéndolo desde la colección la primera vez
+        """
+        if self._lexical_index is None:
+            with self._lexical_lock:
+                if self._lexical_index is None:
+                    start = time.perf_counter()
+                    index = BM25Index()
+                    results = self.collection.get(include=['documents'])
+                    index.add(results['ids'], results['documents'])
+                    self._lexical_index = index
+                    logger.info(
+                        f"Índice léxico construido: {len(index)} chunks en {time.perf_counter() - start:.2f}s"
+                    )
+        return self._lexical_index
+
+    def _query_collection(self, query: str, query_embedding: List[float], n_results: int) -> List[Dict[str, Any]]:
+        """
+        Consulta ChromaDB con un embedding y formatea los resultados.
+        En modo híbrido fusiona además los resultados BM25 con reciprocal rank fusion.
+        """
+        return self._query_collection_many([query], [query_embedding], n_results)[0]
+
+    def _query_collection_many(
+        self, queries: List[str], query_embeddings: List[List[float]], n_results: int
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Versión por lotes de _query_collection: una sola consulta a la colección
+        con todos los embeddings y una sola lectura de los resultados solo léxicos
+        """
+        self._refresh_if_index_changed()
+        candidates = max(n_results * 3, 20) if self.hybrid_search else n_results
+        with span("vector_query", items=candidates * len(queries)):
             results = self.collection.query(
-                query_embeddings=[query_embedding],
-                n_results=n_results,
+                query_embeddings=query_embeddings,
+                n_results=candidates,
                 include=['documents', 'metadatas', 'distances']
             )
-            
-            # Formatear resultados
+
+        # Formatear resultados
+        formatted = []
+        for q in range(len(queries)):
             formatted_results = []
-            for i in range(len(results['documents'][0])):
+            for i in range(len(results['documents'][q])):
                 formatted_results.append({
-                    'document': results['documents'][0][i],
-                    'metadata': results['metadatas'][0][i],
-                    'distance': results['distances'][0][i],
-                    'similarity': 1 - results['distances'][0][i]  # Convertir distancia a similitud
+                    'id': results['ids'][q][i],
+                    'document': results['documents'][q][i],
+                    'metadata': results['metadatas'][q][i],
+                    'distance': results['distances'][q][i],
+                    'similarity': 1 - results['distances'][q][i]  # Convertir distancia a similitud
                 })
+            formatted.append(formatted_results)
+
+        if not self.hybrid_search:
+            return formatted
+
+        with span("lexical_query", items=candidates * len(queries)):
+            lexical = self.lexical_search(queries, candidates)
+
+        fused_per_query = [
+            reciprocal_rank_fusion([[result['id'] for result in formatted_results], lexical_ids])[:n_results]
+            for formatted_results, lexical_ids in zip(formatted, lexical)
+        ]
+
+        # Resultados solo léxicos (de cualquier consulta): una sola lectura con su embedding
+        missing = set()
+        for formatted_results, fused in zip(formatted, fused_per_query):
+            vector_ids = {result['id'] for result in formatted_results}
+            missing.update(doc_id for doc_id, _ in fused if doc_id not in vector_ids)
+        extra_by_id = {}
+        if missing:
+            extra = self.collection.get(ids=sorted(missing), include=['documents', 'metadatas', 'embeddings'])
+            for doc_id, document, metadata, embedding in zip(
+                extra['ids'], extra['documents'], extra['metadatas'], extra['embeddings']
+            ):
+                extra_by_id[doc_id] = (document, metadata, np.asarray(embedding, dtype=np.float32))
+
+        all_results = []
+        for formatted_results, fused, query_embedding in zip(formatted, fused_per_query, query_embeddings):
+            by_id = {result['id']: result for result in formatted_results}
+            query_vector = np.asarray(query_embedding, dtype=np.float32)
+            query_norm = np.linalg.norm(query_vector) or 1.0
+            fused_results = []
+            for doc_id, score in fused:
+                if doc_id in by_id:
+                    result = by_id[doc_id]
+                elif doc_id in extra_by_id:
+                    # Calcular la similitud del resultado léxico con esta consulta
+                    document, metadata, vector = extra_by_id[doc_id]
+                    similarity = float(vector @ query_vector / ((np.linalg.norm(vector) or 1.0) * query_norm))
+                    result = {
+                        'id': doc_id,
+                        'document': document,
+                        'metadata': metadata,
+                        'distance': 1 - similarity,
+                        'similarity': similarity
+                    }
+                else:
+                    continue
+                fused_results.append({**result, 'score': score})
+            all_results.append(fused_results)
+        return all_results
+
+    def search(self, query: str, n_results: int = 5) -> List[Dict[str, Any]]:
+        """
+        Busca documentos similares a la consulta
+        """
+        try:
+            # Generar embedding de la consulta
+            query_embedding = self.get_embeddings([query])[0]
             
-            return formatted_results
+            # Buscar en ChromaDB (y en el índice léxico)
+            return self._query_collection(query, query_embedding, n_results)
             
         except Exception as e:
             logger.error(f"Error en búsqueda: {e}")
             return []
+
+    async def asearch(self, query: str, n_results: int = 5) -> List[Dict[str, Any]]:
+        """
+        Versión asíncrona de search: el embedding usa el cliente asíncrono de
+        Ollama y la consulta a ChromaDB se ejecuta en el pool acotado
+        """
+        try:
+            async with self.retrieval_limit:
+                query_embedding = (await self.aget_embeddings([query]))[0]
+                return await self._run_blocking(self._query_collection, query, query_embedding, n_results)
+
+        except Exception as e:
+            logger.error(f"Error en búsqueda: {e}")
+            return []
+
+    # Consultas por llamada a la colección en search_many (acota la matriz de distancias)
+    SEARCH_BATCH_SIZE = 64
+
+    def search_many(self, queries: List[str], n_results: int = 5) -> List[List[Dict[str, Any]]]:
+        """
+        Busca varias consultas a la vez: embeddings por lotes y una consulta
+        vectorizada a la colección por cada SEARCH_BATCH_SIZE preguntas.
+        Devuelve los resultados en el mismo orden que `queries`.
+        """
+        if not queries:
+            return []
+        try:
+            query_embeddings = self.get_embeddings(queries)
+            results = []
+            for start in range(0, len(queries), self.SEARCH_BATCH_SIZE):
+                end = start + self.SEARCH_BATCH_SIZE
+                results.extend(self._query_collection_many(queries[start:end], query_embeddings[start:end], n_results))
+            return results
+
+        except Exception as e:
+            logger.error(f"Error en búsqueda por lotes: {e}")
+            return [[] for _ in queries]
+
+    async def asearch_many(self, queries: List[str], n_results: int = 5) -> List[List[Dict[str, Any]]]:
+        """
+        Versión asíncrona de search_many
+        """
+        if not queries:
+            return []
+        try:
+            async with self.retrieval_limit:
+                query_embeddings = await self.aget_embeddings(queries)
+                results = []
+                for start in range(0, len(queries), self.SEARCH_BATCH_SIZE):
+                    end = start + self.SEARCH_BATCH_SIZE
+                    results.extend(await self._run_blocking(
+                        self._query_collection_many, queries[start:end], query_embeddings[start:end], n_results
+                    ))
+                return results
+
+        except Exception as e:
+            logger.error(f"Error en búsqueda por lotes: {e}")
+            return [[] for _ in queries]
     
-    def query_with_ollama(self, question: str, n_results: int = 20, history: List[Dict[str, str]] = None) -> str:
+    def _rerank(self, query_embedding: List[float], candidates: List[Dict[str, Any]], n_results: int) -> List[Dict[str, Any]]:
         """
-        Realiza una consulta usando RAG (Retrieval-Augmented Generation)
+        Recupera los embeddings de los candidatos (una lectura) y los reordena
+        """
+        if not candidates:
+            return []
+        stored = self.collection.get(ids=[result['id'] for result in candidates], include=['embeddings'])
+        vectors = dict(zip(stored['ids'], stored['embeddings']))
+        candidates = [{**result, 'embedding': vectors[result['id']]} for result in candidates if result['id'] in vectors]
+        with span("rerank", items=len(candidates)):
+            return self.reranker.rerank(query_embedding, candidates, n_results)
+
+    def retrieve(self, query: str, n_results: int = 8) -> List[Dict[str, Any]]:
         """
+        Recuperación para generar: búsqueda y, si está activa, reordenación
+        MMR con corte adaptativo sobre un conjunto mayor de candidatos
+        """
+        if self.reranker is None:
+            return self.search(query, n_results)
         try:
-            # Buscar documentos relevantes
-            search_results = self.search(question, n_results)
-            
-            if not search_results:
-                return "No se encontraron documentos relevantes para tu consulta."
-            
-            # Preparar contexto
-            context = "\n\n".join([
-                f"Documento {i+1} (Similitud: {result['similarity']:.2f}):\n{result['document']}"
-                for i, result in enumerate(search_results)
-            ])
-            
-            # System prompt
-            system_prompt = """Eres un asistente experto especializado en análisis de documentos. 
-    Tu tarea es responder preguntas basándote ÚNICAMENTE en el contexto proporcionado.
+            query_embedding = self.get_embeddings([query])[0]
+            candidates = self._query_collection(query, query_embedding, self.reranker.candidates(n_results))
+            return self._rerank(query_embedding, candidates, n_results)
 
-    REGLAS:
-    - Responde solo con información del contexto
-    - Si la información no está disponible, dilo claramente
-    - Cita las fuentes cuando sea relevante (Documento 1, Documento 2, etc.)
-    - Proporciona respuestas detalladas y bien estructuradas
-    - Sugiere estrategias y perspectivas adicionales cuando sea apropiado
-    - Responde en español"""
+        except Exception as e:
+            logger.error(f"Error en búsqueda: {e}")
+            return []
+
+    async def aretrieve(self, query: str, n_results: int = 8) -> List[Dict[str, Any]]:
+        """
+        Versión asíncrona de retrieve
+        """
+        if self.reranker is None:
+            return await self.asearch(query, n_results)
+        try:
+            async with self.retrieval_limit:
+                query_embedding = (await self.aget_embeddings([query]))[0]
+                candidates = await self._run_blocking(
+                    self._query_collection, query, query_embedding, self.reranker.candidates(n_results)
+                )
+                return await self._run_blocking(self._rerank, query_embedding, candidates, n_results)
+
+        except Exception as e:
+            logger.error(f"Error en búsqueda: {e}")
+            return []
+
+    def _session_history(self, session_id: Optional[str], history: Optional[List[Dict[str, str]]]) -> List[Dict[str, str]]:
+        """
+        Historial de la sesión (resumen y turnos recientes) seguido del
+        historial explícito de la petición, si lo hay
+        """
+        if session_id is None:
+            return history or []
+        return self.sessions.history(session_id) + list(history or [])
 
-            # User prompt con contexto
-            user_prompt = f"""CONTEXTO DE LOS DOCUMENTOS:
+    def _record_turn(self, turn: Dict[str, Any], answer: str):
+        """
+        Guarda el turno en la sesión. El resumen extractivo se hace en el
+        momento; el resumen con el modelo se programa en segundo plano
+        """
+        session_id = turn["session_id"]
+        if session_id is None:
+            return
+        if self.sessions.append(session_id, turn["question"], answer, compact=not self.summarize_sessions):
+            if turn["loop"] is not None:
+                asyncio.run_coroutine_threadsafe(self._acompact_session(session_id), turn["loop"])
+            else:
+                self.summary_executor.submit(self.sessions.compact, session_id)
+
+    async def _acompact_session(self, session_id: str):
+        """
+        Compacta una sesión con el modelo, limitada por generation_limit como
+        el resto de llamadas al modelo de chat
+        """
+        async with self.generation_limit:
+            await asyncio.get_running_loop().run_in_executor(
+                self.summary_executor, self.sessions.compact, session_id
+            )
+
+    def summarize_conversation(self, summary: str, messages: List[Dict[str, str]]) -> str:
+        """
+        Resume con el modelo de chat los turnos más antiguos de una sesión,
+        partiendo del resumen anterior
+        """
+        transcript = "\n".join(
+            f"{'Usuario' if message['role'] == 'user' else 'Asistente'}: {message['content']}"
+            for message in messages
+        )
+        prompt = f"""Resume en español y en pocas frases la conversación, conservando los datos clínicos, \
+cifras y decisiones mencionadas.
+
+RESUMEN PREVIO:
+{summary or "(ninguno)"}
+
+CONVERSACIÓN:
+{transcript}"""
+        with span("summary", items=len(messages)):
+            response = ollama.chat(
+                model=CHAT_MODEL,
+                messages=[{"role": "user", "content": prompt}],
+                options={**GENERATION_OPTIONS, "temperature": 0.2, "num_predict": self.sessions.summary_token_budget},
+                keep_alive=KEEP_ALIVE
+            )
+        record_generation(response)
+        return response['message']['content'].strip()
+
+    def build_context(self, search_results: List[Dict[str, Any]]):
+        """
+        Construye el bloque de contexto a partir de los resultados de búsqueda.
+        Une chunks adyacentes, descarta casi duplicados y respeta el presupuesto
+        de tokens; devuelve el contexto, los pasajes incluidos (numerados como
+        en el contexto, "Documento N") y las estadísticas de ahorro.
+        """
+        with span("context", items=len(search_results)):
+            passages, stats = assemble_context(
+                search_results, token_budget=self.context_token_budget, hasher=self.min_hasher
+            )
+        logger.info(
+            f"Contexto: {stats['chunks']} chunks -> {stats['passages']} pasajes, "
+            f"{stats['tokens_before']} -> {stats['tokens_after']} tokens (ahorro {stats['tokens_saved']})"
+        )
+
+        context = "\n\n".join([
+            f"Documento {i+1} (Similitud: {passage['similarity']:.2f}):\n{passage['text']}"
+            for i, passage in enumerate(passages)
+        ])
+        sources = [
+            {
+                "documento": i + 1,
+                "id": passage["ids"][0] if passage["ids"] else None,
+                "ids": passage["ids"],
+                "document": passage["text"],
+                "metadata": passage["metadata"],
+                "similarity": passage["similarity"],
+                "score": passage["score"],
+                "chunks": passage["chunks"],
+            }
+            for i, passage in enumerate(passages)
+        ]
+        return context, sources, stats
+
+    def build_messages(self, question: str, context: str, history: List[Dict[str, str]] = None) -> List[Dict[str, str]]:
+        """
+        Ensambla los mensajes del chat: system prompt, historial y pregunta con contexto
+        """
+        # User prompt con contexto
+        user_prompt = f"""CONTEXTO DE LOS DOCUMENTOS:
     {context}
 
     PREGUNTA DEL USUARIO:
     {question}"""
 
-            messages = [
-                {"role": "system", "content": system_prompt}
-            ]
-            
-            if history:
-                messages.extend(history)
-            
-            messages.append({"role": "user", "content": user_prompt})
-            
-            # Generar respuesta con ollama.chat
+        # El resumen de la sesión va tras el system prompt fijo, en el mismo
+        # mensaje: el prefijo común entre turnos no cambia
+        system_prompt = SYSTEM_PROMPT
+        history = history or []
+        summaries = [message["content"] for message in history if message["role"] == "system"]
+        if summaries:
+            system_prompt = "\n\n".join([SYSTEM_PROMPT, *summaries])
+
+        messages = [
+            {"role": "system", "content": system_prompt}
+        ]
+        messages.extend(message for message in history if message["role"] != "system")
+
+        messages.append({"role": "user", "content": user_prompt})
+        return messages
+
+    def generate(self, messages: List[Dict[str, str]]) -> str:
+        """
+        Genera la respuesta con ollama.chat
+        """
+        with span("generation"):
             response = ollama.chat(
-                model='llama3.1:8b',
+                model=CHAT_MODEL,
                 messages=messages,
-                options={
-                    'temperature': 0.7,  # Un poco más alto para respuestas más creativas
-                    'top_p': 0.9,
-                    'num_predict': 4096  # Usar num_predict en lugar de max_tokens
-                }
+                options=GENERATION_OPTIONS,
+                keep_alive=KEEP_ALIVE
             )
-            
-            return response['message']['content']
-            
+        record_generation(response)
+        return response['message']['content']
+
+    def generate_stream(self, messages: List[Dict[str, str]]) -> Iterator[Dict[str, Any]]:
+        """
+        Genera la respuesta con ollama.chat en modo streaming (un chunk por token)
+        """
+        return ollama.chat(
+            model=CHAT_MODEL,
+            messages=messages,
+            options=GENERATION_OPTIONS,
+            keep_alive=KEEP_ALIVE,
+            stream=True
+        )
+
+    async def agenerate(self, messages: List[Dict[str, str]]) -> str:
+        """
+        Versión asíncrona de generate, limitada por generation_limit
+        """
+        async with self.generation_limit:
+            with span("generation"):
+                response = await self.ollama_async.chat(
+                    model=CHAT_MODEL,
+                    messages=messages,
+                    options=GENERATION_OPTIONS,
+                    keep_alive=KEEP_ALIVE
+                )
+        record_generation(response)
+        return response['message']['content']
+
+    async def agenerate_stream(self, messages: List[Dict[str, str]]) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Versión asíncrona de generate_stream, limitada por generation_limit
+        """
+        async with self.generation_limit:
+            stream = await self.ollama_async.chat(
+                model=CHAT_MODEL,
+                messages=messages,
+                options=GENERATION_OPTIONS,
+                keep_alive=KEEP_ALIVE,
+                stream=True
+            )
+            async for chunk in stream:
+                yield chunk
+
+    # -------- Etapas de una respuesta RAG --------
+    # answer_question, stream_answer y sus versiones asíncronas recorren las
+    # mismas etapas (caché -> recuperación -> contexto -> generación ->
+    # guardado); cada etapa vive en un solo método y las versiones asíncronas
+    # ejecutan las partes bloqueantes con _run_blocking.
+
+    def _start_turn(
+        self, question: str, n_results: int, history: Optional[List[Dict[str, str]]], session_id: Optional[str]
+    ) -> Dict[str, Any]:
+        """
+        Estado de una respuesta: historial (de la sesión y de la petición),
+        tiempos por etapa y si puede usarse la caché de respuestas
+        """
+        history = self._session_history(session_id, history)
+        try:
+            # Bucle de eventos de la ruta asíncrona (para programar el resumen)
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        return {
+            "question": question,
+            "loop": loop,
+            "n_results": n_results,
+            "session_id": session_id,
+            "history": history,
+            # Respuesta en caché para preguntas casi idénticas (solo sin historial)
+            "use_cache": not history and self.answer_cache is not None,
+            "query_embedding": None,
+            "sources": [],
+            "context_stats": None,
+            "metadata": {},
+            "start": time.perf_counter(),
+            "timings": {},
+        }
+
+    def _lookup_cached(self, turn: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Parte bloqueante de la etapa de caché: con el embedding de la pregunta
+        ya calculado, busca una respuesta reutilizable y registra el turno
+        """
+        self._refresh_if_index_changed()
+        cached = self.answer_cache.lookup(turn["query_embedding"], turn["question"], turn["n_results"])
+        if cached:
+            self._record_turn(turn, cached["answer"])
+        return cached
+
+    def _check_cache(self, turn: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        if not turn["use_cache"]:
+            return None
+        stage_start = time.perf_counter()
+        turn["query_embedding"] = self.get_embeddings([turn["question"]])[0]
+        cached = self._lookup_cached(turn)
+        turn["timings"]["cache"] = time.perf_counter() - stage_start
+        return cached
+
+    async def _acheck_cache(self, turn: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        if not turn["use_cache"]:
+            return None
+        stage_start = time.perf_counter()
+        turn["query_embedding"] = (await self.aget_embeddings([turn["question"]]))[0]
+        cached = await self._run_blocking(self._lookup_cached, turn)
+        turn["timings"]["cache"] = time.perf_counter() - stage_start
+        return cached
+
+    def _retrieve_stage(self, turn: Dict[str, Any]) -> List[Dict[str, Any]]:
+        stage_start = time.perf_counter()
+        turn["sources"] = self.retrieve(turn["question"], turn["n_results"])
+        turn["timings"]["retrieval"] = time.perf_counter() - stage_start
+        return turn["sources"]
+
+    async def _aretrieve_stage(self, turn: Dict[str, Any]) -> List[Dict[str, Any]]:
+        stage_start = time.perf_counter()
+        turn["sources"] = await self.aretrieve(turn["question"], turn["n_results"])
+        turn["timings"]["retrieval"] = time.perf_counter() - stage_start
+        return turn["sources"]
+
+    def _build_prompt(self, turn: Dict[str, Any]):
+        """
+        Etapa de prompt: contexto deduplicado y acotado y mensajes del chat.
+        Las fuentes del turno pasan a ser los pasajes que entraron en el prompt.
+        """
+        stage_start = time.perf_counter()
+        context, turn["sources"], turn["context_stats"] = self.build_context(turn["sources"])
+        turn["messages"] = self.build_messages(turn["question"], context, turn["history"])
+        turn["timings"]["prompt"] = time.perf_counter() - stage_start
+
+    def _complete_turn(self, turn: Dict[str, Any], answer: str):
+        """
+        Guarda la respuesta generada en la caché y en la sesión
+        """
+        if turn["use_cache"]:
+            self.answer_cache.store(turn["query_embedding"], turn["question"], turn["n_results"], answer, turn["sources"])
+        self._record_turn(turn, answer)
+
+    def _stream_token(self, turn: Dict[str, Any], chunk: Dict[str, Any], parts: List[str]) -> Optional[str]:
+        """
+        Procesa un fragmento del stream de Ollama: devuelve su texto (o None)
+        y guarda el tiempo hasta el primer token y los contadores finales
+        """
+        if chunk.get('done'):
+            turn["metadata"] = {
+                key: chunk.get(key)
+                for key in ("prompt_eval_count", "eval_count", "prompt_eval_duration", "eval_duration")
+            }
+        content = chunk['message']['content']
+        if not content:
+            return None
+        parts.append(content)
+        if "time_to_first_token" not in turn["timings"]:
+            turn["timings"]["time_to_first_token"] = time.perf_counter() - turn["start"]
+        return content
+
+    def _finish_stream(self, turn: Dict[str, Any], stage_start: float):
+        timings = turn["timings"]
+        timings["generation"] = time.perf_counter() - stage_start
+        timings["total"] = time.perf_counter() - turn["start"]
+        observe_stage("generation", timings["generation"])
+        record_generation(turn["metadata"])
+        if "time_to_first_token" in timings:
+            TIME_TO_FIRST_TOKEN.observe(timings["time_to_first_token"])
+
+    # -------- Respuestas y eventos --------
+
+    NO_RESULTS_ANSWER = "No se encontraron documentos relevantes para tu consulta."
+
+    @staticmethod
+    def _cached_result(turn: Dict[str, Any], cached: Dict[str, Any]) -> Dict[str, Any]:
+        return {"answer": cached["answer"], "sources": cached["sources"], "timings": turn["timings"], "cached": True}
+
+    def _answer_result(self, turn: Dict[str, Any], answer: str) -> Dict[str, Any]:
+        if not turn["sources"]:
+            return {"answer": self.NO_RESULTS_ANSWER, "sources": [], "timings": turn["timings"]}
+        return {"answer": answer, "sources": turn["sources"], "timings": turn["timings"], "context": turn["context_stats"]}
+
+    @staticmethod
+    def _error_result(turn: Dict[str, Any], error: Exception) -> Dict[str, Any]:
+        logger.error(f"Error en consulta con Ollama: {error}")
+        return {
+            "answer": f"Error procesando la consulta: {str(error)}",
+            "sources": turn["sources"],
+            "timings": turn["timings"]
+        }
+
+    @staticmethod
+    def _cached_events(turn: Dict[str, Any], cached: Dict[str, Any]) -> List[Dict[str, Any]]:
+        return [
+            {"event": "sources", "data": cached["sources"]},
+            {"event": "token", "data": cached["answer"]},
+            {"event": "done", "data": {"timings": turn["timings"], "cached": True}},
+        ]
+
+    def _no_results_events(self, turn: Dict[str, Any]) -> List[Dict[str, Any]]:
+        return [
+            {"event": "sources", "data": []},
+            {"event": "token", "data": self.NO_RESULTS_ANSWER},
+            {"event": "done", "data": {"timings": turn["timings"]}},
+        ]
+
+    @staticmethod
+    def _done_event(turn: Dict[str, Any]) -> Dict[str, Any]:
+        return {"event": "done", "data": {"timings": turn["timings"], "context": turn["context_stats"], **turn["metadata"]}}
+
+    @staticmethod
+    def _error_event(error: Exception) -> Dict[str, Any]:
+        logger.error(f"Error en consulta con Ollama: {error}")
+        return {"event": "error", "data": f"Error procesando la consulta: {str(error)}"}
+
+    # -------- Puntos de entrada --------
+
+    def answer_question(self, question: str, n_results: int = 8, history: List[Dict[str, str]] = None, session_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Punto de entrada RAG: una sola recuperación para la respuesta y las fuentes.
+        Devuelve {"answer", "sources", "timings"} con el tiempo de cada etapa.
+        """
+        turn = self._start_turn(question, n_results, history, session_id)
+        try:
+            cached = self._check_cache(turn)
+            if cached:
+                return self._cached_result(turn, cached)
+
+            if not self._retrieve_stage(turn):
+                return self._answer_result(turn, self.NO_RESULTS_ANSWER)
+
+            self._build_prompt(turn)
+            stage_start = time.perf_counter()
+            answer = self.generate(turn["messages"])
+            turn["timings"]["generation"] = time.perf_counter() - stage_start
+
+            self._complete_turn(turn, answer)
+            return self._answer_result(turn, answer)
+
+        except Exception as e:
+            return self._error_result(turn, e)
+
+    async def aanswer_question(self, question: str, n_results: int = 8, history: List[Dict[str, str]] = None, session_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Versión asíncrona de answer_question
+        """
+        turn = self._start_turn(question, n_results, history, session_id)
+        try:
+            cached = await self._acheck_cache(turn)
+            if cached:
+                return self._cached_result(turn, cached)
+
+            if not await self._aretrieve_stage(turn):
+                return self._answer_result(turn, self.NO_RESULTS_ANSWER)
+
+            await self._run_blocking(self._build_prompt, turn)
+            stage_start = time.perf_counter()
+            answer = await self.agenerate(turn["messages"])
+            turn["timings"]["generation"] = time.perf_counter() - stage_start
+
+            await self._run_blocking(self._complete_turn, turn, answer)
+            return self._answer_result(turn, answer)
+
+        except Exception as e:
+            return self._error_result(turn, e)
+
+    def stream_answer(self, question: str, n_results: int = 8, history: List[Dict[str, str]] = None, session_id: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Variante en streaming de answer_question.
+        Emite primero {"event": "sources"}, luego un {"event": "token"} por
+        fragmento generado y finalmente {"event": "done"} con los metadatos
+        (tiempos por etapa, tiempo hasta el primer token y contadores de Ollama).
+        """
+        turn = self._start_turn(question, n_results, history, session_id)
+        try:
+            cached = self._check_cache(turn)
+            if cached:
+                yield from self._cached_events(turn, cached)
+                return
+
+            if not self._retrieve_stage(turn):
+                yield from self._no_results_events(turn)
+                return
+
+            self._build_prompt(turn)
+            yield {"event": "sources", "data": turn["sources"]}
+
+            stage_start = time.perf_counter()
+            parts: List[str] = []
+            for chunk in self.generate_stream(turn["messages"]):
+                content = self._stream_token(turn, chunk, parts)
+                if content:
+                    yield {"event": "token", "data": content}
+            self._finish_stream(turn, stage_start)
+
+            self._complete_turn(turn, "".join(parts))
+            yield self._done_event(turn)
+
         except Exception as e:
-            logger.error(f"Error en consulta con Ollama: {e}")
-            return f"Error procesando la consulta: {str(e)}"
+            yield self._error_event(e)
+
+    async def astream_answer(self, question: str, n_results: int = 8, history: List[Dict[str, str]] = None, session_id: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Versión asíncrona de stream_answer
+        """
+        turn = self._start_turn(question, n_results, history, session_id)
+        try:
+            cached = await self._acheck_cache(turn)
+            if cached:
+                for event in self._cached_events(turn, cached):
+                    yield event
+                return
+
+            if not await self._aretrieve_stage(turn):
+                for event in self._no_results_events(turn):
+                    yield event
+                return
+
+            await self._run_blocking(self._build_prompt, turn)
+            yield {"event": "sources", "data": turn["sources"]}
+
+            stage_start = time.perf_counter()
+            parts: List[str] = []
+            async for chunk in self.agenerate_stream(turn["messages"]):
+                content = self._stream_token(turn, chunk, parts)
+                if content:
+                    yield {"event": "token", "data": content}
+            self._finish_stream(turn, stage_start)
+
+            await self._run_blocking(self._complete_turn, turn, "".join(parts))
+            yield self._done_event(turn)
+
+        except Exception as e:
+            yield self._error_event(e)
+
+    def query_with_ollama(self, question: str, n_results: int = 8, history: List[Dict[str, str]] = None, session_id: Optional[str] = None) -> str:
+        """
+        Realiza una consulta usando RAG (Retrieval-Augmented Generation)
+        """
+        return self.answer_question(question, n_results, history, session_id)["answer"]
+
+    def _backfill_registry(self):
+        """
+        Registra en el manifiesto los documentos ingeridos antes de que existiera.
+        Recorre la colección una sola vez; las huellas quedan vacías para que la
+        siguiente ingesta incremental los vuelva a sincronizar.
+        """
+        if not self.manifest.is_empty() or self.collection.count() == 0:
+            return
+
+        results = self.collection.get(include=['documents', 'metadatas'])
+        files: Dict[str, Dict[str, Any]] = {}
+        for chunk_id, document, metadata in zip(results['ids'], results['documents'], results['metadatas']):
+            filename = metadata.get('filename', 'Unknown')
+            entry = files.setdefault(filename, {"source": metadata.get('source', filename), "chunks": []})
+            entry["chunks"].append((chunk_id, metadata.get('chunk_index', 0), text_sha256(document or "")))
+
+        for filename, entry in files.items():
+            self.manifest.record_file(filename, entry["source"], -1, 0.0, "", entry["chunks"])
+        logger.info(f"Registro de documentos reconstruido desde la colección ({len(files)} archivos)")
 
     def list_documents(self) -> List[str]:
         """
         Lista todos los documentos en el almacén
         """
         try:
-            results = self.collection.get(
-                include=['metadatas']
-            )
-            
-            # Extraer archivos únicos
-            sources = set()
-            for metadata in results['metadatas']:
-                sources.add(metadata.get('filename', 'Unknown'))
-            
-            return list(sources)
+            return [record["filename"] for record in self.manifest.list_files()]
             
         except Exception as e:
             logger.error(f"Error listando documentos: {e}")
             return []
 
+    def list_document_records(self) -> List[Dict[str, Any]]:
+        """
+        Lista los documentos con su hash, número de chunks y fecha de ingesta
+        """
+        return self.manifest.list_files()
+
+    def get_document(self, filename: str) -> Optional[Dict[str, Any]]:
+        """
+        Devuelve el registro de un documento con los ids de sus chunks
+        """
+        record = self.manifest.get_file(filename)
+        if record is None:
+            return None
+        return {**record, "chunk_ids": self.manifest.get_chunk_ids(filename)}
+
     def delete_document(self, filename: str) -> bool:
         """
         Elimina un documento del almacén vectorial
         """
         try:
-            # Buscar IDs del documento
-            results = self.collection.get(
-                where={"filename": filename},
-                include=['ids']
-            )
-            
-            if results['ids']:
-                self.collection.delete(ids=results['ids'])
-                logger.info(f"Documento {filename} eliminado exitosamente")
-                return True
-            else:
+            # IDs del documento desde el registro (sin recorrer la colección)
+            ids = self.manifest.get_chunk_ids(filename)
+            if not ids and self.manifest.get_file(filename) is None:
                 logger.warning(f"Documento {filename} no encontrado")
                 return False
+
+            with self._collection_write() as lexical:
+                if ids:
+                    self.collection.delete(ids=ids)
+                if lexical is not None:
+                    lexical.remove(ids)
+            self.manifest.remove_file(filename)
+            if self.answer_cache is not None:
+                self.answer_cache.invalidate()
+            logger.info(f"Documento {filename} eliminado exitosamente")
+            return True
                 
         except Exception as e:
             logger.error(f"Error eliminando documento {filename}: {e}")
@@ -288,14 +1487,11 @@ if __name__ == "__main__":
     print("=== Añadiendo documentos ===")
     docs_dir = Path("documents")
 
-    valid_extensions = [".pdf", ".docx", ".doc", ".txt"]
-    
-    documents = [str(f) for f in docs_dir.glob("*") if f.suffix.lower() in valid_extensions]
+    documents = [str(f) for f in docs_dir.glob("*") if f.suffix.lower() in VALID_EXTENSIONS]
 
-    for doc_path in documents:
-        if os.path.exists(doc_path):
-            success = vector_store.add_document(doc_path)
-            print(f"Documento {doc_path}: {'✓ Añadido' if success else '✗ Error'}")
+    ingest = vector_store.add_documents(documents, incremental=True)
+    for doc_path, success in ingest["results"].items():
+        print(f"Documento {doc_path}: {'✓ Añadido' if success else '✗ Error'}")
     
     print("\n=== Documentos en el almacén ===")
     docs = vector_store.list_documents()
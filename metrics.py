@@ -0,0 +1,216 @@
+import bisect
+import contextlib
+import contextvars
+import json
+import logging
+import math
+import threading
+import time
+import uuid
+from typing import List, Dict, Any, Tuple, Iterator
+
+logger = logging.getLogger(__name__)
+# Un registro JSON por span (nivel INFO): trace_id, span, duration_ms, status y atributos
+span_logger = logging.getLogger(f"{__name__}.spans")
+
+# Id de traza de la petición en curso (lo fija el middleware del servidor)
+TRACE_ID: contextvars.ContextVar[str] = contextvars.ContextVar("trace_id", default="-")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+
+
+def new_trace_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, value: float = 1.0, **labels: str):
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = (), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        # Por combinación de etiquetas: conteos por bucket (no acumulados), suma y total
+        self._series: Dict[Tuple[str, ...], Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str):
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = {"buckets": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0}
+                self._series[key] = series
+            series["buckets"][position] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (math.inf,), series["buckets"]):
+                    cumulative += count
+                    le = f'le="{_format_value(bound)}"'
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(series['sum'])}")
+                lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {series['count']}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        """
+        Registro de métricas en memoria con exportación en formato de texto de Prometheus
+        """
+        self._metrics: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, help_text: str, labels: Tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, help_text, labels))
+
+    def histogram(self, name: str, help_text: str, labels: Tuple[str, ...] = (), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, labels, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "rag_stage_seconds", "Duración de cada etapa del pipeline RAG", labels=("stage",)
+)
+STAGE_ERRORS = REGISTRY.counter(
+    "rag_stage_errors_total", "Excepciones por etapa del pipeline RAG", labels=("stage",)
+)
+STAGE_ITEMS = REGISTRY.histogram(
+    "rag_stage_items", "Elementos procesados por etapa (textos, resultados, tokens de contexto)",
+    labels=("stage",), buckets=TOKEN_BUCKETS
+)
+LLM_TOKENS = REGISTRY.histogram(
+    "rag_llm_tokens", "Tokens por llamada a ollama.chat (prompt o completion)",
+    labels=("kind",), buckets=TOKEN_BUCKETS
+)
+LLM_EVAL_SECONDS = REGISTRY.histogram(
+    "rag_llm_eval_seconds", "Duraciones reportadas por Ollama (prompt_eval o eval)", labels=("kind",)
+)
+TIME_TO_FIRST_TOKEN = REGISTRY.histogram(
+    "rag_time_to_first_token_seconds", "Tiempo hasta el primer token en las respuestas en streaming"
+)
+HTTP_SECONDS = REGISTRY.histogram(
+    "http_request_seconds", "Latencia de las peticiones HTTP", labels=("method", "path", "status")
+)
+
+
+@contextlib.contextmanager
+def span(stage: str, **attributes: Any) -> Iterator[Dict[str, Any]]:
+    """
+    Mide una etapa del pipeline, la registra en rag_stage_seconds y la
+    escribe con record_span. El diccionario devuelto admite atributos
+    adicionales (p. ej. "items") que se añaden al registro del span.
+    """
+    start = time.perf_counter()
+    status = "ok"
+    try:
+        yield attributes
+    except Exception:
+        STAGE_ERRORS.inc(stage=stage)
+        status = "error"
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        if "items" in attributes:
+            STAGE_ITEMS.observe(attributes["items"], stage=stage)
+        record_span(stage, elapsed, status, **attributes)
+
+
+def record_span(stage: str, seconds: float, status: str = "ok", **attributes: Any):
+    """
+    Escribe un span como una línea JSON en el logger "metrics.spans" (INFO),
+    con el id de traza de la petición en curso. El diccionario también va en
+    el atributo `span` del LogRecord para handlers que exporten los campos.
+    """
+    record = {
+        "trace_id": TRACE_ID.get(),
+        "span": stage,
+        "duration_ms": round(seconds * 1000, 3),
+        "status": status,
+    }
+    record.update((key, value) for key, value in attributes.items() if key not in record)
+    span_logger.info(json.dumps(record, ensure_ascii=False, default=str), extra={"span": record})
+
+
+def observe_stage(stage: str, seconds: float):
+    """
+    Registra una etapa ya medida (cuando no se puede envolver en un span)
+    """
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    record_span(stage, seconds)
+
+
+def record_generation(response: Any):
+    """
+    Registra los contadores que Ollama devuelve al terminar una generación
+    (tokens y duraciones en nanosegundos)
+    """
+    for kind, count_key, duration_key in (
+        ("prompt", "prompt_eval_count", "prompt_eval_duration"),
+        ("completion", "eval_count", "eval_duration"),
+    ):
+        count = response.get(count_key)
+        if count is not None:
+            LLM_TOKENS.observe(count, kind=kind)
+        duration = response.get(duration_key)
+        if duration is not None:
+            LLM_EVAL_SECONDS.observe(duration / 1e9, kind=kind)
@@ -0,0 +1,104 @@
+import time
+from typing import List, Dict, Any
+import numpy as np
+
+
+def _min_max(values: np.ndarray) -> np.ndarray:
+    spread = values.max() - values.min()
+    if spread <= 0:
+        return np.ones_like(values)
+    return (values - values.min()) / spread
+
+
+class MMRReranker:
+    def __init__(
+        self,
+        diversity: float = 0.3,
+        lexical_weight: float = 0.3,
+        cutoff: float = 0.75,
+        min_passages: int = 2,
+        candidate_factor: int = 3,
+        max_candidates: int = 40,
+        time_budget_ms: float = 20.0,
+    ):
+        """
+        Reordenación de segunda etapa basada en embeddings (MMR), en CPU.
+
+        La relevancia de cada candidato combina la similitud coseno con la
+        consulta y la puntuación de la fusión híbrida (ambas normalizadas
+        entre los candidatos). Se descartan los candidatos por debajo de
+        `cutoff` veces la relevancia del mejor (corte adaptativo: depende de
+        la distribución de cada consulta) y entre el resto se eligen los
+        pasajes con Maximal Marginal Relevance, penalizando los redundantes
+        con `diversity`.
+
+        El coste queda acotado por `max_candidates` y `time_budget_ms`: si se
+        agota el tiempo, el resto se completa por relevancia.
+        """
+        self.diversity = diversity
+        self.lexical_weight = lexical_weight
+        self.cutoff = cutoff
+        self.min_passages = min_passages
+        self.candidate_factor = candidate_factor
+        self.max_candidates = max_candidates
+        self.time_budget_ms = time_budget_ms
+
+    def candidates(self, n_results: int) -> int:
+        """
+        Número de candidatos a recuperar para devolver hasta `n_results` pasajes
+        """
+        return min(max(n_results * self.candidate_factor, n_results), self.max_candidates)
+
+    def relevance(self, query_embedding: List[float], results: List[Dict[str, Any]], vectors: np.ndarray) -> np.ndarray:
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        cosine = vectors @ query
+        if self.lexical_weight and any("score" in result for result in results):
+            fused = np.asarray([result.get("score", 0.0) for result in results], dtype=np.float32)
+            return (1 - self.lexical_weight) * _min_max(cosine) + self.lexical_weight * _min_max(fused)
+        return _min_max(cosine)
+
+    def rerank(self, query_embedding: List[float], results: List[Dict[str, Any]], n_results: int) -> List[Dict[str, Any]]:
+        """
+        Devuelve hasta `n_results` resultados por encima del corte, en orden MMR.
+        Cada resultado debe traer su 'embedding', que se elimina de la salida.
+        """
+        if not results:
+            return []
+        start = time.perf_counter()
+        results = results[:self.max_candidates]
+
+        vectors = np.asarray([result["embedding"] for result in results], dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        vectors = vectors / norms
+        relevance = self.relevance(query_embedding, results, vectors)
+
+        # Corte adaptativo (manteniendo al menos min_passages)
+        order = np.argsort(-relevance)
+        keep = max(int(np.sum(relevance >= self.cutoff * relevance.max())), min(self.min_passages, len(results)))
+        pool = list(order[:keep])
+        limit = min(n_results, len(pool))
+
+        selected: List[int] = []
+        max_similarity = np.full(len(results), -np.inf, dtype=np.float32)
+        while pool and len(selected) < limit:
+            if (time.perf_counter() - start) * 1000 > self.time_budget_ms:
+                # Presupuesto agotado: completar por relevancia
+                selected.extend(pool[:limit - len(selected)])
+                break
+            candidates = np.asarray(pool)
+            redundancy = np.where(np.isfinite(max_similarity[candidates]), max_similarity[candidates], 0.0)
+            mmr = (1 - self.diversity) * relevance[candidates] - self.diversity * redundancy
+            best = int(candidates[int(np.argmax(mmr))])
+            selected.append(best)
+            pool.remove(best)
+            max_similarity = np.maximum(max_similarity, vectors @ vectors[best])
+
+        reranked = []
+        for index in selected:
+            result = {key: value for key, value in results[index].items() if key != "embedding"}
+            result["rerank_score"] = float(relevance[index])
+            result["score"] = float(relevance[index])
+            reranked.append(result)
+        return reranked
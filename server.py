@@ -1,14 +1,64 @@
 # app/main.py
 
-from fastapi import FastAPI
+import time
+
+_IMPORT_START = time.perf_counter()
+
+import os
+import json
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request, Depends
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse
 from pydantic import BaseModel
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Union
 from fastapi.middleware.cors import CORSMiddleware
-from local_vector_store import LocalVectorStore
 from decision_tree_vsr import decision_tree_vsr
+from decision_engine import CompiledDecisionTree
+from strategy_engine import StrategyEngine, STRATEGY_COLUMNS, columns_from_csv, columns_from_parquet
+from metrics import REGISTRY, HTTP_SECONDS, TRACE_ID, new_trace_id, record_span
+from warmup import VectorStoreProvider
+
+
+def create_vector_store():
+    # Importación diferida: ChromaDB, Ollama y el índice solo se cargan al necesitarse
+    from local_vector_store import LocalVectorStore
+
+    return LocalVectorStore(
+        persist_directory=os.getenv("CHROMA_PERSIST_DIRECTORY", "./chroma_db"),
+        retrieval_concurrency=int(os.getenv("RETRIEVAL_CONCURRENCY", "8")),
+        generation_concurrency=int(os.getenv("GENERATION_CONCURRENCY", "2")),
+        answer_cache=os.getenv("ANSWER_CACHE", "1") != "0",
+        # Con VECTOR_STORE_URL, los workers consultan el servicio vectorial compartido
+        vector_backend="remote" if os.getenv("VECTOR_STORE_URL") else os.getenv("VECTOR_BACKEND", "chroma"),
+        vector_store_url=os.getenv("VECTOR_STORE_URL"),
+        rerank=os.getenv("RERANK", "0") == "1",
+        session_token_budget=int(os.getenv("SESSION_TOKEN_BUDGET", "1500")),
+        summarize_sessions=os.getenv("SESSION_SUMMARY", "truncate") == "llm",
+    )
+
+
+vector_store_provider = VectorStoreProvider(create_vector_store)
+
+
+def get_vector_store():
+    """Dependencia: devuelve el almacén vectorial (FastAPI la ejecuta en el pool de hilos)"""
+    return vector_store_provider.get()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # El calentamiento corre en segundo plano: /decision y /strategy responden de inmediato
+    if os.getenv("WARMUP", "1") != "0":
+        vector_store_provider.start_warm_up()
+    yield
+
+
+app = FastAPI(lifespan=lifespan)
 
-app = FastAPI()
-vector_store = LocalVectorStore()
+# Árbol compilado y validado una sola vez al arrancar
+decision_tree = CompiledDecisionTree(decision_tree_vsr)
+strategy_engine = StrategyEngine()
 
 # Permitir CORS
 app.add_middleware(
@@ -19,10 +69,40 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Id de traza por petición y latencia HTTP por ruta
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    trace_id = request.headers.get("X-Trace-Id") or new_trace_id()
+    token = TRACE_ID.set(trace_id)
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        response.headers["X-Trace-Id"] = trace_id
+        return response
+    finally:
+        # Plantilla de la ruta (no la URL concreta) para acotar la cardinalidad
+        route = request.scope.get("route")
+        path = getattr(route, "path", "unmatched")
+        elapsed = time.perf_counter() - start
+        HTTP_SECONDS.observe(elapsed, method=request.method, path=path, status=status)
+        record_span(
+            "http", elapsed, "error" if status >= 500 else "ok",
+            method=request.method, path=path, http_status=status
+        )
+        TRACE_ID.reset(token)
+
 # -------- MODELOS --------
 class QueryRequest(BaseModel):
     question: str
-    n_results: Optional[int] = 20
+    n_results: Optional[int] = 8
+    # Conversación guardada en el servidor; sin ella cada consulta es independiente
+    session_id: Optional[str] = None
+
+class SearchBatchRequest(BaseModel):
+    queries: List[str]
+    n_results: Optional[int] = 5
 
 class StrategyInput(BaseModel):
     seasonVSR: Optional[bool] = False
@@ -37,104 +117,163 @@ class DecisionInput(BaseModel):
     peso_kg: Optional[float] = None
     unidad_original: Optional[str] = None
 
+class PatientRecord(BaseModel):
+    temporada_vsr: Optional[bool] = None
+    edad_meses: Optional[float] = None
+    peso_kg: Optional[float] = None
+    respuestas: Dict[str, Union[bool, str]] = {}
 
-# -------- FUNCIONES --------
-def find_node_by_id(node: Dict[str, Any], node_id: str) -> Optional[Dict[str, Any]]:
-    """Busca un nodo en el árbol por su id"""
-    if node.get("id") == node_id:
-        return node
-    for key, value in node.items():
-        if isinstance(value, dict):
-            found = find_node_by_id(value, node_id)
-            if found:
-                return found
-        elif isinstance(value, list):
-            for item in value:
-                found = find_node_by_id(item, node_id)
-                if found:
-                    return found
-    return None
+class CohortInput(BaseModel):
+    pacientes: List[PatientRecord]
 
 
 # -------- ENDPOINTS --------
 
 @app.post("/query")
-def query_docs(req: QueryRequest):
-    answer = vector_store.query_with_ollama(req.question, req.n_results)
-    sources = vector_store.search(req.question, req.n_results)
-    return {"answer": answer, "sources": sources}
+async def query_docs(req: QueryRequest, vector_store=Depends(get_vector_store)):
+    return await vector_store.aanswer_question(req.question, req.n_results, session_id=req.session_id)
+
+
+@app.post("/query/stream")
+async def query_docs_stream(req: QueryRequest, vector_store=Depends(get_vector_store)):
+    """Igual que /query pero por Server-Sent Events: fuentes, tokens y metadatos finales"""
+    async def event_stream():
+        async for event in vector_store.astream_answer(req.question, req.n_results, session_id=req.session_id):
+            yield f"event: {event['event']}\ndata: {json.dumps(event['data'], ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.delete("/sessions/{session_id}")
+def delete_session(session_id: str, vector_store=Depends(get_vector_store)):
+    if not vector_store.sessions.clear(session_id):
+        raise HTTPException(status_code=404, detail="Sesión no encontrada")
+    return {"deleted": session_id}
+
+
+@app.post("/search/batch")
+async def search_batch(req: SearchBatchRequest, vector_store=Depends(get_vector_store)):
+    """Recuperación (sin generación) para muchas preguntas en una sola petición"""
+    results = await vector_store.asearch_many(req.queries, req.n_results)
+    return {
+        "total": len(results),
+        "results": [{"query": query, "results": found} for query, found in zip(req.queries, results)]
+    }
+
+
+@app.get("/health/live")
+def health_live():
+    """El proceso responde (no depende del almacén vectorial ni de Ollama)"""
+    return {"status": "alive", "import_seconds": IMPORT_SECONDS}
+
+
+@app.get("/health/ready")
+def health_ready():
+    """Listo cuando el índice está cargado; incluye el estado de cada paso del calentamiento"""
+    status = vector_store_provider.status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+
+@app.get("/metrics")
+def metrics():
+    """Histogramas de latencia por etapa y de Ollama en formato de texto de Prometheus"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/documents")
+def list_documents(vector_store=Depends(get_vector_store)):
+    """Registro de documentos: nombre, hash, número de chunks y fecha de ingesta"""
+    documents = vector_store.list_document_records()
+    return {"total": len(documents), "documents": documents}
+
+
+@app.get("/documents/{filename}")
+def get_document(filename: str, vector_store=Depends(get_vector_store)):
+    document = vector_store.get_document(filename)
+    if document is None:
+        raise HTTPException(status_code=404, detail="Documento no encontrado")
+    return document
+
+
+@app.delete("/documents/{filename}")
+def delete_document(filename: str, vector_store=Depends(get_vector_store)):
+    if not vector_store.delete_document(filename):
+        raise HTTPException(status_code=404, detail="Documento no encontrado")
+    return {"deleted": filename}
 
 
 @app.post("/decision")
-def decision_step(data: DecisionInput):
+async def decision_step(data: DecisionInput):
     """Evalúa el árbol de decisión según la respuesta o valores numéricos"""
-    current_node = find_node_by_id(decision_tree_vsr, data.current_node)
-    if not current_node:
-        return {"error": "Nodo no encontrado", "next": "inicio"}
-
-    # Caso: resultado final
-    if "resultado" in current_node:
-        return {"type": "resultado", "resultado": current_node["resultado"], "detalle": current_node["detalle"]}
-
-    # === Caso numérico (edad o peso) ===
-    if current_node.get("inputType") == "number":
-        valor = data.edad_meses if "edad" in current_node["pregunta"].lower() else data.peso_kg
-        if valor is None:
-            return {"error": "Se esperaba un valor numérico."}
-
-        for rango in current_node.get("rangos", []):
-            min_v = rango.get("min", 0)
-            max_v = rango.get("max", float("inf"))
-            if (min_v is None or valor >= min_v) and (max_v is None or valor < max_v):
-                # Si el rango tiene resultado directo
-                if "resultado" in rango:
-                    return {"type": "resultado", "resultado": rango["resultado"], "detalle": rango["detalle"]}
-                # O si tiene next_id
-                siguiente = find_node_by_id(decision_tree_vsr, rango["next_id"])
-                return {"type": "pregunta", "next_id": siguiente.get("id", ""), "pregunta": siguiente.get("pregunta")}
-
-        return {"error": "Valor fuera de rango o no reconocido"}
-
-    # === Caso respuesta Sí/No ===
-    if data.respuesta:
-        respuesta = data.respuesta.lower().strip()
-        if respuesta in ["si", "sí"] and "si" in current_node:
-            siguiente = current_node["si"]
-        elif respuesta == "no" and "no" in current_node:
-            siguiente = current_node["no"]
-        else:
-            return {"error": "Respuesta no válida para este nodo"}
-
-        if "resultado" in siguiente:
-            return {"type": "resultado", "resultado": siguiente["resultado"], "detalle": siguiente["detalle"]}
-        return {"type": "pregunta", "next_id": siguiente.get("id", ""), "pregunta": siguiente.get("pregunta")}
-
-    # === Caso opciones de texto ===
-    if "opciones" in current_node:
-        return {
-            "type": "pregunta",
-            "next_id": current_node.get("id", ""),
-            "pregunta": current_node["pregunta"],
-            "opciones": [opt["texto"] for opt in current_node["opciones"]],
-        }
-
-    return {"type": "pregunta", "next_id": current_node.get("id", ""), "pregunta": current_node.get("pregunta")}
+    return decision_tree.step(data.current_node, data.respuesta, data.edad_meses, data.peso_kg)
+
+
+@app.post("/decision/batch")
+async def decision_batch(data: CohortInput):
+    """Recorre el árbol completo para una cohorte de pacientes (evaluación vectorizada)"""
+    records = []
+    for paciente in data.pacientes:
+        respuestas = dict(paciente.respuestas)
+        # La bandera de temporada responde a la pregunta raíz del árbol
+        if paciente.temporada_vsr is not None:
+            respuestas[decision_tree.root_id] = paciente.temporada_vsr
+        records.append({"edad_meses": paciente.edad_meses, "peso_kg": paciente.peso_kg, "respuestas": respuestas})
+
+    resultados = decision_tree.evaluate_records(records)
+
+    resumen: Dict[str, int] = {}
+    for resultado in resultados:
+        key = resultado["resultado"] or "ERROR"
+        resumen[key] = resumen.get(key, 0) + 1
+
+    # Contenido ya serializable: se evita jsonable_encoder sobre miles de filas
+    return JSONResponse({"total": len(resultados), "resumen": resumen, "resultados": resultados})
 
 
 @app.post("/strategy")
-def generate_strategy(data: StrategyInput):
-    recomendaciones = []
-
-    if data.seasonVSR:
-        recomendaciones.append("Temporada VSR activa: priorizar vacunación materna y refuerzo de medidas preventivas.")
-    if data.meanAge and data.meanAge < 6:
-        recomendaciones.append("Alta proporción de lactantes jóvenes: reforzar seguimiento pediátrico.")
-    if data.quantityVaccinatedMothers and data.quantityVaccinatedMothers < 500:
-        recomendaciones.append("Baja cobertura en madres vacunadas: implementar campañas focalizadas.")
-    if data.childBornPostVSR_NB and data.childBornPostVSR_NB > 100:
-        recomendaciones.append("Aumento de nacimientos post-VSR: ampliar dosis preventivas a recién nacidos de riesgo.")
-
-    if not recomendaciones:
-        recomendaciones.append("No se identificaron riesgos significativos. Mantener vigilancia epidemiológica.")
-
-    return {"recomendacion": "\n".join(recomendaciones), "total_factores": len(recomendaciones)}
+async def generate_strategy(data: StrategyInput):
+    return strategy_engine.evaluate(data.model_dump())
+
+
+def _strategy_columns(body: bytes, content_type: str) -> Dict[str, Any]:
+    if "csv" in content_type:
+        return columns_from_csv(body.decode("utf-8-sig"))
+    if "parquet" in content_type:
+        return columns_from_parquet(body)
+    columns = json.loads(body)
+    if not isinstance(columns, dict):
+        raise ValueError("Se espera un objeto con una lista de valores por columna")
+    return {name: values for name, values in columns.items() if name in STRATEGY_COLUMNS}
+
+
+@app.post("/strategy/batch")
+async def generate_strategy_batch(request: Request):
+    """
+    Evalúa la estrategia para muchas regiones a la vez. El cuerpo es una tabla
+    por columnas (seasonVSR, meanAge, quantityVaccinatedMothers,
+    childBornPostVSR_NB): JSON {"columna": [valores]}, CSV con cabecera
+    (Content-Type: text/csv) o Parquet (application/vnd.apache.parquet, con pyarrow).
+    """
+    body = await request.body()
+    content_type = request.headers.get("content-type", "application/json")
+
+    def evaluate():
+        return strategy_engine.evaluate_columns(_strategy_columns(body, content_type))
+
+    try:
+        # Parseo y evaluación fuera del event loop: pueden ser decenas de miles de filas
+        result = await run_in_threadpool(evaluate)
+    except RuntimeError as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    except (ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=422, detail=f"Tabla inválida: {e}")
+
+    return JSONResponse(result)
+
+
+# Tiempo de importación del módulo (sin contar el calentamiento)
+IMPORT_SECONDS = time.perf_counter() - _IMPORT_START
@@ -0,0 +1,196 @@
+import threading
+import time
+import logging
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Callable
+from context_builder import estimate_tokens, CHARS_PER_TOKEN
+
+logger = logging.getLogger(__name__)
+
+# (resumen anterior, mensajes a plegar) -> resumen nuevo
+Summarizer = Callable[[str, List[Dict[str, str]]], str]
+
+
+def _clip(text: str, max_tokens: int) -> str:
+    limit = max_tokens * CHARS_PER_TOKEN
+    return text if len(text) <= limit else text[:limit].rstrip() + "…"
+
+
+def truncate_summary(summary: str, messages: List[Dict[str, str]], max_tokens: int = 300) -> str:
+    """
+    Resumen extractivo sin llamar al modelo: una línea por turno (la pregunta
+    y el inicio de la respuesta). Si no cabe en `max_tokens`, se descartan
+    las líneas más antiguas.
+    """
+    lines = summary.splitlines() if summary else []
+    for message in messages:
+        if message["role"] == "user":
+            lines.append(f"- Pregunta: {_clip(message['content'], 60)}")
+        elif message["role"] == "assistant":
+            lines.append(f"  Respuesta: {_clip(message['content'], 40)}")
+
+    while len(lines) > 1 and estimate_tokens("\n".join(lines)) > max_tokens:
+        lines.pop(0)
+    return "\n".join(lines)
+
+
+class SessionManager:
+    def __init__(
+        self,
+        token_budget: int = 1500,
+        keep_recent: int = 4,
+        summary_token_budget: int = 300,
+        ttl_seconds: float = 3600,
+        max_sessions: int = 1000,
+        summarizer: Optional[Summarizer] = None,
+    ):
+        """
+        Estado de las conversaciones en el servidor, por session_id (en memoria
+        de cada proceso).
+
+        El historial solo crece por el final, de modo que entre compactaciones
+        el prefijo del prompt (system prompt, resumen y turnos anteriores) se
+        repite de un turno a otro y Ollama reutiliza su caché KV. Cuando los
+        turnos superan `token_budget`, los más antiguos (salvo los
+        `keep_recent` últimos mensajes) se pliegan en un resumen de como mucho
+        `summary_token_budget` tokens y el historial baja a la mitad del
+        presupuesto: la compactación es ocasional y el coste por turno se
+        mantiene acotado. Las sesiones caducan tras `ttl_seconds` de
+        inactividad y se expulsan por LRU al superar `max_sessions`.
+        """
+        self.token_budget = token_budget
+        self.keep_recent = keep_recent + keep_recent % 2
+        self.summary_token_budget = summary_token_budget
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self.summarizer = summarizer or (
+            lambda summary, messages: truncate_summary(summary, messages, summary_token_budget)
+        )
+        self._sessions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.compactions = 0
+
+    def _expire(self, now: float):
+        expired = [key for key, session in self._sessions.items() if now - session["updated"] > self.ttl_seconds]
+        for key in expired:
+            del self._sessions[key]
+
+    def _get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        self._expire(time.time())
+        session = self._sessions.get(session_id)
+        if session is not None:
+            self._sessions.move_to_end(session_id)
+        return session
+
+    def history(self, session_id: str) -> List[Dict[str, str]]:
+        """
+        Mensajes a insertar tras el system prompt: el resumen (si lo hay) y los
+        turnos recientes
+        """
+        with self._lock:
+            session = self._get(session_id)
+            if session is None:
+                return []
+            messages = []
+            if session["summary"]:
+                messages.append({
+                    "role": "system",
+                    "content": f"Resumen de la conversación anterior:\n{session['summary']}"
+                })
+            messages.extend(dict(message) for message in session["turns"])
+            return messages
+
+    def append(self, session_id: str, question: str, answer: str, compact: bool = True) -> bool:
+        """
+        Registra un turno (la pregunta sin el contexto recuperado y la
+        respuesta) y compacta el historial si supera el presupuesto. Con
+        `compact=False` no compacta: devuelve True si hace falta llamar a
+        compact() (p. ej. en segundo plano cuando el resumen usa el modelo).
+        """
+        # Ningún mensaje por sí solo ocupa más de medio presupuesto
+        max_message_tokens = max(1, self.token_budget // 2)
+        turn = [
+            {"role": "user", "content": _clip(question, max_message_tokens)},
+            {"role": "assistant", "content": _clip(answer, max_message_tokens)},
+        ]
+
+        with self._lock:
+            session = self._get(session_id)
+            if session is None:
+                session = {
+                    "summary": "", "turns": [], "tokens": 0, "updated": time.time(), "lock": threading.Lock()
+                }
+                self._sessions[session_id] = session
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+
+        with session["lock"]:
+            with self._lock:
+                session["turns"].extend(turn)
+                session["tokens"] += sum(estimate_tokens(message["content"]) for message in turn)
+                session["updated"] = time.time()
+                over_budget = session["tokens"] > self.token_budget
+
+        if over_budget and compact:
+            self.compact(session_id)
+            return False
+        return over_budget
+
+    def compact(self, session_id: str):
+        """
+        Pliega los turnos más antiguos en el resumen si la sesión supera el
+        presupuesto.
+
+        Un lock por sesión serializa append y compactación de una misma
+        conversación: dos compactaciones concurrentes no resumen los mismos
+        turnos ni sobrescriben una el resumen de la otra. Los turnos plegados
+        se quitan al guardar el resumen, así que history() nunca ve un hueco.
+        """
+        with self._lock:
+            session = self._sessions.get(session_id)
+        if session is None:
+            return
+
+        with session["lock"]:
+            with self._lock:
+                if session["tokens"] <= self.token_budget:
+                    return
+
+                # Plegar los mensajes más antiguos hasta dejar la mitad del presupuesto
+                turns = session["turns"]
+                tokens = session["tokens"]
+                cut = 0
+                while len(turns) - cut > self.keep_recent and tokens > self.token_budget // 2:
+                    # Por turnos completos (pregunta y respuesta)
+                    tokens -= sum(estimate_tokens(message["content"]) for message in turns[cut:cut + 2])
+                    cut += 2
+                if cut == 0:
+                    return
+                folded = turns[:cut]
+                folded_tokens = session["tokens"] - tokens
+                previous_summary = session["summary"]
+
+            # El resumen (posiblemente con el modelo) se calcula fuera del lock
+            # global; el de la sesión impide otra compactación mientras tanto
+            try:
+                summary = self.summarizer(previous_summary, folded)
+            except Exception as e:
+                logger.error(f"Error resumiendo la sesión {session_id}, se trunca: {e}")
+                summary = truncate_summary(previous_summary, folded, self.summary_token_budget)
+            with self._lock:
+                # Solo se añadieron turnos por el final: los plegados siguen al principio
+                del session["turns"][:cut]
+                session["tokens"] -= folded_tokens
+                session["summary"] = _clip(summary, self.summary_token_budget)
+                self.compactions += 1
+
+    def clear(self, session_id: str) -> bool:
+        """
+        Elimina una sesión. Devuelve False si no existía.
+        """
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._sessions)
@@ -0,0 +1,206 @@
+import csv
+import io
+from typing import List, Dict, Any
+import numpy as np
+
+# Columnas de entrada de la estrategia (una fila por región o municipio)
+STRATEGY_COLUMNS = ["seasonVSR", "meanAge", "quantityVaccinatedMothers", "childBornPostVSR_NB"]
+
+# Reglas declarativas: una regla se activa si el valor de su columna está
+# presente, es distinto de cero y cumple la comparación ("truthy" solo exige
+# lo primero). Es la semántica de `if valor and valor < umbral` del endpoint original.
+STRATEGY_RULES: List[Dict[str, Any]] = [
+    {
+        "id": "temporada_vsr",
+        "column": "seasonVSR",
+        "op": "truthy",
+        "message": "Temporada VSR activa: priorizar vacunación materna y refuerzo de medidas preventivas.",
+    },
+    {
+        "id": "lactantes_jovenes",
+        "column": "meanAge",
+        "op": "<",
+        "value": 6,
+        "message": "Alta proporción de lactantes jóvenes: reforzar seguimiento pediátrico.",
+    },
+    {
+        "id": "baja_cobertura_materna",
+        "column": "quantityVaccinatedMothers",
+        "op": "<",
+        "value": 500,
+        "message": "Baja cobertura en madres vacunadas: implementar campañas focalizadas.",
+    },
+    {
+        "id": "nacimientos_post_vsr",
+        "column": "childBornPostVSR_NB",
+        "op": ">",
+        "value": 100,
+        "message": "Aumento de nacimientos post-VSR: ampliar dosis preventivas a recién nacidos de riesgo.",
+    },
+]
+
+DEFAULT_MESSAGE = "No se identificaron riesgos significativos. Mantener vigilancia epidemiológica."
+
+OPERATORS = {
+    "<": np.less,
+    "<=": np.less_equal,
+    ">": np.greater,
+    ">=": np.greater_equal,
+    "==": np.equal,
+    "!=": np.not_equal,
+    "truthy": None,
+}
+
+TRUE_VALUES = {"true", "si", "sí", "yes"}
+FALSE_VALUES = {"false", "no"}
+NULL_VALUES = {"", "null", "none", "nan", "na"}
+
+
+def to_column(values: List[Any]) -> np.ndarray:
+    """
+    Convierte una columna (números, booleanos, textos o None) a float64.
+    Los nulos quedan como NaN; lanza ValueError si un valor no es numérico.
+    """
+    if isinstance(values, np.ndarray) and values.dtype.kind in "biuf":
+        return values.astype(np.float64)
+    try:
+        # Caso habitual (números, booleanos y None) resuelto por NumPy sin bucle
+        return np.asarray(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        pass
+
+    column = np.empty(len(values), dtype=np.float64)
+    for i, value in enumerate(values):
+        if value is None:
+            column[i] = np.nan
+        elif isinstance(value, str):
+            text = value.strip().lower()
+            if text in TRUE_VALUES:
+                column[i] = 1.0
+            elif text in FALSE_VALUES:
+                column[i] = 0.0
+            elif text in NULL_VALUES:
+                column[i] = np.nan
+            else:
+                column[i] = float(text)
+        else:
+            try:
+                column[i] = float(value)
+            except TypeError:
+                # Listas, objetos y demás valores no escalares
+                raise ValueError(f"Valor no numérico en la fila {i}: {value!r}")
+    return column
+
+
+def columns_from_csv(text: str) -> Dict[str, List[str]]:
+    """
+    Lee una tabla CSV con cabecera y la devuelve por columnas
+    """
+    reader = csv.reader(io.StringIO(text))
+    header = next(reader, None)
+    if header is None:
+        return {}
+    header = [name.strip() for name in header]
+    rows = [row for row in reader if row]
+    columns: Dict[str, List[str]] = {}
+    for j, name in enumerate(header):
+        if name in STRATEGY_COLUMNS:
+            columns[name] = [row[j] if j < len(row) else "" for row in rows]
+    if not columns:
+        # Sin columnas reconocidas: conservar el número de filas
+        columns = {STRATEGY_COLUMNS[0]: ["" for _ in rows]}
+    return columns
+
+
+def columns_from_parquet(data: bytes) -> Dict[str, np.ndarray]:
+    """
+    Lee una tabla Parquet por columnas (requiere pyarrow)
+    """
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Leer Parquet requiere pyarrow (pip install pyarrow)")
+
+    table = pq.read_table(io.BytesIO(data))
+    return {
+        name: np.asarray(table.column(name).to_numpy(zero_copy_only=False))
+        for name in table.column_names
+        if name in STRATEGY_COLUMNS
+    }
+
+
+class StrategyEngine:
+    def __init__(self, rules: List[Dict[str, Any]] = None, default_message: str = DEFAULT_MESSAGE):
+        """
+        Evalúa la tabla de reglas sobre muchas filas a la vez: cada regla es una
+        máscara NumPy sobre su columna. Las filas se agrupan por la combinación
+        de reglas activas (como mucho 2^reglas), así que cada texto de
+        recomendación se construye una sola vez por combinación.
+        """
+        self.rules = list(STRATEGY_RULES if rules is None else rules)
+        self.default_message = default_message
+        for rule in self.rules:
+            if rule.get("op") not in OPERATORS:
+                raise ValueError(f"Regla '{rule.get('id')}': operador no soportado {rule.get('op')!r}")
+            if rule["op"] != "truthy" and "value" not in rule:
+                raise ValueError(f"Regla '{rule.get('id')}': falta el umbral 'value'")
+
+    def masks(self, columns: Dict[str, Any]) -> np.ndarray:
+        """
+        Matriz booleana (reglas x filas) con las reglas activas de cada fila.
+        Las columnas ausentes cuentan como nulas.
+        """
+        converted = {name: to_column(values) for name, values in columns.items()}
+        if any(column.ndim != 1 for column in converted.values()):
+            raise ValueError("Cada columna debe ser una lista de valores")
+        lengths = {len(column) for column in converted.values()}
+        if len(lengths) > 1:
+            raise ValueError(f"Las columnas tienen longitudes distintas: {sorted(lengths)}")
+        n = lengths.pop() if lengths else 0
+
+        masks = np.zeros((len(self.rules), n), dtype=bool)
+        for r, rule in enumerate(self.rules):
+            column = converted.get(rule["column"])
+            if column is None:
+                continue
+            # Nulos y ceros no activan la regla
+            mask = ~np.isnan(column) & (column != 0)
+            if rule["op"] != "truthy":
+                with np.errstate(invalid="ignore"):
+                    mask &= OPERATORS[rule["op"]](column, rule["value"])
+            masks[r] = mask
+        return masks
+
+    def evaluate_columns(self, columns: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Evalúa una tabla por columnas. Devuelve por fila la recomendación y el
+        número de factores (como /strategy), más un resumen por regla.
+        """
+        masks = self.masks(columns)
+        n = masks.shape[1]
+
+        # Código de combinación por fila: bit r = regla r activa
+        weights = (1 << np.arange(len(self.rules), dtype=np.int64))
+        codes = weights @ masks if len(self.rules) else np.zeros(n, dtype=np.int64)
+
+        by_code: Dict[int, Dict[str, Any]] = {}
+        for code in np.unique(codes).tolist():
+            active = [rule for r, rule in enumerate(self.rules) if code >> r & 1]
+            messages = [rule["message"] for rule in active] or [self.default_message]
+            by_code[code] = {
+                "recomendacion": "\n".join(messages),
+                "total_factores": len(messages),
+                "factores": [rule["id"] for rule in active],
+            }
+
+        resultados = [by_code[code] for code in codes.tolist()]
+        resumen = {rule["id"]: int(count) for rule, count in zip(self.rules, masks.sum(axis=1))}
+        resumen["sin_riesgos"] = int(np.sum(codes == 0))
+        return {"total": n, "resumen": resumen, "resultados": resultados}
+
+    def evaluate(self, values: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Evalúa una sola fila (formato de respuesta de /strategy)
+        """
+        result = self.evaluate_columns({name: [values.get(name)] for name in STRATEGY_COLUMNS})["resultados"][0]
+        return {"recomendacion": result["recomendacion"], "total_factores": result["total_factores"]}
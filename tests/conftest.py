@@ -0,0 +1,21 @@
+import os
+import sys
+
+import pytest
+
+# Los módulos del proyecto viven en la raíz del repositorio
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """
+    LocalVectorStore sobre un directorio temporal y un Ollama simulado
+    """
+    from benchmarks.fake_ollama import FakeOllama
+
+    with FakeOllama(token_latency=0) as fake:
+        monkeypatch.setenv("OLLAMA_HOST", fake.url)
+        from local_vector_store import LocalVectorStore
+
+        yield LocalVectorStore(persist_directory=str(tmp_path / "db"), embedding_cache=False, answer_cache=False)
@@ -0,0 +1,36 @@
+import numpy as np
+
+from answer_cache import SemanticAnswerCache, question_key
+
+
+def _embedding(seed: int = 0, noise: float = 0.0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    vector = rng.normal(size=64)
+    return vector + noise * rng.normal(size=64)
+
+
+def test_question_key_normaliza_cantidades_y_meses():
+    assert question_key("Dosis para un bebé de 3 kg") == ("3 kg",)
+    assert question_key("bebé de 3kg") == ("3 kg",)
+    assert question_key("0,5 ml cada 6 meses en Octubre") == ("0.5 ml", "6 meses", "octubre")
+    assert question_key("¿Qué es el VSR?") == ()
+
+
+def test_preguntas_que_solo_difieren_en_un_numero_no_comparten_respuesta():
+    cache = SemanticAnswerCache(threshold=0.95)
+    # Embeddings casi idénticos (similitud > 0.95), como los de estas dos preguntas
+    first, second = _embedding(), _embedding() * 1.001
+    cache.store(first, "¿Qué dosis de nirsevimab recibe un bebé de 3 kg?", 5, "50 mg", [])
+
+    assert cache.lookup(second, "¿Qué dosis de nirsevimab recibe un bebé de 5 kg?", 5) is None
+    hit = cache.lookup(second, "¿Qué dosis de nirsevimab recibe un bebé de 3 kg?", 5)
+    assert hit is not None and hit["answer"] == "50 mg"
+
+
+def test_sin_cantidades_basta_la_similitud():
+    cache = SemanticAnswerCache(threshold=0.95)
+    cache.store(_embedding(), "¿Qué es el VSR?", 5, "Un virus respiratorio", [])
+
+    assert cache.lookup(_embedding(noise=0.01), "¿Qué es el virus VSR?", 5)["answer"] == "Un virus respiratorio"
+    assert cache.lookup(_embedding(seed=1), "¿Qué es el VSR?", 5) is None
+    assert cache.lookup(_embedding(), "¿Qué es el VSR?", 3) is None
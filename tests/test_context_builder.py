@@ -0,0 +1,98 @@
+from context_builder import (
+    CHARS_PER_TOKEN, MinHasher, assemble_context, estimate_tokens, merge_adjacent, merge_overlapping
+)
+
+
+def _result(doc_id, text, score, source="guia.pdf", chunk_index=None):
+    metadata = {"source": source, "filename": source}
+    if chunk_index is not None:
+        metadata["chunk_index"] = chunk_index
+    return {"id": doc_id, "document": text, "metadata": metadata, "similarity": score, "score": score}
+
+
+def _text(topic: str, words: int = 60) -> str:
+    return " ".join(f"{topic}{i}" for i in range(words))
+
+
+def test_merge_overlapping_quita_el_solapamiento():
+    assert merge_overlapping("uno dos tres cuatro cinco seis", "cuatro cinco seis siete", min_overlap=5) == (
+        "uno dos tres cuatro cinco seis siete"
+    )
+    assert merge_overlapping("sin relación", "otro texto") == "sin relación\notro texto"
+
+
+def test_merge_adjacent_une_chunks_consecutivos():
+    results = [
+        _result("b", "segundo tramo", 0.7, chunk_index=1),
+        _result("a", "primer tramo", 0.9, chunk_index=0),
+        _result("z", "otro documento", 0.8, source="otra.pdf", chunk_index=1),
+        _result("c", "tramo lejano", 0.5, chunk_index=5),
+    ]
+    passages = merge_adjacent(results)
+
+    merged = next(passage for passage in passages if passage["chunks"] == 2)
+    assert merged["ids"] == ["a", "b"]
+    assert merged["text"] == "primer tramo\nsegundo tramo"
+    assert merged["score"] == 0.9 and merged["rank"] == 0
+    assert merged["metadata"]["chunk_index"] == 0
+    assert sorted(len(passage["ids"]) for passage in passages) == [1, 1, 2]
+
+
+def test_minhash_detecta_casi_duplicados():
+    hasher = MinHasher()
+    base = _text("vacuna")
+    near = base.replace("vacuna59", "vacunaX")
+    other = _text("presupuesto")
+
+    assert MinHasher.similarity(hasher.signature(base), hasher.signature(near)) >= 0.8
+    assert MinHasher.similarity(hasher.signature(base), hasher.signature(other)) < 0.3
+
+
+def test_assemble_context_descarta_duplicados_y_conserva_el_mejor():
+    base = _text("vacuna")
+    results = [
+        _result("copia", base.replace("vacuna59", "vacunaX"), 0.7),
+        _result("original", base, 0.9),
+        _result("distinto", _text("dosis"), 0.8),
+    ]
+    packed, stats = assemble_context(results, token_budget=10000)
+
+    assert [passage["ids"] for passage in packed] == [["original"], ["distinto"]]
+    assert stats["duplicates_dropped"] == 1
+    assert stats["passages"] == 2 and stats["chunks"] == 3
+
+
+def test_assemble_context_respeta_el_presupuesto():
+    results = [_result(f"r{i}", _text(f"tema{i}_"), 1.0 - i / 10) for i in range(5)]
+    per_passage = estimate_tokens(results[0]["document"])
+    packed, stats = assemble_context(results, token_budget=2 * per_passage + 1)
+
+    # Entran los dos mejores; los demás se cortan por presupuesto
+    assert [passage["ids"][0] for passage in packed] == ["r0", "r1"]
+    assert stats["over_budget_dropped"] == 3
+    assert stats["tokens_after"] <= 2 * per_passage + 1
+    assert stats["tokens_saved"] == stats["tokens_before"] - stats["tokens_after"]
+
+
+def test_assemble_context_recorta_el_mejor_pasaje_si_no_cabe():
+    packed, stats = assemble_context([_result("largo", _text("largo", 400), 0.9)], token_budget=50)
+
+    assert len(packed) == 1
+    assert len(packed[0]["text"]) == 50 * CHARS_PER_TOKEN
+    assert stats["tokens_after"] <= 50
+
+
+def test_fuentes_de_la_respuesta_son_los_pasajes_del_prompt(store, tmp_path):
+    path = tmp_path / "guia.txt"
+    path.write_text(
+        "\n\n".join(f"Sección {i}: pauta de vacunación contra el VSR. " * 6 for i in range(40)),
+        encoding="utf-8",
+    )
+    assert store.add_document(str(path))
+    store.context_token_budget = 400
+
+    result = store.answer_question("pauta de vacunación", n_results=8)
+    sources = result["sources"]
+    assert len(sources) == result["context"]["passages"] < result["context"]["chunks"]
+    assert [source["documento"] for source in sources] == list(range(1, len(sources) + 1))
+    assert all(source["metadata"]["filename"] == "guia.txt" and source["ids"] for source in sources)
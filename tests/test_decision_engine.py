@@ -0,0 +1,163 @@
+import itertools
+from typing import Any, Dict, Optional
+
+import pytest
+
+from decision_engine import CompiledDecisionTree, DecisionTreeError
+from decision_tree_vsr import decision_tree_vsr
+
+TREE = CompiledDecisionTree(decision_tree_vsr)
+
+
+# -------- Implementación original de /decision (búsqueda recursiva) --------
+
+def find_node_by_id(node: Dict[str, Any], node_id: str) -> Optional[Dict[str, Any]]:
+    if node.get("id") == node_id:
+        return node
+    for value in node.values():
+        if isinstance(value, dict):
+            found = find_node_by_id(value, node_id)
+            if found:
+                return found
+        elif isinstance(value, list):
+            for item in value:
+                found = find_node_by_id(item, node_id)
+                if found:
+                    return found
+    return None
+
+
+def original_step(node_id, respuesta=None, edad_meses=None, peso_kg=None) -> Dict[str, Any]:
+    current_node = find_node_by_id(decision_tree_vsr, node_id)
+    if not current_node:
+        return {"error": "Nodo no encontrado", "next": "inicio"}
+
+    if "resultado" in current_node:
+        return {"type": "resultado", "resultado": current_node["resultado"], "detalle": current_node["detalle"]}
+
+    if current_node.get("inputType") == "number":
+        valor = edad_meses if "edad" in current_node["pregunta"].lower() else peso_kg
+        if valor is None:
+            return {"error": "Se esperaba un valor numérico."}
+        for rango in current_node.get("rangos", []):
+            min_v = rango.get("min", 0)
+            max_v = rango.get("max", float("inf"))
+            if (min_v is None or valor >= min_v) and (max_v is None or valor < max_v):
+                if "resultado" in rango:
+                    return {"type": "resultado", "resultado": rango["resultado"], "detalle": rango["detalle"]}
+                siguiente = find_node_by_id(decision_tree_vsr, rango["next_id"])
+                return {"type": "pregunta", "next_id": siguiente.get("id", ""), "pregunta": siguiente.get("pregunta")}
+        return {"error": "Valor fuera de rango o no reconocido"}
+
+    if respuesta:
+        respuesta = respuesta.lower().strip()
+        if respuesta in ["si", "sí"] and "si" in current_node:
+            siguiente = current_node["si"]
+        elif respuesta == "no" and "no" in current_node:
+            siguiente = current_node["no"]
+        else:
+            return {"error": "Respuesta no válida para este nodo"}
+        if "resultado" in siguiente:
+            return {"type": "resultado", "resultado": siguiente["resultado"], "detalle": siguiente["detalle"]}
+        return {"type": "pregunta", "next_id": siguiente.get("id", ""), "pregunta": siguiente.get("pregunta")}
+
+    if "opciones" in current_node:
+        return {
+            "type": "pregunta",
+            "next_id": current_node.get("id", ""),
+            "pregunta": current_node["pregunta"],
+            "opciones": [opt["texto"] for opt in current_node["opciones"]],
+        }
+
+    return {"type": "pregunta", "next_id": current_node.get("id", ""), "pregunta": current_node.get("pregunta")}
+
+
+# -------- Árbol compilado (paso a paso) --------
+
+NODE_IDS = list(TREE.nodes) + ["desconocido"]
+ANSWERS = [None, "", "si", "Sí", " NO ", "no", "quizá"]
+AGES = [None, 0, 0.05, 0.1, 3, 7.99, 8, 24, -1]
+WEIGHTS = [None, 0, 2.5, 5, 4.99, 20, -3]
+
+
+@pytest.mark.parametrize("node_id", NODE_IDS)
+def test_step_igual_que_la_busqueda_recursiva(node_id):
+    for respuesta, edad, peso in itertools.product(ANSWERS, AGES, WEIGHTS):
+        expected = original_step(node_id, respuesta, edad, peso)
+        assert TREE.step(node_id, respuesta, edad, peso) == expected, (node_id, respuesta, edad, peso)
+
+
+def test_compilacion_detecta_arboles_invalidos():
+    tree = {
+        "id": "inicio",
+        "pregunta": "¿Temporada?",
+        "si": {"next_id": "falta"},
+        "no": {"id": "bucle", "pregunta": "¿Otra?", "si": {"next_id": "inicio"}, "no": {"resultado": "X"}},
+    }
+    with pytest.raises(DecisionTreeError) as error:
+        CompiledDecisionTree(tree)
+    problems = "\n".join(error.value.problems)
+    assert "next_id colgante en 'inicio': 'falta'" in problems
+    assert "resultado sin detalle en 'bucle'" in problems
+
+
+# -------- Evaluación por cohortes --------
+
+def walk_original(patient: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Recorre el árbol con la implementación original, un paso por petición
+    """
+    node_id, path = "inicio", []
+    for _ in range(len(NODE_IDS) + 1):
+        path.append(node_id)
+        answer = patient["respuestas"].get(node_id)
+        if isinstance(answer, bool):
+            answer = "si" if answer else "no"
+        step = original_step(node_id, answer, patient["edad_meses"], patient["peso_kg"])
+        if "error" in step:
+            return {"resultado": None, "detalle": None, "path": path}
+        if step["type"] == "resultado":
+            return {"resultado": step["resultado"], "detalle": step["detalle"], "path": path}
+        if step["next_id"] == node_id:
+            # Sin respuesta: la pregunta se repite
+            return {"resultado": None, "detalle": None, "path": path}
+        node_id = step["next_id"]
+    raise AssertionError("el recorrido no termina")
+
+
+def _cohort():
+    yes_no_ids = [node_id for node_id, node in TREE.nodes.items() if node["kind"] == "pregunta"]
+    patients = []
+    for i, (edad, peso) in enumerate(itertools.product(AGES, WEIGHTS)):
+        respuestas = {}
+        for j, node_id in enumerate(yes_no_ids):
+            choice = (i * 7 + j * 3) % 5
+            if choice < 4:
+                respuestas[node_id] = ["si", "no", True, "Sí"][choice]
+        patients.append({"edad_meses": edad, "peso_kg": peso, "respuestas": respuestas})
+    return patients
+
+
+def test_cohorte_igual_que_paso_a_paso():
+    patients = _cohort()
+    results = TREE.evaluate_records(patients)
+
+    assert len(results) == len(patients)
+    for patient, result in zip(patients, results):
+        expected = walk_original(patient)
+        assert (result["resultado"], result["detalle"]) == (expected["resultado"], expected["detalle"]), patient
+        assert result["path"] == expected["path"], patient
+        assert (result["error"] is None) == (expected["resultado"] is not None), patient
+
+
+def test_cohorte_informa_el_nodo_del_error():
+    results = TREE.evaluate_records([
+        {"edad_meses": None, "peso_kg": None, "respuestas": {"inicio": "si"}},
+        {"edad_meses": 3, "peso_kg": None, "respuestas": {"inicio": "si"}},
+        {"edad_meses": None, "peso_kg": None, "respuestas": {"inicio": "no"}},
+        {"edad_meses": None, "peso_kg": None, "respuestas": {}},
+    ])
+    assert results[0]["error"] == "Falta el valor numérico del nodo 'eligibilidad'"
+    assert results[1]["error"].startswith("Falta la respuesta Sí/No")
+    assert results[2]["resultado"] == "NO RECOMENDADO" and results[2]["error"] is None
+    assert results[3]["error"] == "Falta la respuesta Sí/No del nodo 'inicio'"
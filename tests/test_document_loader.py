@@ -0,0 +1,134 @@
+import tracemalloc
+
+import pypdf
+
+from document_loader import iter_chunks, iter_pages, load_chunks, make_text_splitter
+
+
+def _write_pdf(path, pages):
+    """
+    PDF mínimo con una línea de texto (Helvetica) por página
+    """
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        None,
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    kids = []
+    for text in pages:
+        content = f"BT /F1 10 Tf 20 700 Td ({text}) Tj ET"
+        objects.append(f"<< /Length {len(content)} >>\nstream\n{content}\nendstream")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>"
+        )
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+
+    data = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(data))
+        data += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(data)
+    data += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    data += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode()
+    data += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    path.write_bytes(data)
+
+
+def _page_text(number: int) -> str:
+    return " ".join(f"pagina{number} palabra{i}" for i in range(40))
+
+
+def test_pdf_se_lee_pagina_a_pagina(tmp_path):
+    path = tmp_path / "doc.pdf"
+    _write_pdf(path, [_page_text(n) for n in range(3)])
+
+    pages = list(iter_pages(str(path)))
+    assert len(pages) == 3
+    assert all(f"pagina{n} palabra0" in page for n, page in enumerate(pages))
+
+
+def test_chunks_por_paginas_como_el_documento_entero():
+    splitter = make_text_splitter(chunk_size=200, chunk_overlap=40)
+    pages = [_page_text(n) for n in range(5)]
+
+    assert list(iter_chunks(pages, splitter)) == splitter.split_text("\n".join(pages))
+
+
+def test_chunks_cruzan_los_limites_de_pagina():
+    splitter = make_text_splitter(chunk_size=200, chunk_overlap=40)
+    pages = [f"pagina{n} " + "texto corto " * 5 for n in range(12)]
+
+    streamed = list(iter_chunks(pages, splitter))
+    assert all(len(chunk) <= 200 for chunk in streamed)
+    # Las páginas cortas se agrupan: el resto de una página se une a la siguiente
+    assert len(streamed) < len(pages)
+    assert any("pagina0" in chunk and "pagina1" in chunk for chunk in streamed)
+    assert all(any(f"pagina{n} " in chunk for chunk in streamed) for n in range(12))
+
+
+def test_txt_en_bloques_no_pierde_texto(tmp_path):
+    path = tmp_path / "doc.txt"
+    lines = [f"linea {i} " + "x" * 50 for i in range(200)]
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+    blocks = list(iter_pages(str(path), block_chars=1000))
+    assert len(blocks) > 5
+    assert "\n".join(blocks).rstrip("\n") == "\n".join(lines)
+
+
+def _peak_bytes(pages) -> int:
+    tracemalloc.start()
+    try:
+        for _ in pages:
+            pass
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def _pages_without_release(path):
+    with open(path, "rb") as f:
+        for page in pypdf.PdfReader(f).pages:
+            yield page.extract_text()
+
+
+def test_pdf_libera_los_objetos_de_cada_pagina(tmp_path, monkeypatch):
+    path = tmp_path / "doc.pdf"
+    _write_pdf(path, [_page_text(n) for n in range(400)])
+
+    readers = []
+
+    class RecordingReader(pypdf.PdfReader):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            readers.append(self)
+
+    monkeypatch.setattr(pypdf, "PdfReader", RecordingReader)
+    resolved = [len(readers[0].resolved_objects) for _ in iter_pages(str(path))]
+    # La primera página resuelve el árbol de páginas; después solo quedan
+    # los objetos de la página en curso, no los de todo el documento
+    assert len(resolved) == 400
+    assert max(resolved[1:]) < 20
+
+
+def test_pico_de_memoria_menor_que_sin_liberar(tmp_path):
+    path = tmp_path / "doc.pdf"
+    _write_pdf(path, [_page_text(n) for n in range(400)])
+
+    # La tabla de páginas de pypdf crece con el documento; lo que se libera
+    # por página son los objetos ya resueltos (contenido, fuentes, recursos)
+    streamed = _peak_bytes(iter_pages(str(path)))
+    unreleased = _peak_bytes(_pages_without_release(path))
+    assert streamed < 0.85 * unreleased
+
+
+def test_load_chunks_de_un_pdf(tmp_path):
+    path = tmp_path / "doc.pdf"
+    _write_pdf(path, [_page_text(n) for n in range(4)])
+
+    chunks = load_chunks(str(path), make_text_splitter(chunk_size=300, chunk_overlap=50))
+    assert chunks
+    assert all(len(chunk) <= 300 for chunk in chunks)
@@ -0,0 +1,34 @@
+def _write_document(path, paragraphs: int):
+    path.write_text(
+        "\n\n".join(f"Párrafo {i} sobre la vacuna contra el VSR en lactantes. " * 8 for i in range(paragraphs)),
+        encoding="utf-8",
+    )
+
+
+def _assert_forgotten(store, path):
+    assert store.collection.count() == 0
+    assert store.manifest.get_file(path.name) is None
+    assert store.manifest.get_chunk_ids(path.name) == []
+    assert store.lexical_search(["vacuna"], 5) == [[]]
+
+
+def test_reingesta_vacia_en_streaming_elimina_los_chunks(store, tmp_path):
+    path = tmp_path / "guia.txt"
+    _write_document(path, 10)
+    assert store.add_document(str(path))
+    assert store.collection.count() > 0
+    assert store.lexical_search(["vacuna"], 5)[0]
+
+    path.write_text("", encoding="utf-8")
+    assert store.add_document(str(path)) is False
+    _assert_forgotten(store, path)
+
+
+def test_reingesta_vacia_por_lotes_elimina_los_chunks(store, tmp_path):
+    path = tmp_path / "guia.txt"
+    _write_document(path, 10)
+    assert store.add_documents([str(path)], workers=1)["results"][str(path)]
+
+    path.write_text("", encoding="utf-8")
+    assert store.add_documents([str(path)], workers=1)["results"][str(path)] is False
+    _assert_forgotten(store, path)
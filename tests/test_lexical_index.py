@@ -0,0 +1,77 @@
+import math
+
+from lexical_index import BM25Index, reciprocal_rank_fusion, tokenize
+
+
+def test_tokenize_normaliza_y_conserva_cifras():
+    assert tokenize("Nirsevimab 50 mg en Lactantes de 0,5 años") == ["nirsevimab", "50", "mg", "lactantes", "0,5", "anos"]
+
+
+def test_rrf_suma_los_rangos_de_cada_lista():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "a", "d"]], k=60)
+
+    scores = dict(fused)
+    assert math.isclose(scores["a"], 1 / 61 + 1 / 62)
+    assert math.isclose(scores["c"], 1 / 63 + 1 / 61)
+    assert math.isclose(scores["b"], 1 / 62)
+    assert math.isclose(scores["d"], 1 / 63)
+    # Aparecer en las dos listas pesa más que ser primero en una sola
+    assert [doc_id for doc_id, _ in fused] == ["a", "c", "b", "d"]
+
+
+def test_rrf_con_una_lista_vacia_conserva_el_orden():
+    assert [doc_id for doc_id, _ in reciprocal_rank_fusion([["x", "y", "z"], []])] == ["x", "y", "z"]
+
+
+def test_bm25_ordena_por_relevancia():
+    index = BM25Index()
+    index.add(
+        ["dosis", "madre", "ruido"],
+        [
+            "Dosis de nirsevimab: 50 mg para lactantes de menos de 5 kg y 100 mg desde 5 kg.",
+            "La vacuna materna se aplica entre las semanas 32 y 36 de gestación.",
+            "Reunión del comité de presupuesto.",
+        ],
+    )
+
+    assert [doc_id for doc_id, _ in index.search("dosis nirsevimab lactantes")] == ["dosis"]
+    assert index.search("vacuna materna gestación")[0][0] == "madre"
+    assert index.search("palabra inexistente") == []
+
+
+def test_bm25_reindexa_y_elimina():
+    index = BM25Index()
+    index.add(["a", "b"], ["vacuna materna", "vacuna infantil"])
+    index.add(["a"], ["refuerzo anual"])
+    index.remove(["b", "desconocido"])
+
+    assert len(index) == 1
+    assert index.search("vacuna") == []
+    assert index.search("refuerzo")[0][0] == "a"
+    assert index.total_length == 2
+
+
+def test_busqueda_hibrida_fusiona_resultados_lexicos(store, tmp_path, monkeypatch):
+    path = tmp_path / "guia.txt"
+    path.write_text(
+        "\n\n".join(f"Sección {i}: pauta de vacunación número {i} contra el VSR. " * 6 for i in range(300)),
+        encoding="utf-8",
+    )
+    assert store.add_document(str(path))
+    query, n_results = "pauta de vacunación", 5
+    candidates = max(n_results * 3, 20)
+    vector_ids = store.collection.query(
+        query_embeddings=store.get_embeddings([query]), n_results=candidates, include=["distances"]
+    )["ids"][0]
+    lexical_only = next(doc_id for doc_id in store.collection.get(include=[])["ids"] if doc_id not in vector_ids)
+
+    # Primer resultado BM25 fuera de los candidatos vectoriales: entra por la
+    # fusión (empatado con el primero vectorial) y con su similitud calculada
+    monkeypatch.setattr(store, "lexical_search", lambda queries, n: [[lexical_only] for _ in queries])
+    results = store.search(query, n_results=n_results)
+
+    ids = [result["id"] for result in results]
+    assert ids[:2] == [vector_ids[0], lexical_only]
+    fused = results[1]
+    assert fused["document"] and -1.0 <= fused["similarity"] <= 1.0
+    assert [result["score"] for result in results] == sorted((result["score"] for result in results), reverse=True)
@@ -0,0 +1,52 @@
+import json
+import logging
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+from metrics import TRACE_ID, span
+
+os.environ.setdefault("WARMUP", "0")
+
+
+def _spans(caplog):
+    return [json.loads(record.getMessage()) for record in caplog.records if record.name == "metrics.spans"]
+
+
+def test_span_registra_json_con_trace_id(caplog):
+    caplog.set_level(logging.INFO, logger="metrics.spans")
+    token = TRACE_ID.set("abc123")
+    try:
+        with span("retrieval", items=3):
+            pass
+        with pytest.raises(RuntimeError):
+            with span("generation"):
+                raise RuntimeError("fallo")
+    finally:
+        TRACE_ID.reset(token)
+
+    retrieval, generation = _spans(caplog)
+    assert retrieval["trace_id"] == "abc123"
+    assert retrieval["span"] == "retrieval"
+    assert retrieval["items"] == 3
+    assert retrieval["status"] == "ok"
+    assert isinstance(retrieval["duration_ms"], float)
+    assert generation["status"] == "error"
+
+
+def test_cada_peticion_registra_su_span(caplog):
+    from server import app
+
+    caplog.set_level(logging.INFO, logger="metrics.spans")
+    with TestClient(app) as client:
+        response = client.post("/strategy", json={"seasonVSR": True}, headers={"X-Trace-Id": "traza-1"})
+    assert response.status_code == 200
+    assert response.headers["X-Trace-Id"] == "traza-1"
+
+    http = [record for record in _spans(caplog) if record["span"] == "http"]
+    assert len(http) == 1
+    assert http[0]["trace_id"] == "traza-1"
+    assert http[0]["path"] == "/strategy"
+    assert http[0]["http_status"] == 200
+    assert http[0]["duration_ms"] >= 0
@@ -0,0 +1,87 @@
+import threading
+import time
+
+from session_manager import SessionManager
+
+
+def _slow_summarizer(summary, messages):
+    # Da tiempo a que otra petición de la misma sesión compacte a la vez
+    time.sleep(0.05)
+    questions = [message["content"] for message in messages if message["role"] == "user"]
+    return "\n".join(filter(None, [summary, *questions]))
+
+
+def test_compactacion_por_debajo_del_presupuesto():
+    sessions = SessionManager(token_budget=100, keep_recent=2)
+    for i in range(20):
+        sessions.append("s", f"pregunta {i} " + "x" * 40, "respuesta " + "y" * 40)
+
+    history = sessions.history("s")
+    assert history[0]["role"] == "system"
+    assert sessions.compactions > 0
+    assert history[-1]["content"].startswith("respuesta")
+
+
+def test_appends_concurrentes_no_pierden_turnos():
+    sessions = SessionManager(
+        token_budget=60, keep_recent=2, summary_token_budget=10000, summarizer=_slow_summarizer
+    )
+    threads = [
+        threading.Thread(target=sessions.append, args=("s", f"pregunta-{i}", "respuesta " + "y" * 60))
+        for i in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    text = "\n".join(message["content"] for message in sessions.history("s"))
+    assert all(f"pregunta-{i}" in text for i in range(8))
+
+
+def test_sesiones_nuevas_concurrentes_con_history():
+    sessions = SessionManager(token_budget=60, keep_recent=2, ttl_seconds=60)
+    errors = []
+
+    def writer(worker):
+        try:
+            for i in range(300):
+                sessions.append(f"s{worker}-{i}", "pregunta", "respuesta")
+        except Exception as e:
+            errors.append(e)
+
+    def reader():
+        try:
+            for i in range(2000):
+                sessions.history(f"s0-{i % 300}")
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(4)]
+    threads += [threading.Thread(target=reader) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert len(sessions) == sessions.max_sessions
+
+
+def test_compactacion_diferida():
+    calls = []
+
+    def summarizer(summary, messages):
+        calls.append(len(messages))
+        return "resumen"
+
+    sessions = SessionManager(token_budget=60, keep_recent=2, summarizer=summarizer)
+    pending = [sessions.append("s", f"pregunta {i}", "respuesta " + "y" * 60, compact=False) for i in range(4)]
+
+    # Sin compact=True el resumen no se calcula al registrar el turno
+    assert pending[-1] is True
+    assert calls == [] and sessions.compactions == 0
+    sessions.compact("s")
+    assert calls and sessions.compactions == 1
+    assert sessions.history("s")[0]["content"].endswith("resumen")
+    assert sessions.append("t", "hola", "adiós", compact=False) is False
@@ -0,0 +1,78 @@
+import os
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from strategy_engine import StrategyEngine, to_column
+
+os.environ.setdefault("WARMUP", "0")
+
+
+def test_to_column_convierte_numeros_textos_y_nulos():
+    column = to_column([1, "2.5", "sí", "no", None, ""])
+    assert column[:4].tolist() == [1.0, 2.5, 1.0, 0.0]
+    assert np.isnan(column[4]) and np.isnan(column[5])
+
+
+@pytest.mark.parametrize("values", [[{"a": 1}], [1, [2]], ["abc"]])
+def test_to_column_rechaza_valores_no_numericos(values):
+    with pytest.raises(ValueError):
+        to_column(values)
+
+
+def test_evaluate_columns_agrupa_por_reglas():
+    result = StrategyEngine().evaluate_columns({"seasonVSR": [True, False], "meanAge": [3, 10]})
+    assert result["total"] == 2
+    assert result["resultados"][0]["factores"] == ["temporada_vsr", "lactantes_jovenes"]
+    assert result["resumen"]["sin_riesgos"] == 1
+
+
+def test_batch_con_celdas_no_escalares_devuelve_422():
+    from server import app
+
+    with TestClient(app) as client:
+        response = client.post("/strategy/batch", json={"meanAge": [{"a": 1}]})
+        assert response.status_code == 422
+        assert "Tabla inválida" in response.json()["detail"]
+
+        response = client.post("/strategy/batch", json={"meanAge": [[1, 2]]})
+        assert response.status_code == 422
+
+
+def original_strategy(data):
+    """
+    Implementación original de /strategy (cadena de ifs)
+    """
+    recomendaciones = []
+    if data["seasonVSR"]:
+        recomendaciones.append("Temporada VSR activa: priorizar vacunación materna y refuerzo de medidas preventivas.")
+    if data["meanAge"] and data["meanAge"] < 6:
+        recomendaciones.append("Alta proporción de lactantes jóvenes: reforzar seguimiento pediátrico.")
+    if data["quantityVaccinatedMothers"] and data["quantityVaccinatedMothers"] < 500:
+        recomendaciones.append("Baja cobertura en madres vacunadas: implementar campañas focalizadas.")
+    if data["childBornPostVSR_NB"] and data["childBornPostVSR_NB"] > 100:
+        recomendaciones.append("Aumento de nacimientos post-VSR: ampliar dosis preventivas a recién nacidos de riesgo.")
+    if not recomendaciones:
+        recomendaciones.append("No se identificaron riesgos significativos. Mantener vigilancia epidemiológica.")
+    return {"recomendacion": "\n".join(recomendaciones), "total_factores": len(recomendaciones)}
+
+
+def test_estrategia_igual_que_la_cadena_de_ifs():
+    engine = StrategyEngine()
+    rows = [
+        {"seasonVSR": season, "meanAge": age, "quantityVaccinatedMothers": mothers, "childBornPostVSR_NB": born}
+        for season in (False, True)
+        for age in (None, 0, 3, 5.99, 6, 12)
+        for mothers in (None, 0, 499, 500)
+        for born in (None, 0, 100, 101)
+    ]
+
+    for row in rows:
+        assert engine.evaluate(row) == original_strategy(row), row
+
+    columns = {name: [row[name] for row in rows] for name in rows[0]}
+    batch = engine.evaluate_columns(columns)["resultados"]
+    assert [
+        {"recomendacion": result["recomendacion"], "total_factores": result["total_factores"]} for result in batch
+    ] == [original_strategy(row) for row in rows]
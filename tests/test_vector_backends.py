@@ -0,0 +1,142 @@
+import numpy as np
+import pytest
+
+from vector_backends import QuantizedIndex
+
+
+def _vectors(n: int, dimension: int = 16, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).normal(size=(n, dimension)).astype(np.float32)
+
+
+def _nearest(index: QuantizedIndex, vector: np.ndarray) -> str:
+    return index.query(query_embeddings=[vector], n_results=1)["ids"][0][0]
+
+
+def test_ida_y_vuelta(tmp_path):
+    index = QuantizedIndex(str(tmp_path / "db"))
+    vectors = _vectors(200)
+    ids = [f"id{i}" for i in range(200)]
+    index.add(
+        ids=ids, embeddings=vectors, documents=[f"texto {i}" for i in range(200)],
+        metadatas=[{"source": "par" if i % 2 == 0 else "impar", "chunk_index": i} for i in range(200)],
+    )
+
+    assert index.count() == 200
+    result = index.query(query_embeddings=vectors[[3, 150]], n_results=5)
+    assert [ids_[0] for ids_ in result["ids"]] == ["id3", "id150"]
+    assert result["distances"][0][0] < 1e-5
+    assert result["documents"][0][0] == "texto 3"
+    assert result["metadatas"][1][0] == {"source": "par", "chunk_index": 150}
+
+    filtered = index.query(query_embeddings=vectors[[3]], n_results=10, where={"source": "par"})
+    assert len(filtered["ids"][0]) == 10 and "id3" not in filtered["ids"][0]
+
+    got = index.get(ids=["id7", "id8"], include=["documents", "metadatas", "embeddings"])
+    assert got["ids"] == ["id7", "id8"]
+    assert np.allclose(got["embeddings"][0], vectors[7] / np.linalg.norm(vectors[7]), atol=1e-6)
+    assert index.get(where={"source": "impar"}, include=[])["ids"][:2] == ["id1", "id3"]
+
+
+def test_upsert_reemplaza_sin_duplicar(tmp_path):
+    index = QuantizedIndex(str(tmp_path / "db"), compact_ratio=0.9)
+    vectors = _vectors(20)
+    index.add(ids=["a", "b"], embeddings=vectors[:2], documents=["a1", "b1"])
+    index.upsert(ids=["a"], embeddings=vectors[2:3], documents=["a2"])
+
+    assert index.count() == 2
+    assert index.get(ids=["a"])["documents"] == ["a2"]
+    assert _nearest(index, vectors[2]) == "a"
+    stored = index.get(ids=["a"], include=["embeddings"])["embeddings"][0]
+    assert np.allclose(stored, vectors[2] / np.linalg.norm(vectors[2]), atol=1e-6)
+
+    index.update(ids=["b"], metadatas=[{"source": "nueva"}])
+    assert index.get(ids=["b"])["metadatas"] == [{"source": "nueva"}]
+    assert index.get(ids=["b"])["documents"] == ["b1"]
+
+
+def test_compactacion_y_reapertura(tmp_path):
+    index = QuantizedIndex(str(tmp_path / "db"), compact_ratio=0.5)
+    vectors = _vectors(100)
+    ids = [f"id{i}" for i in range(100)]
+    index.add(ids=ids, embeddings=vectors, documents=ids)
+
+    # Borrar 40: sin compactar todavía; upserts repetidos cuentan como filas muertas
+    index.delete(ids=ids[:40])
+    assert len(index._row_ids) == 100
+    for _ in range(3):
+        index.upsert(ids=ids[40:60], embeddings=vectors[40:60], documents=ids[40:60])
+    assert len(index._row_ids) < 100 + 3 * 20
+    assert (tmp_path / "db" / "vectors.f32").stat().st_size == len(index._row_ids) * 16 * 4
+
+    index.delete(where=None, ids=ids[90:])
+    assert index.count() == 50
+    assert _nearest(index, vectors[45]) == "id45"
+
+    index.compact()
+    assert len(index._row_ids) == 50
+    index.close()
+
+    reopened = QuantizedIndex(str(tmp_path / "db"))
+    assert reopened.count() == 50
+    assert sorted(reopened.get(include=[])["ids"]) == sorted(ids[40:90])
+    for i in (40, 59, 89):
+        assert _nearest(reopened, vectors[i]) == f"id{i}"
+    assert reopened.get(ids=["id89"])["documents"] == ["id89"]
+
+
+@pytest.mark.parametrize("ids, metadatas", [
+    (["c", "c"], [{"source": "c"}, {"source": "c"}]),
+    (["c", ""], None),
+    (["c", "e"], [{"source": "c"}, {"fecha": object()}]),
+])
+def test_add_fallido_no_deja_filas_huerfanas(tmp_path, ids, metadatas):
+    index = QuantizedIndex(str(tmp_path / "db"))
+    vectors = _vectors(5)
+    index.add(ids=["a", "b"], embeddings=vectors[:2], documents=["a", "b"])
+
+    with pytest.raises(ValueError):
+        index.add(ids=ids, embeddings=vectors[2:4], metadatas=metadatas)
+    index.add(ids=["d"], embeddings=vectors[4:5], documents=["d"])
+
+    assert index.count() == 3
+    assert _nearest(index, vectors[4]) == "d"
+    assert _nearest(index, vectors[0]) == "a"
+
+    reopened = QuantizedIndex(str(tmp_path / "db"))
+    assert reopened.count() == 3
+    assert _nearest(reopened, vectors[4]) == "d"
+    assert reopened.get(ids=["d"])["documents"] == ["d"]
+
+
+def test_add_que_falla_en_sqlite_recorta_los_archivos(tmp_path, monkeypatch):
+    index = QuantizedIndex(str(tmp_path / "db"))
+    vectors = _vectors(3)
+    index.add(ids=["a"], embeddings=vectors[:1])
+
+    # Falla tras escribir los vectores (p. ej. disco lleno al confirmar en SQLite)
+    def failing_insert(*args, **kwargs):
+        raise RuntimeError("fallo de escritura")
+
+    monkeypatch.setattr(index, "_conn", _FailingConnection(index._conn, failing_insert))
+    with pytest.raises(RuntimeError):
+        index.add(ids=["b"], embeddings=vectors[1:2])
+    monkeypatch.undo()
+
+    assert (tmp_path / "db" / "vectors.f32").stat().st_size == 16 * 4
+    index.add(ids=["c"], embeddings=vectors[2:3])
+    assert _nearest(index, vectors[2]) == "c"
+
+
+class _FailingConnection:
+    def __init__(self, connection, executemany):
+        self._connection = connection
+        self.executemany = executemany
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+    def __enter__(self):
+        return self._connection.__enter__()
+
+    def __exit__(self, *exc):
+        return self._connection.__exit__(*exc)
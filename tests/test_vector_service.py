@@ -0,0 +1,39 @@
+import numpy as np
+from fastapi.testclient import TestClient
+
+from vector_backends import open_vector_backend, encode_vectors
+from vector_service import create_app
+
+
+def _add(client, ids, documents, source):
+    vectors = np.random.default_rng(len(ids)).normal(size=(len(ids), 8)).astype(np.float32)
+    return client.post("/add", json={
+        "ids": ids,
+        "embeddings": encode_vectors(vectors),
+        "documents": documents,
+        "metadatas": [{"source": source} for _ in ids],
+    }).json()
+
+
+def _lexical(client, query):
+    return [doc_id for doc_id, _ in client.post("/lexical", json={"queries": [query]}).json()["results"][0]]
+
+
+def test_indice_lexico_compartido_sigue_las_escrituras(tmp_path):
+    collection = open_vector_backend("quantized", str(tmp_path / "db"), "documentos")
+    client = TestClient(create_app(collection, "quantized"))
+
+    # Construido en la primera búsqueda y actualizado por cada escritura
+    assert _lexical(client, "vacuna") == []
+    assert _add(client, ["a", "b"], ["vacuna materna", "dosis de nirsevimab"], "uno.pdf")["version"] == 1
+    _add(client, ["c"], ["vacuna en lactantes"], "dos.pdf")
+    assert sorted(_lexical(client, "vacuna")) == ["a", "c"]
+
+    client.post("/update", json={"ids": ["b"], "documents": ["vacuna de refuerzo"]})
+    assert sorted(_lexical(client, "vacuna")) == ["a", "b", "c"]
+    assert _lexical(client, "nirsevimab") == []
+
+    client.post("/delete", json={"where": {"source": "uno.pdf"}})
+    client.post("/delete", json={"ids": ["c"]})
+    assert _lexical(client, "vacuna") == []
+    assert client.get("/version").json()["version"] == 5
@@ -0,0 +1,594 @@
+import base64
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Sequence
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+VECTOR_BACKENDS = ("chroma", "quantized", "remote")
+
+
+def open_chroma_collection(persist_directory: str, collection_name: str):
+    """
+    Abre (o crea) la colección de ChromaDB con distancia coseno
+    """
+    import chromadb
+    from chromadb.config import Settings
+
+    client = chromadb.PersistentClient(
+        path=persist_directory,
+        settings=Settings(
+            anonymized_telemetry=False,
+            allow_reset=True
+        )
+    )
+    return client.get_or_create_collection(
+        name=collection_name,
+        metadata={"hnsw:space": "cosine"}
+    )
+
+
+def open_vector_backend(kind: str, persist_directory: str, collection_name: str, url: Optional[str] = None):
+    """
+    Devuelve un objeto con la API de colección de ChromaDB que usa
+    LocalVectorStore (add, get, update, delete, query, count)
+    """
+    if kind == "chroma":
+        return open_chroma_collection(persist_directory, collection_name)
+    if kind == "quantized":
+        return QuantizedIndex(str(Path(persist_directory) / collection_name))
+    if kind == "remote":
+        if not url:
+            raise ValueError("El backend remoto necesita la URL del servicio vectorial (VECTOR_STORE_URL)")
+        return RemoteCollection(url)
+    raise ValueError(f"Backend vectorial desconocido: {kind} (opciones: {', '.join(VECTOR_BACKENDS)})")
+
+
+def quantize(vectors: np.ndarray):
+    """
+    Cuantiza vectores a int8 con una escala por fila (simétrica)
+    """
+    max_abs = np.abs(vectors).max(axis=1)
+    scales = np.where(max_abs > 0, max_abs / 127.0, 1.0).astype(np.float32)
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float32)
+
+
+class QuantizedIndex:
+    # Filas por bloque en el recorrido por fuerza bruta (acota la memoria temporal)
+    SCAN_BLOCK = 16384
+
+    def __init__(self, directory: str, rescore_factor: int = 4, compact_ratio: float = 0.5):
+        """
+        Índice vectorial en proceso con embeddings cuantizados a int8.
+
+        Los códigos int8 (y su escala por fila) se recorren por fuerza bruta
+        desde un archivo mapeado en memoria; los `rescore_factor * n_results`
+        mejores candidatos se reordenan con los vectores float32 completos,
+        también mapeados, de modo que solo se leen las filas candidatas.
+        Ids, textos y metadatos viven en SQLite. Las eliminaciones marcan la
+        fila como muerta y el índice se compacta al superar `compact_ratio`.
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.rescore_factor = rescore_factor
+        self.compact_ratio = compact_ratio
+        self._lock = threading.RLock()
+
+        self._conn = sqlite3.connect(str(self.directory / "metadata.sqlite3"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS info (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS items (
+                row INTEGER PRIMARY KEY,
+                id TEXT NOT NULL UNIQUE,
+                document TEXT,
+                metadata TEXT
+            );
+            """
+        )
+        self._conn.commit()
+
+        dimension = self._conn.execute("SELECT value FROM info WHERE key = 'dimension'").fetchone()
+        self.dimension: Optional[int] = int(dimension[0]) if dimension else None
+
+        # Estado en memoria: fila -> id (None si está muerta) e id -> fila
+        self._row_ids: List[Optional[str]] = []
+        self._rows: Dict[str, int] = {}
+        self._load()
+
+    # -------- Archivos --------
+
+    def _path(self, name: str) -> Path:
+        return self.directory / name
+
+    # Bytes por fila de cada archivo
+    def _row_bytes(self) -> Dict[str, int]:
+        return {"codes.i8": self.dimension, "scales.f32": 4, "vectors.f32": 4 * self.dimension}
+
+    def _stored_rows(self) -> int:
+        """
+        Filas completas comunes a los tres archivos. Si una escritura se
+        interrumpió a medias, los archivos se recortan a la más corta.
+        """
+        if self.dimension is None:
+            return 0
+        sizes = {
+            name: self._path(name).stat().st_size if self._path(name).exists() else 0
+            for name in self._row_bytes()
+        }
+        rows = min(sizes[name] // row_bytes for name, row_bytes in self._row_bytes().items())
+        for name, row_bytes in self._row_bytes().items():
+            if sizes[name] != rows * row_bytes:
+                logger.warning(
+                    f"Índice cuantizado: {name} con {sizes[name]} bytes, se recorta a {rows} filas"
+                )
+        self._truncate(rows)
+        return rows
+
+    def _truncate(self, rows: int):
+        """
+        Recorta los tres archivos a `rows` filas (deshace un append fallido)
+        """
+        for name, row_bytes in self._row_bytes().items():
+            path = self._path(name)
+            if path.exists() and path.stat().st_size != rows * row_bytes:
+                with open(path, "ab") as f:
+                    f.truncate(rows * row_bytes)
+
+    def _map(self, rows: int):
+        """
+        Mapea los archivos en memoria (solo lectura) para `rows` filas
+        """
+        if rows == 0:
+            dimension = self.dimension or 0
+            self._codes = np.zeros((0, dimension), dtype=np.int8)
+            self._scales = np.zeros(0, dtype=np.float32)
+            self._vectors = np.zeros((0, dimension), dtype=np.float32)
+            return
+        self._codes = np.memmap(self._path("codes.i8"), dtype=np.int8, mode="r", shape=(rows, self.dimension))
+        self._scales = np.memmap(self._path("scales.f32"), dtype=np.float32, mode="r", shape=(rows,))
+        self._vectors = np.memmap(self._path("vectors.f32"), dtype=np.float32, mode="r", shape=(rows, self.dimension))
+
+    def _load(self):
+        rows = self._stored_rows()
+        # Registros sin vector en disco (archivos recortados): se descartan
+        with self._conn:
+            self._conn.execute("DELETE FROM items WHERE row >= ?", (rows,))
+        self._row_ids = [None] * rows
+        for row, item_id in self._conn.execute("SELECT row, id FROM items"):
+            # Filas escritas en disco sin confirmar en SQLite quedan muertas
+            self._row_ids[row] = item_id
+            self._rows[item_id] = row
+        self._alive = np.array([item_id is not None for item_id in self._row_ids], dtype=bool)
+        self._map(rows)
+
+    def _append_vectors(self, vectors: np.ndarray):
+        codes, scales = quantize(vectors)
+        with open(self._path("codes.i8"), "ab") as f:
+            f.write(codes.tobytes())
+        with open(self._path("scales.f32"), "ab") as f:
+            f.write(scales.tobytes())
+        with open(self._path("vectors.f32"), "ab") as f:
+            f.write(vectors.tobytes())
+
+    # -------- Filtros --------
+
+    def _where_sql(self, where: Optional[Dict[str, Any]]):
+        """
+        Traduce un filtro `where` de igualdad ({"campo": valor} o {"campo": {"$eq": valor}})
+        """
+        if not where:
+            return "", []
+        clauses, params = [], []
+        for key, value in where.items():
+            if isinstance(value, dict):
+                if set(value) != {"$eq"}:
+                    raise ValueError(f"Filtro no soportado por el índice cuantizado: {where}")
+                value = value["$eq"]
+            clauses.append("json_extract(metadata, ?) = ?")
+            params.extend([f"$.{key}", value])
+        return " AND " + " AND ".join(clauses), params
+
+    def _allowed_rows(self, where: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        if not where:
+            return None
+        sql, params = self._where_sql(where)
+        rows = [row for (row,) in self._conn.execute(f"SELECT row FROM items WHERE 1 = 1{sql}", params)]
+        return np.asarray(rows, dtype=np.int64)
+
+    # -------- API de colección --------
+
+    def count(self) -> int:
+        with self._lock:
+            return len(self._rows)
+
+    def add(
+        self,
+        ids: List[str],
+        embeddings: Sequence[Sequence[float]],
+        documents: Optional[List[str]] = None,
+        metadatas: Optional[List[Dict[str, Any]]] = None,
+    ):
+        """
+        Añade elementos (un id existente se reemplaza)
+        """
+        if not ids:
+            return
+        vectors = _normalize(np.asarray(embeddings, dtype=np.float32))
+        documents = documents or [None] * len(ids)
+        metadatas = metadatas or [None] * len(ids)
+
+        # Validar y serializar antes de tocar los archivos: un lote que falla
+        # a medias dejaría filas en disco sin su registro en SQLite
+        if not all(isinstance(item_id, str) and item_id for item_id in ids):
+            raise ValueError("Los ids deben ser textos no vacíos")
+        if len(set(ids)) != len(ids):
+            raise ValueError("Ids duplicados en el lote")
+        if vectors.ndim != 2 or not (len(vectors) == len(documents) == len(metadatas) == len(ids)):
+            raise ValueError("ids, embeddings, documents y metadatas deben tener la misma longitud")
+        try:
+            serialized = [json.dumps(metadata) if metadata is not None else None for metadata in metadatas]
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"Metadatos no serializables a JSON: {e}")
+
+        with self._lock:
+            if self.dimension is None:
+                self.dimension = vectors.shape[1]
+                self._conn.execute("INSERT INTO info (key, value) VALUES ('dimension', ?)", (str(self.dimension),))
+                self._conn.commit()
+            if vectors.shape[1] != self.dimension:
+                raise ValueError(f"Dimensión {vectors.shape[1]} distinta de la del índice ({self.dimension})")
+
+            self._remove_ids([item_id for item_id in ids if item_id in self._rows])
+
+            start = len(self._row_ids)
+            try:
+                self._append_vectors(vectors)
+                with self._conn:
+                    self._conn.executemany(
+                        "INSERT INTO items (row, id, document, metadata) VALUES (?, ?, ?, ?)",
+                        [
+                            (start + i, item_id, document, metadata)
+                            for i, (item_id, document, metadata) in enumerate(zip(ids, documents, serialized))
+                        ]
+                    )
+            except BaseException:
+                # Sin registro en SQLite, las filas añadidas se quitan de los archivos
+                self._truncate(start)
+                raise
+
+            for i, item_id in enumerate(ids):
+                self._row_ids.append(item_id)
+                self._rows[item_id] = start + i
+            self._alive = np.concatenate([self._alive, np.ones(len(ids), dtype=bool)])
+            self._map(len(self._row_ids))
+            # Los ids reemplazados dejan filas muertas como las eliminaciones
+            self._maybe_compact()
+
+    def upsert(self, ids, embeddings, documents=None, metadatas=None):
+        self.add(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+    def update(
+        self,
+        ids: List[str],
+        embeddings: Optional[Sequence[Sequence[float]]] = None,
+        documents: Optional[List[str]] = None,
+        metadatas: Optional[List[Dict[str, Any]]] = None,
+    ):
+        """
+        Actualiza metadatos y/o textos; con embeddings nuevos el elemento se reescribe
+        """
+        with self._lock:
+            ids = [item_id for item_id in ids if item_id in self._rows]
+            if not ids:
+                return
+            if embeddings is not None:
+                current = self.get(ids=ids, include=["documents", "metadatas"])
+                by_id = dict(zip(current["ids"], zip(current["documents"], current["metadatas"])))
+                self.add(
+                    ids=ids,
+                    embeddings=embeddings,
+                    documents=documents or [by_id[item_id][0] for item_id in ids],
+                    metadatas=metadatas or [by_id[item_id][1] for item_id in ids],
+                )
+                return
+            with self._conn:
+                if metadatas is not None:
+                    self._conn.executemany(
+                        "UPDATE items SET metadata = ? WHERE id = ?",
+                        [(json.dumps(metadata), item_id) for item_id, metadata in zip(ids, metadatas)]
+                    )
+                if documents is not None:
+                    self._conn.executemany(
+                        "UPDATE items SET document = ? WHERE id = ?",
+                        list(zip(documents, ids))
+                    )
+
+    def _remove_ids(self, ids: List[str]):
+        rows = [self._rows.pop(item_id) for item_id in ids if item_id in self._rows]
+        if not rows:
+            return
+        with self._conn:
+            self._conn.executemany("DELETE FROM items WHERE row = ?", [(row,) for row in rows])
+        for row in rows:
+            self._row_ids[row] = None
+        self._alive[rows] = False
+
+    def delete(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None):
+        with self._lock:
+            if where:
+                allowed = self._allowed_rows(where)
+                ids = [self._row_ids[row] for row in allowed if row < len(self._row_ids)]
+            self._remove_ids(list(ids or []))
+            self._maybe_compact()
+
+    def _maybe_compact(self):
+        dead = len(self._row_ids) - len(self._rows)
+        if dead and dead >= self.compact_ratio * len(self._row_ids):
+            self.compact()
+
+    def compact(self):
+        """
+        Reescribe los archivos sin las filas muertas y renumera las filas
+        """
+        with self._lock:
+            keep = np.flatnonzero(self._alive)
+            temporary = {name: self._path(name + ".tmp") for name in ("codes.i8", "scales.f32", "vectors.f32")}
+            for name, source in (("codes.i8", self._codes), ("scales.f32", self._scales), ("vectors.f32", self._vectors)):
+                with open(temporary[name], "wb") as f:
+                    f.write(np.ascontiguousarray(source[keep]).tobytes())
+
+            mapping = [(int(new_row), int(old_row)) for new_row, old_row in enumerate(keep)]
+            with self._conn:
+                # Desplazar primero para no chocar con la clave primaria al renumerar
+                self._conn.execute("UPDATE items SET row = -row - 1")
+                self._conn.executemany("UPDATE items SET row = ? WHERE row = ?", [(new, -old - 1) for new, old in mapping])
+                for name, path in temporary.items():
+                    # Los mapeos abiertos siguen apuntando al archivo anterior
+                    os.replace(path, self._path(name))
+
+            self._row_ids = [self._row_ids[old] for _, old in mapping]
+            self._rows = {item_id: row for row, item_id in enumerate(self._row_ids)}
+            self._alive = np.ones(len(self._row_ids), dtype=bool)
+            self._map(len(self._row_ids))
+            logger.info(f"Índice cuantizado compactado: {len(self._row_ids)} filas")
+
+    def get(
+        self,
+        ids: Optional[List[str]] = None,
+        where: Optional[Dict[str, Any]] = None,
+        include: Sequence[str] = ("documents", "metadatas"),
+        limit: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        with self._lock:
+            if ids is not None:
+                rows = [self._rows[item_id] for item_id in ids if item_id in self._rows]
+                if where:
+                    allowed = set(self._allowed_rows(where).tolist())
+                    rows = [row for row in rows if row in allowed]
+            elif where:
+                rows = self._allowed_rows(where).tolist()
+            else:
+                rows = np.flatnonzero(self._alive).tolist()
+            if limit is not None:
+                rows = rows[:limit]
+            vectors = self._vectors
+
+            result: Dict[str, Any] = {"ids": [self._row_ids[row] for row in rows]}
+            if "documents" in include or "metadatas" in include:
+                records = self._fetch(rows)
+                if "documents" in include:
+                    result["documents"] = [records[row][0] for row in rows]
+                if "metadatas" in include:
+                    result["metadatas"] = [records[row][1] for row in rows]
+        if "embeddings" in include:
+            result["embeddings"] = np.asarray(vectors[rows]) if rows else np.zeros((0, self.dimension or 0), dtype=np.float32)
+        return result
+
+    def _fetch(self, rows: List[int]) -> Dict[int, tuple]:
+        records = {}
+        # Consultas por tramos para no superar el límite de parámetros de SQLite
+        for start in range(0, len(rows), 900):
+            batch = rows[start:start + 900]
+            placeholders = ", ".join("?" * len(batch))
+            for row, document, metadata in self._conn.execute(
+                f"SELECT row, document, metadata FROM items WHERE row IN ({placeholders})", batch
+            ):
+                records[row] = (document, json.loads(metadata) if metadata is not None else None)
+        return records
+
+    def query(
+        self,
+        query_embeddings: Sequence[Sequence[float]],
+        n_results: int = 10,
+        where: Optional[Dict[str, Any]] = None,
+        include: Sequence[str] = ("documents", "metadatas", "distances"),
+    ) -> Dict[str, Any]:
+        """
+        Búsqueda por fuerza bruta sobre los códigos int8 y reordenación de los
+        candidatos con los vectores completos. Distancias coseno (1 - similitud).
+        """
+        queries = _normalize(np.asarray(query_embeddings, dtype=np.float32))
+        with self._lock:
+            codes, scales, vectors = self._codes, self._scales, self._vectors
+            alive = self._alive.copy()
+            if where:
+                mask = np.zeros_like(alive)
+                mask[self._allowed_rows(where)] = True
+                alive &= mask
+            row_ids = list(self._row_ids)
+
+        total = int(alive.sum())
+        k = min(n_results, total)
+        candidates = min(max(k * self.rescore_factor, k), total)
+        result: Dict[str, Any] = {"ids": [], "distances": [], "documents": [], "metadatas": []}
+        if k == 0:
+            for _ in queries:
+                for key in result:
+                    result[key].append([])
+            return result
+
+        # Puntuación aproximada: (códigos · q) * escala, por bloques
+        approximate = np.empty((len(queries), len(alive)), dtype=np.float32)
+        for start in range(0, len(alive), self.SCAN_BLOCK):
+            block = np.asarray(codes[start:start + self.SCAN_BLOCK], dtype=np.float32)
+            approximate[:, start:start + len(block)] = (queries @ block.T) * scales[start:start + len(block)]
+        approximate[:, ~alive] = -np.inf
+
+        top_rows = []
+        for i, query in enumerate(queries):
+            candidate_rows = np.argpartition(-approximate[i], candidates - 1)[:candidates]
+            candidate_rows.sort()
+            exact = np.asarray(vectors[candidate_rows]) @ query
+            order = np.argsort(-exact)[:k]
+            top_rows.append((candidate_rows[order], exact[order]))
+
+        records = {}
+        if "documents" in include or "metadatas" in include:
+            with self._lock:
+                records = self._fetch(sorted({int(row) for rows, _ in top_rows for row in rows}))
+
+        for rows, similarities in top_rows:
+            result["ids"].append([row_ids[row] for row in rows])
+            result["distances"].append([float(1 - similarity) for similarity in similarities])
+            result["documents"].append([records.get(int(row), (None, None))[0] for row in rows])
+            result["metadatas"].append([records.get(int(row), (None, None))[1] for row in rows])
+        return result
+
+    def close(self):
+        self._conn.close()
+
+
+def encode_vectors(vectors) -> Dict[str, Any]:
+    """
+    Serializa una matriz float32 en base64 (mucho más barato que listas JSON de floats)
+    """
+    array = np.ascontiguousarray(np.asarray(vectors, dtype=np.float32))
+    return {"shape": list(array.shape), "data": base64.b64encode(array.tobytes()).decode("ascii")}
+
+
+def decode_vectors(payload: Dict[str, Any]) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(payload["data"]), dtype=np.float32).reshape(payload["shape"])
+
+
+class RemoteCollection:
+    def __init__(self, url: str, timeout: float = 60.0, version_poll_seconds: float = 0.5):
+        """
+        Cliente HTTP del servicio vectorial (vector_service.py) con la API de
+        colección. Permite que varios workers consulten un único índice que
+        posee y escribe un solo proceso.
+        """
+        import httpx
+
+        self.url = url.rstrip("/")
+        self._client = httpx.Client(base_url=self.url, timeout=timeout)
+        self.version_poll_seconds = version_poll_seconds
+        self._version: Optional[int] = None
+        self._version_checked = 0.0
+        # Escrituras propias: cada una incrementa en uno la versión del servicio
+        self._own_writes = 0
+        self._version_lock = threading.Lock()
+
+        info = self._call("GET", "/health")
+        # Backend real del servicio (determina qué manifiesto de ingesta le corresponde)
+        self.backend = info["backend"]
+
+    def _call(
+        self, method: str, path: str, payload: Optional[Dict[str, Any]] = None, own_write: bool = False
+    ) -> Dict[str, Any]:
+        response = self._client.request(method, path, json=payload)
+        if response.status_code >= 400:
+            raise RuntimeError(f"Servicio vectorial {path}: {response.status_code} {response.text}")
+        data = response.json()
+        if "version" in data:
+            with self._version_lock:
+                # Las respuestas concurrentes pueden llegar desordenadas
+                if self._version is None or data["version"] > self._version:
+                    self._version = data["version"]
+                if own_write:
+                    self._own_writes += 1
+                self._version_checked = time.monotonic()
+        return data
+
+    def current_version(self) -> int:
+        """
+        Versión del índice (cambia con cada escritura de cualquier proceso).
+        Se consulta como mucho cada `version_poll_seconds`.
+        """
+        if self._version is None or time.monotonic() - self._version_checked > self.version_poll_seconds:
+            self._call("GET", "/version")
+        return self._version
+
+    def external_version(self) -> int:
+        """
+        Versión del índice sin contar las escrituras de este proceso: solo
+        cambia cuando escribe otro worker. Las escrituras propias ya se
+        reflejan en las cachés locales al hacerlas.
+        """
+        self.current_version()
+        with self._version_lock:
+            return self._version - self._own_writes
+
+    def count(self) -> int:
+        return self._call("GET", "/count")["count"]
+
+    def add(self, ids, embeddings, documents=None, metadatas=None):
+        self._call("POST", "/add", {
+            "ids": ids,
+            "embeddings": encode_vectors(embeddings),
+            "documents": documents,
+            "metadatas": metadatas,
+        }, own_write=True)
+
+    def upsert(self, ids, embeddings, documents=None, metadatas=None):
+        self.add(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+    def update(self, ids, embeddings=None, documents=None, metadatas=None):
+        self._call("POST", "/update", {
+            "ids": ids,
+            "embeddings": encode_vectors(embeddings) if embeddings is not None else None,
+            "documents": documents,
+            "metadatas": metadatas,
+        }, own_write=True)
+
+    def delete(self, ids=None, where=None):
+        self._call("POST", "/delete", {"ids": ids, "where": where}, own_write=True)
+
+    def get(self, ids=None, where=None, include=("documents", "metadatas"), limit=None) -> Dict[str, Any]:
+        result = self._call("POST", "/get", {"ids": ids, "where": where, "include": list(include), "limit": limit})
+        if result.get("embeddings") is not None:
+            result["embeddings"] = decode_vectors(result["embeddings"])
+        return result
+
+    def query(self, query_embeddings, n_results=10, where=None, include=("documents", "metadatas", "distances")):
+        return self._call("POST", "/query", {
+            "query_embeddings": encode_vectors(query_embeddings),
+            "n_results": n_results,
+            "where": where,
+            "include": list(include),
+        })
+
+    def lexical_search(self, queries: List[str], n_results: int = 20) -> List[List[tuple]]:
+        """
+        Búsqueda BM25 en el índice léxico del servicio (compartido por todos
+        los workers): por consulta, lista de (id, score)
+        """
+        results = self._call("POST", "/lexical", {"queries": queries, "n_results": n_results})["results"]
+        return [[(doc_id, score) for doc_id, score in hits] for hits in results]
+
+    def close(self):
+        self._client.close()
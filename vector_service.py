@@ -0,0 +1,191 @@
+"""
+Servicio vectorial: un único proceso posee el índice (ChromaDB o el índice
+cuantizado) y atiende por HTTP las lecturas y escrituras de los workers de
+la API, que usan el backend "remote" (RemoteCollection).
+
+Uso:
+    python -m vector_service --port 8001 --persist-directory ./chroma_db
+    VECTOR_STORE_URL=http://127.0.0.1:8001 uvicorn server:app --workers 4
+"""
+
+import argparse
+import logging
+import os
+import threading
+import time
+from typing import Optional, Dict, Any, List
+import numpy as np
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from vector_backends import open_vector_backend, encode_vectors, decode_vectors
+from lexical_index import BM25Index
+
+logger = logging.getLogger(__name__)
+
+
+# Los embeddings viajan como {"shape": [n, d], "data": base64 de float32}
+class AddRequest(BaseModel):
+    ids: List[str]
+    embeddings: Optional[Dict[str, Any]] = None
+    documents: Optional[List[Optional[str]]] = None
+    metadatas: Optional[List[Optional[Dict[str, Any]]]] = None
+
+class DeleteRequest(BaseModel):
+    ids: Optional[List[str]] = None
+    where: Optional[Dict[str, Any]] = None
+
+class GetRequest(BaseModel):
+    ids: Optional[List[str]] = None
+    where: Optional[Dict[str, Any]] = None
+    include: List[str] = ["documents", "metadatas"]
+    limit: Optional[int] = None
+
+class QueryRequest(BaseModel):
+    query_embeddings: Dict[str, Any]
+    n_results: int = 10
+    where: Optional[Dict[str, Any]] = None
+    include: List[str] = ["documents", "metadatas", "distances"]
+
+class LexicalRequest(BaseModel):
+    queries: List[str]
+    n_results: int = 20
+
+
+def _serialize(result: Dict[str, Any], include: List[str]) -> Dict[str, Any]:
+    """
+    Prepara un resultado de la colección para JSON (embeddings en base64)
+    """
+    data = {}
+    for key in ["ids", *include]:
+        value = result.get(key)
+        if key == "embeddings" and value is not None:
+            value = encode_vectors(value) if len(value) else encode_vectors(np.zeros((0, 0), dtype=np.float32))
+        elif isinstance(value, np.ndarray):
+            value = value.tolist()
+        data[key] = value
+    return data
+
+
+def create_app(collection, backend: str) -> FastAPI:
+    """
+    Expone la API de colección por HTTP. Las lecturas se atienden en paralelo
+    en el pool de hilos; las escrituras se serializan y cada una incrementa la
+    versión del índice, que los workers usan para invalidar sus cachés.
+
+    El índice léxico BM25 también vive aquí, uno para todos los workers
+    (/lexical): se construye en la primera búsqueda y cada escritura lo
+    actualiza de forma incremental bajo el mismo lock.
+    """
+    app = FastAPI()
+    write_lock = threading.Lock()
+    state: Dict[str, Any] = {"version": 0, "lexical": None}
+
+    def write(action, lexical_update=None):
+        with write_lock:
+            action()
+            if lexical_update is not None and state["lexical"] is not None:
+                lexical_update(state["lexical"])
+            state["version"] += 1
+            return {"version": state["version"]}
+
+    def lexical_index() -> BM25Index:
+        if state["lexical"] is None:
+            with write_lock:
+                if state["lexical"] is None:
+                    start = time.perf_counter()
+                    index = BM25Index()
+                    results = collection.get(include=["documents"])
+                    index.add(results["ids"], results["documents"])
+                    state["lexical"] = index
+                    logger.info(
+                        f"Índice léxico construido: {len(index)} chunks en {time.perf_counter() - start:.2f}s"
+                    )
+        return state["lexical"]
+
+    def reindex(ids: List[str], documents: Optional[List[Optional[str]]]):
+        def update(index: BM25Index):
+            index.add(ids, [document or "" for document in documents])
+        return update if documents is not None else None
+
+    @app.get("/health")
+    def health():
+        return {"status": "ok", "backend": backend, "version": state["version"]}
+
+    @app.get("/version")
+    def version():
+        return {"version": state["version"]}
+
+    @app.get("/count")
+    def count():
+        return {"count": collection.count(), "version": state["version"]}
+
+    @app.post("/add")
+    def add(req: AddRequest):
+        if req.embeddings is None:
+            raise HTTPException(status_code=400, detail="Se requieren embeddings")
+        return write(lambda: collection.add(
+            ids=req.ids, embeddings=decode_vectors(req.embeddings), documents=req.documents, metadatas=req.metadatas
+        ), reindex(req.ids, req.documents))
+
+    @app.post("/update")
+    def update(req: AddRequest):
+        embeddings = decode_vectors(req.embeddings) if req.embeddings is not None else None
+        return write(lambda: collection.update(
+            ids=req.ids, embeddings=embeddings, documents=req.documents, metadatas=req.metadatas
+        ), reindex(req.ids, req.documents))
+
+    @app.post("/delete")
+    def delete(req: DeleteRequest):
+        removed: List[str] = []
+
+        def action():
+            # Con un filtro `where`, los ids a quitar del índice léxico se leen antes
+            if req.where and state["lexical"] is not None:
+                removed.extend(collection.get(ids=req.ids, where=req.where, include=[])["ids"])
+            else:
+                removed.extend(req.ids or [])
+            collection.delete(ids=req.ids, where=req.where)
+
+        return write(action, lambda index: index.remove(removed))
+
+    @app.post("/get")
+    def get(req: GetRequest):
+        result = collection.get(ids=req.ids, where=req.where, include=req.include, limit=req.limit)
+        # Contenido ya serializable: se evita jsonable_encoder sobre textos y vectores
+        return JSONResponse(_serialize(result, req.include) | {"version": state["version"]})
+
+    @app.post("/query")
+    def query(req: QueryRequest):
+        result = collection.query(
+            query_embeddings=decode_vectors(req.query_embeddings),
+            n_results=req.n_results, where=req.where, include=req.include
+        )
+        return JSONResponse(_serialize(result, req.include) | {"version": state["version"]})
+
+    @app.post("/lexical")
+    def lexical(req: LexicalRequest):
+        index = lexical_index()
+        results = [index.search(query, req.n_results) for query in req.queries]
+        return JSONResponse({"results": results, "version": state["version"]})
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servicio vectorial compartido por los workers de la API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--persist-directory", default=os.getenv("CHROMA_PERSIST_DIRECTORY", "./chroma_db"))
+    parser.add_argument("--collection", default="documentos")
+    parser.add_argument("--backend", default=os.getenv("VECTOR_BACKEND", "chroma"), choices=["chroma", "quantized"])
+    args = parser.parse_args()
+
+    import uvicorn
+
+    collection = open_vector_backend(args.backend, args.persist_directory, args.collection)
+    uvicorn.run(create_app(collection, args.backend), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import logging
+import threading
+import time
+from typing import Callable, Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class VectorStoreProvider:
+    def __init__(self, factory: Callable[[], Any]):
+        """
+        Crea el almacén vectorial bajo demanda (una sola vez, aunque lo pidan
+        varios hilos) y permite precalentarlo en segundo plano: abrir el
+        índice, construir el índice léxico y cargar los modelos de Ollama.
+        """
+        self._factory = factory
+        self._store = None
+        self._error: Optional[str] = None
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.state = "idle"
+        self.steps: Dict[str, Dict[str, Any]] = {}
+
+    @property
+    def loaded(self) -> bool:
+        return self._store is not None
+
+    def get(self):
+        """
+        Devuelve el almacén, creándolo en la primera llamada
+        """
+        if self._store is None:
+            with self._lock:
+                if self._store is None:
+                    self._store = self._factory()
+        return self._store
+
+    def _step(self, name: str, action: Callable[[], Any], required: bool):
+        start = time.perf_counter()
+        try:
+            action()
+            self.steps[name] = {"status": "ok", "seconds": time.perf_counter() - start}
+        except Exception as e:
+            self.steps[name] = {"status": "error", "seconds": time.perf_counter() - start, "error": str(e)}
+            logger.warning(f"Calentamiento: fallo en {name}: {e}")
+            if required:
+                raise
+
+    def warm_up(self):
+        """
+        Precarga el índice y hace ping a los modelos de embeddings y de chat.
+        Los fallos de Ollama no impiden atender peticiones (quedan en el estado).
+        """
+        import ollama
+        from local_vector_store import CHAT_MODEL, SYSTEM_PROMPT, KEEP_ALIVE
+
+        self.state = "warming"
+        start = time.perf_counter()
+        try:
+            self._step("vector_store", self.get, required=True)
+            store = self._store
+
+            def load_index():
+                store.collection.count()
+                if store.hybrid_search:
+                    # Índice BM25 local o, con el servicio vectorial, el compartido
+                    store.lexical_search(["calentamiento"], 1)
+
+            self._step("index", load_index, required=True)
+            self._step("embedding_model", lambda: store.embedder.embed(["calentamiento"]), required=False)
+            # Carga el modelo y evalúa el system prompt: su caché KV queda lista
+            # como prefijo común de las primeras consultas
+            self._step("chat_model", lambda: ollama.chat(
+                model=CHAT_MODEL,
+                messages=[{"role": "system", "content": SYSTEM_PROMPT}],
+                options={"num_predict": 1},
+                keep_alive=KEEP_ALIVE,
+            ), required=False)
+            self.state = "ready"
+            logger.info(f"Calentamiento completado en {time.perf_counter() - start:.2f}s")
+        except Exception as e:
+            self._error = str(e)
+            self.state = "failed"
+            logger.error(f"Error en el calentamiento: {e}")
+
+    def start_warm_up(self):
+        """
+        Lanza el calentamiento en un hilo de fondo (no bloquea el arranque)
+        """
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.warm_up, name="warmup", daemon=True)
+            self._thread.start()
+
+    @property
+    def ready(self) -> bool:
+        # Sin calentamiento, el almacén se crea en la primera petición que lo necesite
+        return self.state == "ready" or (self.state == "idle" and self._thread is None)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "ready": self.ready,
+            "vector_store_loaded": self.loaded,
+            "steps": self.steps,
+            "error": self._error,
+        }